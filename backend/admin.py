@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from backend.models import RootJob
+
+
+@admin.register(RootJob)
+class RootJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tooth_name', 'status', 'stage', 'progress', 'quality', 'created_at', 'updated_at')
+    list_filter = ('status', 'quality')
+    exclude = ('polydata', 'result')
@@ -0,0 +1,127 @@
+import numpy as np
+from vtkmodules.vtkFiltersCore import vtkTriangleFilter
+from vtkmodules.util.numpy_support import vtk_to_numpy
+
+from backend.utils import mesh_from_numpy, polydata_points_to_numpy
+
+# 网格自带牙位标签时默认的数据数组名称
+LABEL_ARRAY = 'Label'
+LABEL_TYPES = ('point', 'cell')
+
+
+def read_labels(labels_buffer):
+    '''
+    解析单独上传的牙位标签，每个点或每个面片一个小端 int32。
+
+    返回的是副本，上传缓冲区可以在之后立即释放。
+
+    :param labels_buffer: bytes 或 memoryview
+    :return: numpy 数组，本机字节序的 int32 标签
+    :raises ValueError: 长度不是 4 的倍数
+    '''
+    if len(labels_buffer) % 4:
+        raise ValueError('labels 应为小端 int32 数组')
+    return np.frombuffer(labels_buffer, dtype='<i4').astype(np.int32)
+
+
+def mesh_labels(polydata, array_name=LABEL_ARRAY, label_type=None):
+    '''
+    读取网格自带的牙位标签数组，先查找点数据，再查找单元数据。
+
+    :param polydata: vtkPolyData对象
+    :param array_name: 标签数组的名称
+    :param label_type: 'point'、'cell' 或 None，指定时只在对应的数据中查找
+    :return: (numpy 数组, 'point' 或 'cell')，网格中没有该数组时返回 None
+    :raises ValueError: 数组存在，但与指定的 label_type 不一致
+    '''
+    found = None
+    for candidate, data in (('point', polydata.GetPointData()), ('cell', polydata.GetCellData())):
+        array = data.GetArray(array_name)
+        if array is None:
+            continue
+        if label_type is None or candidate == label_type:
+            return vtk_to_numpy(array).reshape(-1), candidate
+        found = candidate
+    if found is not None:
+        raise ValueError(f'标签数组 {array_name} 是逐{"点" if found == "point" else "面片"}的，与 labelType={label_type} 不一致')
+    return None
+
+
+def resolve_label_type(polydata, labels, label_type=None):
+    '''
+    确定标签是逐点还是逐面片的，未指定时按数组长度判断，点数与面片数相同时按逐点处理。
+
+    :param polydata: vtkPolyData对象，全牙列网格
+    :param labels: numpy 数组，标签
+    :param label_type: 'point'、'cell' 或 None
+    :return: 'point' 或 'cell'
+    :raises ValueError: 标签数与点数、面片数都不一致
+    '''
+    sizes = {'point': polydata.GetNumberOfPoints(), 'cell': polydata.GetNumberOfPolys()}
+    candidates = [label_type] if label_type is not None else list(LABEL_TYPES)
+    for candidate in candidates:
+        if len(labels) == sizes[candidate]:
+            return candidate
+    raise ValueError(f'标签数 {len(labels)} 与网格的点数 {sizes["point"]}、面片数 {sizes["cell"]} 不一致')
+
+
+def split_arch(polydata, labels, label_type, wanted_labels):
+    '''
+    按牙位标签把全牙列网格切分为各个牙冠，所有牙齿在同一次向量化的计算中完成，不逐颗牙齿提取。
+
+    逐点标签时，三个顶点标签相同的面片才属于该牙齿，跨越牙齿与牙龈分界的面片被丢弃，
+    切分出的牙冠在分界处留下开放边界。面片按标签排序后，以 (牙齿序号, 点编号) 的组合键一次去重，
+    每颗牙齿的点和面片都是连续的一段，各自重新编号。
+
+    :param polydata: vtkPolyData对象，全牙列网格
+    :param labels: numpy 数组，逐点或逐面片的牙位标签
+    :param label_type: 'point' 或 'cell'
+    :param wanted_labels: 需要切分出的标签
+    :return: dict，标签 → 牙冠的 vtkPolyData；网格中没有面片的标签不在结果中
+    '''
+    labels = np.asarray(labels)
+    if polydata.GetPolys().GetNumberOfConnectivityIds() != 3 * polydata.GetNumberOfPolys():
+        if label_type == 'cell':
+            # n 边形三角化为依次排列的 n - 2 个三角形，各自保留原面片的标签
+            labels = np.repeat(labels, np.diff(vtk_to_numpy(polydata.GetPolys().GetOffsetsArray())) - 2)
+        triangle_filter = vtkTriangleFilter()
+        triangle_filter.PassLinesOff()
+        triangle_filter.PassVertsOff()
+        triangle_filter.SetInputData(polydata)
+        triangle_filter.Update()
+        polydata = triangle_filter.GetOutput()
+    points = polydata_points_to_numpy(polydata)
+    triangles = vtk_to_numpy(polydata.GetPolys().GetConnectivityArray()).reshape(-1, 3)
+
+    if label_type == 'point':
+        corner_labels = labels[triangles]
+        cell_labels = corner_labels[:, 0]
+        mixed = (corner_labels[:, 1] != cell_labels) | (corner_labels[:, 2] != cell_labels)
+    else:
+        cell_labels = labels
+        mixed = np.zeros(len(triangles), dtype=bool)
+
+    wanted = np.unique(np.asarray(list(wanted_labels), dtype=cell_labels.dtype))
+    keep = np.isin(cell_labels, wanted) & ~mixed
+    kept_labels = cell_labels[keep]
+    order = np.argsort(kept_labels, kind='stable')
+    tooth_index = np.searchsorted(wanted, kept_labels[order])
+    tooth_triangles = triangles[keep][order]
+
+    num_points = len(points)
+    keys = tooth_index[:, None].astype(np.int64) * num_points + tooth_triangles
+    unique_keys, inverse = np.unique(keys.ravel(), return_inverse=True)
+    tooth_points = points[unique_keys % num_points]
+    bounds = np.arange(len(wanted) + 1, dtype=np.int64)
+    point_bounds = np.searchsorted(unique_keys, bounds * num_points)
+    cell_bounds = np.searchsorted(tooth_index, bounds)
+    local_triangles = inverse.reshape(-1, 3) - point_bounds[tooth_index][:, None]
+
+    crowns = {}
+    for index, label in enumerate(wanted.tolist()):
+        start, end = cell_bounds[index], cell_bounds[index + 1]
+        if start == end:
+            continue
+        crowns[label] = mesh_from_numpy(tooth_points[point_bounds[index]:point_bounds[index + 1]],
+                                        local_triangles[start:end])
+    return crowns
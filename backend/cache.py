@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+# 牙根网格的构造方式或缓存内容的格式变化时递增，磁盘层中按旧方式生成的结果不会再被命中
+RESULT_VERSION = 4
+# 磁盘层的默认容量
+DISK_MAX_BYTES = 1024 * 1024 * 1024
+# 磁盘层写入中的临时文件的前缀，扫描目录时跳过
+TEMP_PREFIX = '.tmp-'
+
+_result_cache = None
+
+
+def make_cache_key(mesh_key, json_part, variant='', encoding=None):
+    '''
+    根据牙冠网格的摘要和牙根参数计算内容寻址的缓存键。
+
+    jsonPart 和 encoding 按键排序后再序列化，键的顺序和空白不会影响缓存命中。
+
+    :param mesh_key: str，牙冠网格的内容摘要，即 make_mesh_handle 的结果（网格句柄）
+    :param json_part: dict，牙根参数
+    :param variant: str，区分同一输入的不同输出形式，例如响应格式
+    :param encoding: 可选的 dict，影响序列化结果的参数，例如 XML 的压缩方式和压缩级别
+    :return: str，十六进制的 sha256 摘要
+    '''
+    digest = hashlib.sha256(f'v{RESULT_VERSION}\0'.encode())
+    for part in (mesh_key, json_part, variant, encoding):
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, separators=(',', ':'))
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ResultCache:
+    '''
+    牙根生成结果的两级缓存。
+
+    内存层为按字节数限制大小的 LRU；磁盘层可选，按缓存键存放在共享目录中，
+    同一台机器上的多个 gunicorn worker 可以共用。磁盘层的总大小不超过 max_disk_bytes，
+    超出时按文件的修改时间（磁盘命中时会更新）从旧到新删除。
+    指定 size_of 时也可以缓存 bytes 以外的对象（例如流水线的中间结果），这时不能启用磁盘层。
+    '''
+
+    def __init__(self, max_bytes, directory=None, size_of=len, max_disk_bytes=DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.size_of = size_of
+        self.current_bytes = 0
+        self.disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.disk_bytes = sum(size for _, size, _ in self._scan_disk())
+
+    def get(self, key):
+        '''
+        查询缓存，先查内存层再查磁盘层，磁盘命中的结果会放入内存层。
+
+        :param key: str，缓存键
+        :return: 缓存的结果，未命中时返回 None
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        value = self._read_disk(key)
+        if value is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+        self._store_memory(key, value)
+        return value
+
+    def set(self, key, value):
+        '''
+        写入缓存，内存层和磁盘层同时写入。
+
+        :param key: str，缓存键
+        :param value: 缓存的结果，启用磁盘层时必须是 bytes
+        :return: 无返回值
+        '''
+        self._store_memory(key, value)
+        self._write_disk(key, value)
+
+    def clear(self):
+        '''
+        清空内存层，不删除磁盘层的文件。
+
+        :return: 无返回值
+        '''
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        '''
+        返回缓存的统计计数。
+
+        :return: dict，包含命中、未命中、淘汰次数以及当前占用
+        '''
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'disk_evictions': self.disk_evictions,
+                'disk_bytes': self.disk_bytes,
+                'max_disk_bytes': self.max_disk_bytes if self.directory else 0,
+            }
+
+    def _store_memory(self, key, value):
+        size = self.size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            # 超出容量时从最久未使用的条目开始淘汰
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+            # 更新修改时间，磁盘层按最近使用的顺序淘汰
+            os.utime(path)
+        except FileNotFoundError:
+            # 可能刚好被其他 worker 淘汰
+            return None
+        return value
+
+    def _write_disk(self, key, value):
+        if not self.directory:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，其他 worker 不会读到写了一半的文件
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        with self._lock:
+            self.disk_bytes += len(value)
+            over = self.max_disk_bytes is not None and self.disk_bytes > self.max_disk_bytes
+        if over:
+            self._evict_disk()
+
+    def _scan_disk(self):
+        '''
+        列出磁盘层的所有缓存文件，跳过写入中的临时文件。
+
+        :return: list，(修改时间, 字节数, 路径)
+        '''
+        files = []
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.name.startswith(TEMP_PREFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _evict_disk(self):
+        '''
+        磁盘层超出容量时从最久未使用的文件开始删除。
+
+        多个 worker 共用同一个目录，每个进程只累计自己写入的字节数，
+        因此淘汰前重新扫描目录，按实际占用计算需要删除的文件。
+
+        :return: 无返回值
+        '''
+        with self._disk_lock:
+            files = sorted(self._scan_disk())
+            total = sum(size for _, size, _ in files)
+            evicted = 0
+            for _, size, path in files:
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                    evicted += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+            with self._lock:
+                self.disk_bytes = total
+                self.disk_evictions += evicted
+
+
+def get_result_cache():
+    '''
+    获取进程内共享的结果缓存，首次调用时按 settings 创建。
+
+    settings.ROOT_CACHE_MAX_BYTES 控制内存层容量，settings.ROOT_CACHE_DIR 设置后启用磁盘层，
+    磁盘层的容量由 settings.ROOT_CACHE_DIR_MAX_BYTES 控制（默认 1 GiB）。
+
+    :return: ResultCache 对象
+    '''
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(
+            max_bytes=getattr(settings, 'ROOT_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+            directory=getattr(settings, 'ROOT_CACHE_DIR', None),
+            max_disk_bytes=getattr(settings, 'ROOT_CACHE_DIR_MAX_BYTES', DISK_MAX_BYTES),
+        )
+    return _result_cache
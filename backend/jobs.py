@@ -0,0 +1,139 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from backend.models import RootJob
+from backend.pipeline import RootPipeline, get_xml_options
+from backend.utils import parse_polydata, polydata_to_bytes, polydata_to_string
+
+logger = logging.getLogger(__name__)
+
+_job_executor = None
+_job_executor_lock = threading.Lock()
+
+
+def submit_job(polydata_buffer, json_part, quality, binary):
+    '''
+    创建一个牙根生成任务并交给后台线程池执行。
+
+    :param polydata_buffer: 牙冠的 VTK XML 数据
+    :param json_part: dict，牙根参数
+    :param quality: 平滑质量预设的名称
+    :param binary: 结果是否使用二进制网格格式
+    :return: RootJob 对象
+    '''
+    executor = get_job_executor()
+    job = RootJob.objects.create(
+        tooth_name=str(json_part.get('toothName', '')),
+        json_part=json_part,
+        polydata=bytes(polydata_buffer),
+        quality=quality,
+        binary=binary,
+    )
+    executor.submit(run_job, job.pk)
+    return job
+
+
+def update_job(job_id, **fields):
+    fields['updated_at'] = timezone.now()
+    RootJob.objects.filter(pk=job_id).update(**fields)
+
+
+def run_job(job_id):
+    '''
+    在后台线程中执行一个任务，各阶段的进度和最终结果写回数据库。
+
+    任务先以 pending → running 的条件更新认领，多个 worker 恢复同一个任务时只有一个会执行。
+
+    :param job_id: 任务 id
+    :return: 无返回值
+    '''
+    close_old_connections()
+    try:
+        claimed = RootJob.objects.filter(pk=job_id, status=RootJob.STATUS_PENDING).update(
+            status=RootJob.STATUS_RUNNING, stage='parse', progress=0.0, updated_at=timezone.now())
+        if not claimed:
+            return
+        job = RootJob.objects.get(pk=job_id)
+        try:
+            polydata = parse_polydata(job.polydata)
+            pipeline = RootPipeline(quality=job.quality,
+                                    on_stage=lambda stage, progress: update_job(job_id, stage=stage,
+                                                                                progress=progress))
+            result = pipeline.run(polydata, job.json_part)
+            update_job(job_id, stage='serialize', progress=0.9)
+            if job.binary:
+                payload = polydata_to_bytes(result)
+            else:
+                payload = polydata_to_string(result, **get_xml_options()).encode()
+        except Exception as e:
+            logger.exception('root job %s failed', job_id)
+            update_job(job_id, status=RootJob.STATUS_FAILED, error=repr(e), polydata=b'')
+            return
+        update_job(job_id, status=RootJob.STATUS_SUCCEEDED, stage='done', progress=1.0,
+                   result=payload, polydata=b'')
+    finally:
+        close_old_connections()
+
+
+def resume_jobs():
+    '''
+    重新提交未完成的任务：所有 pending 任务，以及超过 ROOT_JOB_STALE_SECONDS 没有更新进度的 running 任务
+    （通常是执行中的 worker 被重启）。
+
+    :return: int，重新提交的任务数
+    '''
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'ROOT_JOB_STALE_SECONDS', 300))
+    RootJob.objects.filter(status=RootJob.STATUS_RUNNING, updated_at__lt=stale_before).update(
+        status=RootJob.STATUS_PENDING, updated_at=timezone.now())
+    job_ids = list(RootJob.objects.filter(status=RootJob.STATUS_PENDING).values_list('pk', flat=True))
+    for job_id in job_ids:
+        _job_executor.submit(run_job, job_id)
+    return len(job_ids)
+
+
+def get_job_executor():
+    '''
+    获取执行任务的后台线程池，首次调用时创建，并恢复数据库中未完成的任务。
+
+    线程数由 settings.ROOT_JOB_WORKERS 控制，默认为 2。
+
+    :return: ThreadPoolExecutor 对象
+    '''
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'ROOT_JOB_WORKERS', 2),
+                                               thread_name_prefix='root-job')
+            try:
+                resumed = resume_jobs()
+            except BaseException:
+                # 下一次调用时重新创建并恢复
+                _job_executor.shutdown(wait=False)
+                _job_executor = None
+                raise
+            if resumed:
+                logger.info('resumed %d unfinished root jobs', resumed)
+    return _job_executor
+
+
+def start_job_executor():
+    '''
+    worker 启动时调用：创建后台线程池并立即恢复上次退出时未完成的任务，
+    不必等到之后有提交或查询任务的请求才恢复。多个 worker 同时恢复同一个任务时只有一个会执行，见 run_job。
+
+    数据库不可用（例如还没有执行 migrate）时只记录日志，不影响 worker 启动。
+
+    :return: 无返回值
+    '''
+    try:
+        get_job_executor()
+    except DatabaseError:
+        logger.exception('failed to resume unfinished root jobs')
+    finally:
+        close_old_connections()
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+from django.conf import settings
+from vtkmodules.vtkCommonCore import vtkPoints
+from vtkmodules.vtkCommonDataModel import vtkCellArray, vtkPolyData
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+
+from backend.utils import parse_polydata
+
+# 网格句柄是上传数据的 sha256 十六进制摘要
+HANDLE_PATTERN = re.compile(r'[0-9a-f]{64}')
+MESH_ARRAYS = ('points', 'offsets', 'connectivity')
+# 随网格保存的点数据、单元数据数组的名称和类型，数组本身保存为 point-<序号>.npy、cell-<序号>.npy
+DATA_ARRAYS_FILE = 'data_arrays.json'
+# 存储目录的默认容量
+MESH_DIR_MAX_BYTES = 1024 * 1024 * 1024
+# 写入中和待删除的网格目录的前缀，扫描目录时跳过
+TEMP_PREFIX = '.tmp-'
+
+_mesh_store = None
+
+
+def make_mesh_handle(polydata_buffer):
+    '''
+    计算上传网格的句柄，前端可以用同样的方法在本地计算，先查询再决定是否上传。
+
+    :param polydata_buffer: 上传的牙冠原始数据，bytes 或 memoryview
+    :return: str，十六进制的 sha256 摘要
+    '''
+    return hashlib.sha256(polydata_buffer).hexdigest()
+
+
+class MeshStore:
+    '''
+    上传一次、按句柄反复使用的牙冠网格存储。
+
+    上传的网格只解析一次，点坐标和面片数组以 .npy 文件保存在本地目录中，
+    使用时以内存映射的方式打开，同一台机器上的多个 worker 共用同一份数据和页缓存。
+    只保存点和面片（polys），与牙根生成流程使用的数据一致；另外保存点数据和单元数据中
+    整数类型的单分量数组，全牙列网格自带的牙位标签（见 backend.arch.mesh_labels）在使用句柄时仍然可用。
+    法向、颜色等其他数组不保存。
+
+    存储目录的总大小不超过 max_bytes，超出时与 ResultCache 的磁盘层一样，按网格目录的修改时间
+    （每次使用时更新）从旧到新删除。被删除的句柄与不存在的句柄一样处理，前端需要重新上传。
+    '''
+
+    def __init__(self, directory, max_bytes=MESH_DIR_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.current_bytes = sum(size for _, size, _ in self._scan())
+
+    def put(self, polydata_buffer):
+        '''
+        解析并保存上传的网格，相同内容的网格只保存一次。
+
+        :param polydata_buffer: 上传的牙冠原始数据，bytes 或 memoryview
+        :return: (str 句柄, bool 是否为新保存的网格)
+        '''
+        handle = make_mesh_handle(polydata_buffer)
+        path = self._path(handle)
+        if self._touch(path):
+            return handle, False
+
+        polydata = parse_polydata(polydata_buffer)
+        if polydata.GetPoints() is None or polydata.GetNumberOfPolys() == 0:
+            raise ValueError('无法解析网格数据或网格中没有面片')
+        polys = polydata.GetPolys()
+        arrays = {
+            'points': vtk_to_numpy(polydata.GetPoints().GetData()),
+            'offsets': vtk_to_numpy(polys.GetOffsetsArray()),
+            'connectivity': vtk_to_numpy(polys.GetConnectivityArray()),
+        }
+        data_arrays = []
+        for name, label_type, array in integer_data_arrays(polydata):
+            file_name = f'{label_type}-{len(data_arrays)}'
+            data_arrays.append({'name': name, 'type': label_type, 'file': file_name})
+            arrays[file_name] = array
+
+        # 先写到临时目录再整体改名，其他 worker 不会读到写了一半的网格
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=TEMP_PREFIX)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(temp_path, f'{name}.npy'), array)
+            with open(os.path.join(temp_path, DATA_ARRAYS_FILE), 'w', encoding='utf-8') as f:
+                json.dump(data_arrays, f, ensure_ascii=False)
+            size = directory_bytes(temp_path)
+            os.rename(temp_path, path)
+        except OSError:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            # 其他 worker 同时保存了同一个网格
+            if not os.path.isdir(path):
+                raise
+            return handle, False
+        except BaseException:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+        with self._lock:
+            self.current_bytes += size
+            over = self.current_bytes > self.max_bytes
+        if over:
+            self._evict(keep=path)
+        return handle, True
+
+    def exists(self, handle):
+        return bool(HANDLE_PATTERN.fullmatch(handle)) and os.path.isdir(self._path(handle))
+
+    def info(self, handle):
+        '''
+        返回网格的点数、三角形数以及随网格保存的数据数组，只读取数组头，不加载数据。
+
+        :param handle: str，网格句柄
+        :return: dict，网格不存在时返回 None
+        '''
+        arrays = self._load(handle)
+        if arrays is None:
+            return None
+        return {
+            'handle': handle,
+            'points': len(arrays['points']),
+            'polys': len(arrays['offsets']) - 1,
+            'pointData': [item['name'] for item in arrays['data_arrays'] if item['type'] == 'point'],
+            'cellData': [item['name'] for item in arrays['data_arrays'] if item['type'] == 'cell'],
+        }
+
+    def get(self, handle):
+        '''
+        以内存映射的方式打开网格，返回的 vtkPolyData 直接引用映射的内存，不拷贝数据。
+
+        映射使用写时复制模式，即使下游的过滤器修改了数组也不会写回文件。
+
+        :param handle: str，网格句柄
+        :return: vtkPolyData对象，网格不存在时返回 None
+        '''
+        arrays = self._load(handle)
+        if arrays is None:
+            return None
+        points = vtkPoints()
+        points.SetData(numpy_to_vtk(arrays['points'], deep=0))
+        polys = vtkCellArray()
+        polys.SetData(numpy_to_vtk(arrays['offsets'], deep=0), numpy_to_vtk(arrays['connectivity'], deep=0))
+        polydata = vtkPolyData()
+        polydata.SetPoints(points)
+        polydata.SetPolys(polys)
+        for item in arrays['data_arrays']:
+            array = numpy_to_vtk(arrays[item['file']], deep=0)
+            array.SetName(item['name'])
+            data = polydata.GetPointData() if item['type'] == 'point' else polydata.GetCellData()
+            data.AddArray(array)
+        return polydata
+
+    def _path(self, handle):
+        return os.path.join(self.directory, handle[:2], handle)
+
+    def _touch(self, path):
+        '''
+        更新网格目录的修改时间，存储按最近使用的顺序淘汰。
+
+        :param path: 网格目录
+        :return: bool，网格是否存在
+        '''
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _load(self, handle):
+        '''
+        以内存映射的方式打开网格的所有数组。
+
+        网格可能正在被其他 worker 淘汰，任何一个文件缺失时都按网格不存在处理。
+
+        :param handle: str，网格句柄
+        :return: dict，数组名称到 numpy 数组，另有 data_arrays 为随网格保存的数据数组列表；网格不存在时返回 None
+        '''
+        if not HANDLE_PATTERN.fullmatch(handle):
+            return None
+        path = self._path(handle)
+        if not self._touch(path):
+            return None
+        try:
+            arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='c') for name in MESH_ARRAYS}
+            try:
+                with open(os.path.join(path, DATA_ARRAYS_FILE), encoding='utf-8') as f:
+                    arrays['data_arrays'] = json.load(f)
+            except FileNotFoundError:
+                if not os.path.isdir(path):
+                    return None
+                # 早先保存的网格只有点和面片
+                arrays['data_arrays'] = []
+            for item in arrays['data_arrays']:
+                arrays[item['file']] = np.load(os.path.join(path, f"{item['file']}.npy"), mmap_mode='c')
+        except FileNotFoundError:
+            return None
+        return arrays
+
+    def _scan(self):
+        '''
+        列出存储中的所有网格目录，跳过写入中和待删除的目录。
+
+        :return: list，(修改时间, 字节数, 路径)
+        '''
+        meshes = []
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.name.startswith(TEMP_PREFIX):
+                    continue
+                try:
+                    meshes.append((entry.stat().st_mtime, directory_bytes(entry.path), entry.path))
+                except FileNotFoundError:
+                    continue
+        return meshes
+
+    def _evict(self, keep):
+        '''
+        存储超出容量时从最久未使用的网格开始删除。
+
+        多个 worker 共用同一个目录，淘汰前重新扫描目录，按实际占用计算需要删除的网格。
+        网格目录先改名再删除，其他 worker 不会读到删除了一半的网格。
+
+        :param keep: 刚保存的网格目录，不会被删除
+        :return: 无返回值
+        '''
+        with self._lock:
+            meshes = sorted(self._scan())
+            total = sum(size for _, size, _ in meshes)
+            for _, size, path in meshes:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                removed_path = os.path.join(os.path.dirname(path), f'{TEMP_PREFIX}evicted-{os.path.basename(path)}')
+                try:
+                    os.rename(path, removed_path)
+                except FileNotFoundError:
+                    # 已经被其他 worker 删除
+                    pass
+                else:
+                    shutil.rmtree(removed_path, ignore_errors=True)
+                    self.evictions += 1
+                total -= size
+            self.current_bytes = total
+
+
+def directory_bytes(path):
+    '''
+    统计目录中文件的总字节数，不包括子目录。
+
+    :param path: 目录路径
+    :return: int，字节数
+    '''
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def integer_data_arrays(polydata):
+    '''
+    列出网格的点数据和单元数据中整数类型的单分量数组，即可能作为牙位标签的数组。
+
+    单元数据只在网格全部由面片组成时保存，否则单元的编号与只保存面片的网格不一致。
+
+    :param polydata: vtkPolyData对象
+    :return: list，(数组名称, 'point' 或 'cell', numpy 数组)
+    '''
+    sources = [('point', polydata.GetPointData())]
+    if polydata.GetNumberOfCells() == polydata.GetNumberOfPolys():
+        sources.append(('cell', polydata.GetCellData()))
+    found = []
+    for label_type, data in sources:
+        for index in range(data.GetNumberOfArrays()):
+            array = data.GetArray(index)
+            if array is None or array.GetName() is None or array.GetNumberOfComponents() != 1:
+                continue
+            values = vtk_to_numpy(array)
+            if np.issubdtype(values.dtype, np.integer):
+                found.append((array.GetName(), label_type, values))
+    return found
+
+
+def get_mesh_store():
+    '''
+    获取进程内共享的网格存储，首次调用时按 settings 创建。
+
+    settings.ROOT_MESH_DIR 设置网格文件的保存目录，默认为系统临时目录下的 teethsite_meshes；
+    settings.ROOT_MESH_DIR_MAX_BYTES 控制目录的容量（默认 1 GiB）。
+
+    :return: MeshStore 对象
+    '''
+    global _mesh_store
+    if _mesh_store is None:
+        _mesh_store = MeshStore(
+            getattr(settings, 'ROOT_MESH_DIR', os.path.join(tempfile.gettempdir(), 'teethsite_meshes')),
+            max_bytes=getattr(settings, 'ROOT_MESH_DIR_MAX_BYTES', MESH_DIR_MAX_BYTES),
+        )
+    return _mesh_store
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# 耗时直方图的上界（秒），覆盖从缓存命中到整副牙列的全精度生成
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 网格规模直方图的上界（点数或三角形数）
+SIZE_BUCKETS = (1000, 5000, 10000, 25000, 50000, 100000, 200000, 500000, 1000000)
+
+
+class StageTimer:
+    '''
+    记录一次牙根生成中各阶段的耗时以及输入、输出网格的规模。
+
+    同名阶段的耗时会累加；stages 按阶段第一次出现的顺序排列。
+    '''
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = OrderedDict()
+        self.counts = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        '''
+        以 with 语句为一个阶段计时。
+
+        :param name: 阶段名称
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def observe(self, algorithm, name):
+        '''
+        为 VTK 过滤器计时，过滤器在流水线中执行时通过 StartEvent/EndEvent 记录耗时。
+
+        :param algorithm: vtkAlgorithm对象
+        :param name: 阶段名称
+        '''
+        starts = []
+        algorithm.AddObserver('StartEvent', lambda caller, event: starts.append(time.perf_counter()))
+        algorithm.AddObserver('EndEvent', lambda caller, event: self.add(name, time.perf_counter() - starts.pop()))
+
+    def count_mesh(self, direction, polydata):
+        '''
+        记录网格的点数和三角形数。
+
+        :param direction: 'input' 或 'output'
+        :param polydata: vtkPolyData对象
+        '''
+        self.counts[direction] = (polydata.GetNumberOfPoints(), polydata.GetNumberOfPolys())
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        '''
+        生成 Server-Timing 响应头，各阶段以及总耗时，单位为毫秒。
+
+        :return: str
+        '''
+        entries = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items()]
+        entries.append(f'total;dur={self.total() * 1000:.1f}')
+        return ', '.join(entries)
+
+
+class Histogram:
+    '''
+    Prometheus 风格的累积直方图，按标签分别统计。
+    '''
+
+    def __init__(self, name, documentation, label_names, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series['buckets'][i] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self.series.items()):
+            label_text = ','.join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + ',' if label_text else ''
+            for bound, count in zip(self.buckets, series['buckets']):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series["count"]}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {series["sum"]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {series["count"]}')
+        return lines
+
+
+class MetricsRegistry:
+    '''
+    进程内的指标注册表，以 Prometheus 文本格式输出，不依赖任何外部服务。
+
+    每个 worker 进程各自统计，抓取时得到的是处理该次抓取请求的 worker 的数据。
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.request_duration = Histogram('teethsite_request_duration_seconds', '牙根生成请求的总耗时',
+                                          ('endpoint',), DURATION_BUCKETS)
+        self.stage_duration = Histogram('teethsite_stage_duration_seconds', '牙根生成各阶段的耗时',
+                                        ('stage',), DURATION_BUCKETS)
+        self.mesh_vertices = Histogram('teethsite_mesh_vertices', '输入牙冠和输出牙根网格的点数',
+                                       ('direction',), SIZE_BUCKETS)
+        self.mesh_triangles = Histogram('teethsite_mesh_triangles', '输入牙冠和输出牙根网格的三角形数',
+                                        ('direction',), SIZE_BUCKETS)
+
+    def observe(self, endpoint, status, timer):
+        '''
+        记录一次请求的耗时、各阶段耗时和网格规模。
+
+        :param endpoint: str，接口名称
+        :param status: int，HTTP 状态码
+        :param timer: StageTimer对象
+        '''
+        with self._lock:
+            key = (endpoint, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.request_duration.observe((endpoint,), timer.total())
+            for name, seconds in timer.stages.items():
+                self.stage_duration.observe((name,), seconds)
+            for direction, (vertices, triangles) in timer.counts.items():
+                self.mesh_vertices.observe((direction,), vertices)
+                self.mesh_triangles.observe((direction,), triangles)
+
+    def render(self, extra_metrics=()):
+        '''
+        以 Prometheus 文本格式输出全部指标。
+
+        :param extra_metrics: 额外输出的单值指标，每个元素为 (名称, 类型 counter/gauge, 说明, 数值)
+        :return: str
+        '''
+        with self._lock:
+            lines = ['# HELP teethsite_requests_total 牙根生成请求数', '# TYPE teethsite_requests_total counter']
+            for (endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f'teethsite_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+            for histogram in (self.request_duration, self.stage_duration, self.mesh_vertices, self.mesh_triangles):
+                lines.extend(histogram.render())
+        for name, metric_type, documentation, value in extra_metrics:
+            lines.extend([f'# HELP {name} {documentation}', f'# TYPE {name} {metric_type}', f'{name} {value}'])
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry()
@@ -0,0 +1,115 @@
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from backend.utils import zstandard
+
+
+def parse_accept_encoding(header):
+    '''
+    解析 Accept-Encoding 请求头。
+
+    :param header: str，Accept-Encoding 的值
+    :return: dict，编码名称 → q 值
+    '''
+    encodings = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[name] = quality
+    return encodings
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    '''
+    按 Accept-Encoding 协商压缩响应，优先使用 zstd（需要安装 zstandard），其次是 gzip。
+
+    与 django.middleware.gzip.GZipMiddleware 的行为一致，但压缩级别可以配置：
+    settings.ROOT_GZIP_LEVEL（默认 6）、settings.ROOT_ZSTD_LEVEL（默认 3），
+    小于 settings.ROOT_COMPRESS_MIN_BYTES（默认 200）字节的响应不压缩。
+    流式响应按块压缩并立即刷新，前端可以边接收边解压。
+    '''
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.gzip_level = getattr(settings, 'ROOT_GZIP_LEVEL', 6)
+        self.zstd_level = getattr(settings, 'ROOT_ZSTD_LEVEL', 3)
+        self.min_bytes = getattr(settings, 'ROOT_COMPRESS_MIN_BYTES', 200)
+
+    def choose_encoding(self, request):
+        accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if zstandard is not None and accepted.get('zstd', 0) > 0:
+            return 'zstd'
+        if accepted.get('gzip', 0) > 0:
+            return 'gzip'
+        return None
+
+    def create_compressor(self, encoding):
+        '''
+        创建流式压缩对象。
+
+        :param encoding: 'gzip' 或 'zstd'
+        :return: (compress(data) -> bytes, flush() -> bytes, finish() -> bytes)
+        '''
+        if encoding == 'zstd':
+            compressor = zstandard.ZstdCompressor(level=self.zstd_level).compressobj()
+            return (compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+                    compressor.flush)
+        # wbits=31 输出带 gzip 头和校验的数据
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < self.min_bytes:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.choose_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response, encoding)
+            # 压缩后的长度在发送完之前无法确定
+            del response.headers['Content-Length']
+        else:
+            compress, _, finish = self.create_compressor(encoding)
+            content = compress(response.content) + finish()
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers['Content-Length'] = str(len(content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def compress_stream(self, response, encoding):
+        compress, flush, finish = self.create_compressor(encoding)
+        chunks = response.streaming_content
+        if response.is_async:
+            async def compressed():
+                async for chunk in chunks:
+                    yield compress(chunk) + flush()
+                yield finish()
+        else:
+            def compressed():
+                for chunk in chunks:
+                    yield compress(chunk) + flush()
+                yield finish()
+        return compressed()
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.1 on 2026-10-17 02:08
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RootJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tooth_name', models.CharField(blank=True, max_length=64)),
+                ('json_part', models.JSONField()),
+                ('polydata', models.BinaryField()),
+                ('quality', models.CharField(default='final', max_length=16)),
+                ('binary', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('succeeded', 'succeeded'), ('failed', 'failed')], db_index=True, default='pending', max_length=16)),
+                ('stage', models.CharField(blank=True, max_length=32)),
+                ('progress', models.FloatField(default=0.0)),
+                ('result', models.BinaryField(null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
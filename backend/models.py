@@ -1,3 +1,40 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class RootJob(models.Model):
+    '''
+    异步牙根生成任务。
+
+    输入、进度和结果都保存在数据库中，worker 重启后未完成的任务可以重新执行。
+    '''
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'pending'),
+        (STATUS_RUNNING, 'running'),
+        (STATUS_SUCCEEDED, 'succeeded'),
+        (STATUS_FAILED, 'failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tooth_name = models.CharField(max_length=64, blank=True)
+    json_part = models.JSONField()
+    # 牙冠的原始上传数据，任务完成后清空
+    polydata = models.BinaryField()
+    quality = models.CharField(max_length=16, default='final')
+    binary = models.BooleanField(default=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    stage = models.CharField(max_length=32, blank=True)
+    progress = models.FloatField(default=0.0)
+    # 序列化后的牙根网格：binary 为 True 时是二进制网格，否则是 Base64 编码的 XML
+    result = models.BinaryField(null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.tooth_name} ({self.status})'
@@ -0,0 +1,465 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from vtkmodules.vtkCommonDataModel import vtkPolyData
+from vtkmodules.vtkCommonExecutionModel import vtkTrivialProducer
+from vtkmodules.vtkFiltersCore import vtkTriangleFilter
+from vtkmodules.vtkFiltersSources import vtkSphereSource
+from vtkmodules.vtkIOXML import vtkXMLPolyDataWriter
+from vtkmodules.util.vtkAlgorithm import VTKPythonAlgorithmBase
+from django.conf import settings
+from django.urls import get_resolver
+
+from backend.cache import ResultCache
+from backend.metrics import StageTimer
+from backend.root import RootCone
+from backend.utils import parse_polydata, smooth_polydata, create_windowed_sinc, \
+    create_edge_filter, translate_polydata, weld_polydata, polydata_to_string, smooth_line, \
+    create_closed_surface, create_new_line, clean_single_point_faces, downsample_closed_line, \
+    polydata_to_bytes, SMOOTH_PRESETS, DEFAULT_SMOOTH_PRESET, XML_COMPRESSOR, XML_COMPRESSION_LEVEL
+
+logger = logging.getLogger(__name__)
+
+# 预热时使用的合成牙根参数，与 warm_up 中的球冠配合
+WARM_UP_ROOT = {
+    'toothName': 'warm-up',
+    'bottomSphereCenter': [0.0, 0.0, 6.0],
+    'topSphereCenter': [0.0, 0.0, -4.0],
+    'radiusSphereCenter': [2.0, 0.0, -4.0],
+}
+
+# 牙根网格由两个侧面条带（各 2N 个三角形）和根部的圆（N 个三角形）组成，N 为平滑后边界线的点数
+TRIANGLES_PER_BOUNDARY_POINT = 5
+# 降低分辨率时边界线至少保留的点数
+MIN_BOUNDARY_POINTS = 8
+
+_process_pool = None
+_thread_pool = None
+_stage_cache = None
+
+
+class SinglePointFaceFilter(VTKPythonAlgorithmBase):
+    '''
+    以 VTK 过滤器的形式封装 clean_single_point_faces，便于通过输出端口连接到流水线中。
+    '''
+
+    def __init__(self):
+        VTKPythonAlgorithmBase.__init__(self, nInputPorts=1, inputType='vtkPolyData',
+                                        nOutputPorts=1, outputType='vtkPolyData')
+
+    def RequestData(self, request, inInfo, outInfo):
+        input_polydata = vtkPolyData.GetData(inInfo[0])
+        output = vtkPolyData.GetData(outInfo)
+        output.ShallowCopy(clean_single_point_faces(input_polydata))
+        return 1
+
+
+class RootPipeline:
+    '''
+    牙根生成流水线，每个请求执行一次。
+
+    牙冠部分（平滑 → 删除孤立面片 → 提取边界）通过输出端口连接成一条 VTK 流水线，只在末端 Update 一次；
+    各步骤之间共享点坐标和面片数组，不做 DeepCopy。执行后 report 中记录：
+    run 结束时各阶段的输出仍持有的数据字节数（final_data_bytes，共享的数组只计算一次，不是执行过程中的峰值）、
+    牙冠的平滑和删除孤立面片两个阶段中不必要的整网格数组拷贝次数（crown_stage_copies，不检查其他阶段），
+    以及牙冠阶段是否命中阶段缓存（stage_cache）。
+    '''
+
+    def __init__(self, quality=DEFAULT_SMOOTH_PRESET, boundary_spacing=None, on_stage=None, timer=None,
+                 stage_cache=None, lod=0, max_triangles=None):
+        '''
+        :param quality: 平滑质量预设的名称，见 SMOOTH_PRESETS
+        :param boundary_spacing: 平滑后边界线的弧长间距，为 None 时使用默认分辨率
+        :param lod: 输出网格的细节级别，0 为完整分辨率，每增加一级边界线的点数减半
+        :param max_triangles: 可选的输出三角形数上限
+        :param on_stage: 可选的回调 on_stage(stage, progress)，每个阶段开始时调用，progress 取值 [0, 1]
+        :param timer: 可选的 StageTimer，记录各阶段耗时和网格规模，未指定时新建一个
+        :param stage_cache: 可选的 ResultCache，缓存只依赖牙冠的中间结果，见 get_stage_cache
+        '''
+        self.quality = quality
+        self.stage_cache = stage_cache
+        self.lod = lod
+        self.max_triangles = max_triangles
+        self.preset = SMOOTH_PRESETS[quality]
+        self.boundary_spacing = boundary_spacing
+        self.on_stage = on_stage
+        self.timer = timer if timer is not None else StageTimer()
+        self.report = {}
+
+    def notify(self, stage, progress):
+        if self.on_stage is not None:
+            self.on_stage(stage, progress)
+
+    def create_smoother(self, polydata):
+        '''
+        创建流水线的平滑阶段。
+
+        需要抽稀时先完成抽稀和平滑，再用 vtkTrivialProducer 接入流水线。
+
+        :param polydata: vtkPolyData对象，牙冠网格
+        :return: vtkAlgorithm对象，输出平滑后的网格
+        '''
+        preset = self.preset
+        if preset['decimate']:
+            producer = vtkTrivialProducer()
+            with self.timer.stage('smooth'):
+                producer.SetOutput(smooth_polydata(polydata, **preset))
+            return producer
+        smoother = create_windowed_sinc(preset['iterations'])
+        smoother.SetInputData(polydata)
+        self.timer.observe(smoother, 'smooth')
+        return smoother
+
+    def extract_boundary(self, polydata):
+        '''
+        牙冠阶段：平滑 → 删除孤立面片 → 提取牙齿边界，只依赖牙冠网格和平滑预设。
+
+        :param polydata: vtkPolyData对象，前端上传的牙冠网格
+        :return: (vtkPolyData 边界线, list 流水线持有的中间数据, list 检查整网格拷贝的阶段：平滑、删除孤立面片)
+        '''
+        self.notify('smooth', 0.0)
+        timer = self.timer
+        timer.count_mesh('input', polydata)
+        smoother = self.create_smoother(polydata)
+        cleaner = SinglePointFaceFilter()
+        cleaner.SetInputConnection(smoother.GetOutputPort())
+        timer.observe(cleaner, 'clean')
+        extract_edges = create_edge_filter()
+        extract_edges.SetInputConnection(cleaner.GetOutputPort())
+        timer.observe(extract_edges, 'boundary')
+        extract_edges.Update()
+
+        boundary_line = extract_edges.GetOutput()
+        if boundary_line.GetNumberOfPoints() == 0:
+            # 封闭网格没有边界，后续访问边界点会直接导致进程崩溃
+            raise ValueError('牙冠网格没有开放边界')
+
+        smoothed_polydata = smoother.GetOutputDataObject(0)
+        cleaned_polydata = cleaner.GetOutputDataObject(0)
+        modified = {'points', 'polys'} if self.preset['decimate'] else {'points'}
+        copy_stages = [
+            (polydata, smoothed_polydata, modified),
+            (smoothed_polydata, cleaned_polydata, {'polys'}),
+        ]
+        return boundary_line, [polydata, smoothed_polydata, cleaned_polydata], copy_stages
+
+    def apply_level_of_detail(self, smoothed_line):
+        '''
+        按 lod 和 max_triangles 降低边界线的点数。
+
+        牙根网格的三角形数与边界线的点数成正比，在序列化之前对边界线按弧长重新采样，
+        得到的仍是结构完整的条带网格，比对输出网格做通用的抽稀更快，也不会破坏两个侧面之间的对应关系。
+
+        :param smoothed_line: vtkPolyData对象，smooth_line 的输出
+        :return: vtkPolyData对象，点数不超过目标的闭合线
+        '''
+        num_points = smoothed_line.GetNumberOfPoints()
+        target = num_points >> self.lod if self.lod else num_points
+        if self.max_triangles is not None:
+            target = min(target, self.max_triangles // TRIANGLES_PER_BOUNDARY_POINT)
+        target = max(target, MIN_BOUNDARY_POINTS)
+        if target >= num_points:
+            return smoothed_line
+        return downsample_closed_line(smoothed_line, target)
+
+    def cached_stage(self, stage, key, compute):
+        '''
+        从阶段缓存中读取只依赖牙冠的中间结果，未命中时调用 compute 计算并写入缓存。
+
+        缓存中的 vtkPolyData 可能被多个线程同时使用，每次返回一个浅拷贝，共享只读的数据数组。
+
+        :param stage: str，阶段名称
+        :param key: tuple，该阶段所依赖的全部输入
+        :param compute: 无参数的函数，返回 vtkPolyData
+        :return: (vtkPolyData, bool 是否命中缓存)
+        '''
+        cache_key = f'{stage}:{key!r}'
+        cached = self.stage_cache.get(cache_key)
+        if cached is None:
+            value = compute()
+            # 缓存与产生它的过滤器分离的浅拷贝，不让缓存条目间接持有整条流水线
+            detached = vtkPolyData()
+            detached.ShallowCopy(value)
+            self.stage_cache.set(cache_key, detached)
+            return value, False
+        value = vtkPolyData()
+        value.ShallowCopy(cached)
+        return value, True
+
+    def run(self, polydata, points_info, mesh_key=None):
+        '''
+        根据牙冠网格和牙根的坐标数据生成牙根网格。
+
+        指定 mesh_key 时，只依赖牙冠的中间结果（牙冠边界、平滑后的边界线）按
+        网格 → 平滑预设 → 边界线间距 的依赖关系逐级缓存；只移动球心的请求只重新执行依赖 RootCone 的步骤。
+
+        :param polydata: vtkPolyData对象，前端上传的牙冠网格；也可以是返回 vtkPolyData 的无参数函数，
+            只在牙冠阶段未命中缓存时调用，命中时连解析也可以跳过
+        :param points_info: dict，牙根参数，包含 toothName 和各个球心坐标
+        :param mesh_key: 可选的网格内容摘要，用作阶段缓存的键
+        :return: vtkPolyData对象，生成的牙根网格
+        '''
+        timer = self.timer
+        crown_data = []
+        copy_stages = []
+
+        def compute_boundary():
+            crown = polydata() if callable(polydata) else polydata
+            boundary, data, stages = self.extract_boundary(crown)
+            crown_data.extend(data)
+            copy_stages.extend(stages)
+            return boundary
+
+        def compute_smoothed_line():
+            self.notify('boundary', 0.6)
+            with timer.stage('boundary'):
+                return smooth_line(boundary_line, spacing=self.boundary_spacing)
+
+        if mesh_key is None or self.stage_cache is None:
+            boundary_line = compute_boundary()
+            smoothed_line = compute_smoothed_line()
+            stage_cache = None
+        else:
+            boundary_line, boundary_hit = self.cached_stage('boundary', (mesh_key, self.quality),
+                                                            compute_boundary)
+            smoothed_line, _ = self.cached_stage(
+                'smoothed_line', (mesh_key, self.quality, self.boundary_spacing), compute_smoothed_line)
+            stage_cache = 'hit' if boundary_hit else 'miss'
+
+        self.notify('surface', 0.8)
+        with timer.stage('surface'):
+            smoothed_line = self.apply_level_of_detail(smoothed_line)
+            # 在牙齿上方构造一个圆，作为牙根的根部，该圆的分辨率需要与牙齿的边界对应，便于后续构造封闭图形
+            root_cone = RootCone(points_info)
+            root_cone.create_circle(resolution=smoothed_line.GetNumberOfPoints())
+            # 将边界线沿牙根方向平移一段距离
+            translate = [-component for component in root_cone.up_normal]
+            translate_edge = translate_polydata(smoothed_line, translate)
+            closed_surface = create_closed_surface(smoothed_line, translate_edge)
+
+            modified_circle = create_new_line(translate_edge, root_cone.circle)
+            # 平移后的边界线在两个条带中分别作为第二条、第一条线，接缝处的边方向相反，整体方向一致
+            closed_surface2 = create_closed_surface(translate_edge, modified_circle)
+            cap = root_cone.create_cap(modified_circle)
+            # 将两个侧面和封底拼接为一个网格，接缝处的顶点合并，不再重复
+            result = weld_polydata([closed_surface, closed_surface2, cap])
+
+        self.report = {
+            'final_data_bytes': data_bytes(crown_data + [
+                boundary_line, smoothed_line, translate_edge, closed_surface, modified_circle, closed_surface2,
+                root_cone.circle, cap, result,
+            ]),
+            'crown_stage_copies': count_mesh_copies(copy_stages),
+            'stage_cache': stage_cache,
+        }
+        timer.count_mesh('output', result)
+        logger.debug('root pipeline report: %s', self.report)
+        return result
+
+
+def polydata_arrays(polydata):
+    '''
+    列出 PolyData 持有的所有数据数组：点坐标、各类单元的 offsets/connectivity 以及点、单元属性。
+
+    :param polydata: vtkPolyData对象
+    :return: list，vtkDataArray 对象
+    '''
+    arrays = []
+    if polydata.GetPoints() is not None:
+        arrays.append(polydata.GetPoints().GetData())
+    for cells in (polydata.GetVerts(), polydata.GetLines(), polydata.GetPolys(), polydata.GetStrips()):
+        if cells is not None:
+            arrays.extend((cells.GetOffsetsArray(), cells.GetConnectivityArray()))
+    for attributes in (polydata.GetPointData(), polydata.GetCellData()):
+        arrays.extend(attributes.GetArray(i) for i in range(attributes.GetNumberOfArrays()))
+    return [array for array in arrays if array is not None]
+
+
+def data_bytes(polydata_list):
+    '''
+    统计一组 PolyData 同时持有的数据字节数，共享的数组只计算一次。
+
+    :param polydata_list: list，vtkPolyData 对象
+    :return: int，字节数
+    '''
+    arrays = {}
+    for polydata in polydata_list:
+        for array in polydata_arrays(polydata):
+            arrays[array.__this__] = array.GetNumberOfValues() * array.GetDataTypeSize()
+    return sum(arrays.values())
+
+
+def count_mesh_copies(stages):
+    '''
+    统计整网格数组的不必要拷贝次数。
+
+    对每个阶段，输出中该阶段本不需要修改的点坐标或面片数组如果不再与输入共享，记为一次拷贝。
+
+    :param stages: list，每个元素为 (输入网格, 输出网格, 该阶段会修改的数组集合)，集合元素为 'points' 或 'polys'
+    :return: int，拷贝次数
+    '''
+    def buffers(polydata):
+        return {
+            'points': polydata.GetPoints().GetData().__this__,
+            'polys': polydata.GetPolys().GetConnectivityArray().__this__,
+        }
+
+    copies = 0
+    for input_polydata, output_polydata, modified in stages:
+        input_buffers = buffers(input_polydata)
+        output_buffers = buffers(output_polydata)
+        copies += sum(1 for name in input_buffers
+                      if name not in modified and input_buffers[name] != output_buffers[name])
+    return copies
+
+
+def generate_root_polydata(polydata, points_info, boundary_spacing=None, quality=DEFAULT_SMOOTH_PRESET,
+                           timer=None, mesh_key=None, lod=0, max_triangles=None):
+    '''
+    根据牙冠网格和牙根的坐标数据生成牙根网格。
+
+    :param polydata: vtkPolyData对象，前端上传的牙冠网格，或返回 vtkPolyData 的无参数函数，见 RootPipeline.run
+    :param points_info: dict，牙根参数，包含 toothName 和各个球心坐标
+    :param boundary_spacing: 平滑后边界线的弧长间距，决定后续所有结构的分辨率，为 None 时使用默认分辨率
+    :param quality: 平滑质量预设的名称，见 SMOOTH_PRESETS
+    :param timer: 可选的 StageTimer，记录各阶段耗时
+    :param mesh_key: 可选的网格内容摘要，指定时使用进程内的阶段缓存（ROOT_STAGE_CACHE_MAX_BYTES 为 0 时除外）
+    :param lod: 输出网格的细节级别，0 为完整分辨率，每增加一级三角形数减半
+    :param max_triangles: 可选的输出三角形数上限
+    :return: vtkPolyData对象，生成的牙根网格
+    '''
+    stage_cache = get_stage_cache() if mesh_key is not None else None
+    if stage_cache is not None and stage_cache.max_bytes <= 0:
+        stage_cache = None
+    pipeline = RootPipeline(quality=quality, boundary_spacing=boundary_spacing, timer=timer,
+                            stage_cache=stage_cache, lod=lod, max_triangles=max_triangles)
+    return pipeline.run(polydata, points_info, mesh_key=mesh_key)
+
+
+def generate_root_task(polydata_buffer, points_info, binary=False, quality=DEFAULT_SMOOTH_PRESET,
+                       xml_options=None):
+    '''
+    在进程池中执行的单颗牙齿任务：解析牙冠、生成牙根并序列化结果。
+
+    vtkPolyData 无法在进程间传递，因此输入和输出都使用序列化后的数据。
+
+    :param polydata_buffer: bytes，牙冠的 VTK XML 数据
+    :param points_info: dict，牙根参数
+    :param binary: 为 True 时输出二进制网格，否则输出 Base64 编码的 XML 字符串
+    :param quality: 平滑质量预设的名称
+    :param xml_options: 可选的 dict，传给 polydata_to_string 的压缩参数，见 get_xml_options
+    :return: bytes 或 str，序列化后的牙根网格
+    '''
+    polydata = parse_polydata(polydata_buffer)
+    result = generate_root_polydata(polydata, points_info, quality=quality)
+    if binary:
+        return polydata_to_bytes(result)
+    return polydata_to_string(result, **(xml_options or {}))
+
+
+def get_xml_options():
+    '''
+    读取返回给前端的 VTK XML 的压缩参数。
+
+    settings.ROOT_XML_COMPRESSOR 为数据数组的压缩方式（zlib、lz4、lzma 或 none），
+    settings.ROOT_XML_COMPRESSION_LEVEL 为压缩级别（1 到 9），默认与 vtkXMLPolyDataWriter 一致。
+
+    :return: dict，polydata_to_string 的关键字参数
+    '''
+    return {
+        'compressor': getattr(settings, 'ROOT_XML_COMPRESSOR', XML_COMPRESSOR),
+        'compression_level': getattr(settings, 'ROOT_XML_COMPRESSION_LEVEL', XML_COMPRESSION_LEVEL),
+    }
+
+
+def polydata_memory_bytes(polydata):
+    return polydata.GetActualMemorySize() * 1024
+
+
+def get_stage_cache():
+    '''
+    获取进程内共享的阶段缓存，缓存只依赖牙冠的中间结果（边界线），首次调用时按 settings 创建。
+
+    settings.ROOT_STAGE_CACHE_MAX_BYTES 控制缓存的容量，超出时淘汰最久未使用的条目；设为 0 时不使用阶段缓存。
+
+    :return: ResultCache 对象
+    '''
+    global _stage_cache
+    if _stage_cache is None:
+        _stage_cache = ResultCache(max_bytes=getattr(settings, 'ROOT_STAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+                                   size_of=polydata_memory_bytes)
+    return _stage_cache
+
+
+def get_process_pool():
+    '''
+    获取用于批量生成牙根的进程池，首次调用时创建。
+
+    进程数由 settings.ROOT_BATCH_WORKERS 控制，未设置时使用 CPU 核数。
+
+    :return: ProcessPoolExecutor 对象
+    '''
+    global _process_pool
+    if _process_pool is None:
+        max_workers = getattr(settings, 'ROOT_BATCH_WORKERS', None) or os.cpu_count()
+        _process_pool = ProcessPoolExecutor(max_workers=max_workers)
+    return _process_pool
+
+
+def reset_process_pool():
+    '''
+    关闭并丢弃当前进程池，用于子进程异常退出导致进程池不可用的情况。
+
+    :return: 无返回值
+    '''
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def get_thread_pool():
+    '''
+    获取异步视图执行阻塞计算的线程池，首次调用时创建。
+
+    线程数由 settings.ROOT_ASYNC_WORKERS 控制，未设置时使用 CPU 核数，线程数即单进程的并发计算上限。
+
+    :return: ThreadPoolExecutor 对象
+    '''
+    global _thread_pool
+    if _thread_pool is None:
+        max_workers = getattr(settings, 'ROOT_ASYNC_WORKERS', None) or os.cpu_count()
+        _thread_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='root-vtk')
+    return _thread_pool
+
+
+def warm_up():
+    '''
+    用一个合成的球冠执行一次完整的解析、牙根生成和序列化。
+
+    worker 在开始接受请求之前调用，提前完成 VTK、numpy 等模块的延迟初始化，第一个真实请求不再承担这部分开销。
+
+    :return: 无返回值
+    '''
+    # Django 在第一个请求时才加载 URL 配置和视图模块，这里提前加载
+    get_resolver().url_patterns
+
+    sphere = vtkSphereSource()
+    sphere.SetRadius(5)
+    sphere.SetThetaResolution(32)
+    sphere.SetPhiResolution(32)
+    sphere.SetEndPhi(100)
+    triangles = vtkTriangleFilter()
+    triangles.SetInputConnection(sphere.GetOutputPort())
+    triangles.Update()
+
+    writer = vtkXMLPolyDataWriter()
+    writer.SetInputData(triangles.GetOutput())
+    writer.WriteToOutputStringOn()
+    writer.Write()
+    polydata = parse_polydata(writer.GetOutputString())
+
+    result = generate_root_polydata(polydata, WARM_UP_ROOT)
+    polydata_to_string(result)
+    polydata_to_bytes(result)
@@ -1,10 +1,14 @@
 import numpy as np
-import vtkmodules.all as vtk
+from vtkmodules.vtkCommonCore import vtkMath
+from vtkmodules.vtkCommonDataModel import vtkPolyData
+
+from backend.utils import numpy_to_cell_array, numpy_to_points, polydata_points_to_numpy
 
 class RootCone:
     def __init__(self, points_info):
         self.resolution = None
         self.circle = None
+        self.center = None
         self.clip_line = None
         self.cone = None
         self.tooth_name = points_info['toothName']
@@ -13,72 +17,78 @@ class RootCone:
         self.radius_sphere_center = points_info['radiusSphereCenter']
         self.up_normal = [0.0, 0.0, 0.0]
         self.origin_up_normal = [0.0, 0.0, 0.0]
-        vtk.vtkMath.Subtract(self.top_sphere_center, self.bottom_sphere_center, self.up_normal)
-        vtk.vtkMath.Subtract(self.top_sphere_center, self.bottom_sphere_center, self.origin_up_normal)
-        vtk.vtkMath.Normalize(self.up_normal)
+        vtkMath.Subtract(self.top_sphere_center, self.bottom_sphere_center, self.up_normal)
+        vtkMath.Subtract(self.top_sphere_center, self.bottom_sphere_center, self.origin_up_normal)
+        vtkMath.Normalize(self.up_normal)
         radius_normal = [0.0, 0.0, 0.0]
-        vtk.vtkMath.Subtract(self.radius_sphere_center, self.bottom_sphere_center, radius_normal)
-        self.radius = vtk.vtkMath.Normalize(radius_normal)
+        vtkMath.Subtract(self.radius_sphere_center, self.bottom_sphere_center, radius_normal)
+        self.radius = vtkMath.Normalize(radius_normal)
 
     def create_circle(self, resolution):
         '''
-        创建一个自定义分辨率的圆，带有三角面片。
+        创建一个自定义分辨率的圆，只包含圆上的点，封底的面片由 create_cap 构造。
 
         :param resolution: 创建圆时用于确定分辨率的整数值。
         :return: 一个vtkPolyData对象，代表创建的圆。
         '''
         self.resolution = resolution
-        # 创建vtkPolyData对象
-        circle = vtk.vtkPolyData()
         radius = self.radius
         height = 6
-        center = [
-            self.top_sphere_center[0] - height * self.up_normal[0],
-            self.top_sphere_center[1] - height * self.up_normal[1],
-            self.top_sphere_center[2] - height * self.up_normal[2],
-        ]
+        center = np.array(self.top_sphere_center) - height * np.array(self.up_normal)
         direction = self.up_normal
-        # 创建圆上的点
-        base_points = np.zeros((resolution, 3))
-        for i in range(resolution):
-            angle = 2 * np.pi * i / resolution
-            base_points[i, :] = [radius * np.cos(angle), radius * np.sin(angle), 0]
-
-        # 创建vtkPoints对象
-        points = vtk.vtkPoints()
-        for point in base_points:
-            points.InsertNextPoint(point)
-
-        # 创建vtkCellArray对象，连接圆弧
-        lines = vtk.vtkCellArray()
-        for i in range(resolution):
-            line = vtk.vtkLine()
-            line.GetPointIds().SetId(0, i)  # base point
-            line.GetPointIds().SetId(1, (i + 1) % resolution)  # tip point
-            lines.InsertNextCell(line)
-
-        # 创建vtkCellArray对象，构建三角面片
-        triangles = vtk.vtkCellArray()
-        for i in range(resolution):
-            triangle = vtk.vtkTriangle()
-            triangle.GetPointIds().SetId(0, 0)  # center
-            triangle.GetPointIds().SetId(1, i)  # current point
-            triangle.GetPointIds().SetId(2, (i + 1) % resolution)  # next point
-            triangles.InsertNextCell(triangle)
-
-        # 设置圆的点、线和面
-        circle.SetPoints(points)
-        circle.SetLines(lines)
-        circle.SetPolys(triangles)
-
-        # 创建一个变换对象，用于将圆移动到指定的中心，并朝向指定的方向
-        transform = vtk.vtkTransform()
-        transform.Translate(center)
-        transform.RotateWXYZ(np.degrees(np.arccos(direction[2])), -direction[1], direction[0], 0)
-        transformFilter = vtk.vtkTransformPolyDataFilter()
-        transformFilter.SetTransform(transform)
-        transformFilter.SetInputData(circle)
-        transformFilter.Update()
-        self.circle = transformFilter.GetOutput()
-
-        return transformFilter
+
+        # 一次性计算圆上的点
+        angles = 2 * np.pi * np.arange(resolution) / resolution
+        base_points = np.column_stack((radius * np.cos(angles), radius * np.sin(angles), np.zeros(resolution)))
+
+        # 将圆绕 (-y, x, 0) 轴旋转到指定的方向，再移动到指定的中心，一次矩阵乘法完成
+        rotation = rotation_matrix([-direction[1], direction[0], 0.0],
+                                   np.arccos(np.clip(direction[2], -1.0, 1.0)))
+        points = base_points @ rotation.T + center
+
+        circle = vtkPolyData()
+        circle.SetPoints(numpy_to_points(points.astype(np.float32)))
+        self.circle = circle
+        self.center = center
+
+        return circle
+
+    def create_cap(self, line):
+        '''
+        以圆心为公共顶点构造封闭牙根底部的扇形三角面片。
+
+        第 i 个三角形为 (圆心, i, i+1)，与以 line 为第二条线的 create_closed_surface 条带方向一致，
+        拼接后接缝处的边被相邻两个三角形沿相反方向经过。
+
+        :param line: vtkPolyData对象，与圆上的点重合的闭合线（可以是 create_new_line 重新排列后的圆）
+        :return: vtkPolyData对象，第 0 个点为圆心，之后是 line 的点
+        '''
+        line_points = polydata_points_to_numpy(line)
+        num_points = len(line_points)
+        point_ids = np.arange(1, num_points + 1)
+        next_ids = np.roll(point_ids, -1)
+        triangles = np.column_stack((np.zeros(num_points, dtype=np.int64), point_ids, next_ids))
+
+        cap = vtkPolyData()
+        cap.SetPoints(numpy_to_points(np.vstack((self.center, line_points)).astype(np.float32)))
+        cap.SetPolys(numpy_to_cell_array(triangles))
+        return cap
+
+
+def rotation_matrix(axis, angle):
+    '''
+    计算绕指定轴旋转指定角度的 3x3 旋转矩阵（Rodrigues 公式）。
+
+    与 vtkTransform.RotateWXYZ 一致，轴的长度为 0 时返回单位矩阵。
+
+    :param axis: 长度为 3 的旋转轴，不要求是单位向量
+    :param angle: 旋转角度（弧度）
+    :return: numpy 数组，(3, 3) 的旋转矩阵
+    '''
+    axis = np.asarray(axis, dtype=np.float64)
+    norm = np.linalg.norm(axis)
+    if norm == 0.0 or angle == 0.0:
+        return np.eye(3)
+    x, y, z = axis / norm
+    cross = np.array([[0.0, -z, y], [z, 0.0, -x], [-y, x, 0.0]])
+    return np.eye(3) + np.sin(angle) * cross + (1 - np.cos(angle)) * cross @ cross
@@ -0,0 +1,71 @@
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.test.utils import override_settings
+from vtkmodules.util.numpy_support import vtk_to_numpy
+from vtkmodules.vtkFiltersCore import vtkFeatureEdges, vtkPolyDataConnectivityFilter
+
+from backend.utils import polydata_points_to_numpy
+
+
+def mesh_arrays(polydata):
+    '''
+    返回网格的点坐标和三角形索引，便于逐元素比较。
+
+    :param polydata: vtkPolyData对象
+    :return: (numpy 数组 (N, 3), numpy 数组 (M, 3))
+    '''
+    triangles = vtk_to_numpy(polydata.GetPolys().GetConnectivityArray()).reshape(-1, 3)
+    return polydata_points_to_numpy(polydata), triangles
+
+
+def triangle_coordinates(polydata):
+    '''
+    按坐标排序的三角形顶点坐标，与点的编号和面片的顺序无关。
+
+    :param polydata: vtkPolyData对象
+    :return: numpy 数组，(M, 9)
+    '''
+    points, triangles = mesh_arrays(polydata)
+    coordinates = points[triangles].reshape(-1, 9)
+    return coordinates[np.lexsort(coordinates.T[::-1])]
+
+
+def boundary_loops(polydata):
+    '''
+    统计网格开放边界的连通分量数。
+
+    :param polydata: vtkPolyData对象
+    :return: (边界边数, 连通分量数)
+    '''
+    edges = vtkFeatureEdges()
+    edges.SetInputData(polydata)
+    edges.BoundaryEdgesOn()
+    edges.FeatureEdgesOff()
+    edges.NonManifoldEdgesOff()
+    edges.ManifoldEdgesOff()
+    connectivity = vtkPolyDataConnectivityFilter()
+    connectivity.SetInputConnection(edges.GetOutputPort())
+    connectivity.SetExtractionModeToAllRegions()
+    connectivity.Update()
+    return edges.GetOutput().GetNumberOfLines(), connectivity.GetNumberOfExtractedRegions()
+
+
+class IsolatedStateMixin:
+    '''
+    每个测试使用新的结果缓存、阶段缓存和网格存储，网格文件写到临时目录，测试之间互不影响。
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        settings_override = override_settings(ROOT_MESH_DIR=f'{self.temp_dir}/meshes')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for target in ('backend.cache._result_cache', 'backend.pipeline._stage_cache', 'backend.meshes._mesh_store'):
+            patcher = mock.patch(target, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
@@ -0,0 +1,172 @@
+import json
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+
+from backend.arch import mesh_labels, read_labels, resolve_label_type, split_arch
+from backend.cache import get_result_cache
+from backend.meshes import MeshStore
+from backend.pipeline import get_stage_cache
+from backend.tests.helpers import IsolatedStateMixin, boundary_loops, triangle_coordinates
+from backend.utils import polydata_points_to_numpy
+from benchmarks.crowns import crown_grid_shape, crown_to_xml, make_arch, make_crown
+
+
+def tooth_labels(arch):
+    return vtk_to_numpy(arch.GetPointData().GetArray('Label'))
+
+
+class MakeArchTests(SimpleTestCase):
+
+    def test_each_label_is_one_crown_and_gum_is_zero(self):
+        arch, teeth = make_arch(num_teeth=4, triangles_per_tooth=2000)
+        labels = tooth_labels(arch)
+        crown = make_crown(2000)
+        _, segments = crown_grid_shape(2000)
+        self.assertEqual([tooth['label'] for tooth in teeth], [12, 11, 21, 22])
+        for tooth in teeth:
+            self.assertEqual(np.count_nonzero(labels == tooth['label']), crown.GetNumberOfPoints())
+        self.assertEqual(np.count_nonzero(labels == 0), 4 * segments)
+        # 相邻牙齿之间没有共用的点，每颗牙冠加牙龈各自只有一圈外缘
+        self.assertEqual(boundary_loops(arch)[1], 4)
+
+
+class SplitArchTests(SimpleTestCase):
+
+    def test_point_labels_split_into_the_original_crowns(self):
+        arch, teeth = make_arch(num_teeth=3, triangles_per_tooth=2000, seed=5)
+        crowns = split_arch(arch, tooth_labels(arch), 'point', [tooth['label'] for tooth in teeth] + [99])
+        self.assertEqual(sorted(crowns), sorted(tooth['label'] for tooth in teeth))
+        for index, tooth in enumerate(teeth):
+            crown = make_crown(2000, seed=5 + index)
+            # make_arch 把牙冠平移到牙弓上，平移量与牙根参数中球心的平移相同
+            shift = np.float32(tooth['topSphereCenter'][0]), np.float32(tooth['topSphereCenter'][1])
+            expected = polydata_points_to_numpy(crown) + np.array([*shift, 0], dtype=np.float32)
+            crown.GetPoints().SetData(numpy_to_vtk(expected, deep=1))
+            np.testing.assert_array_equal(triangle_coordinates(crowns[tooth['label']]), triangle_coordinates(crown))
+            self.assertEqual(boundary_loops(crowns[tooth['label']])[1], 1)
+
+    def test_cell_labels_and_label_type_resolution(self):
+        arch, teeth = make_arch(num_teeth=2, triangles_per_tooth=2000)
+        point_labels = tooth_labels(arch)
+        triangles = vtk_to_numpy(arch.GetPolys().GetConnectivityArray()).reshape(-1, 3)
+        corner_labels = point_labels[triangles]
+        cell_labels = np.where((corner_labels == corner_labels[:, :1]).all(axis=1), corner_labels[:, 0], 0)
+        self.assertEqual(resolve_label_type(arch, cell_labels), 'cell')
+        self.assertEqual(resolve_label_type(arch, point_labels), 'point')
+        with self.assertRaises(ValueError):
+            resolve_label_type(arch, point_labels[:-1])
+
+        by_cell = split_arch(arch, cell_labels, 'cell', [teeth[0]['label']])
+        by_point = split_arch(arch, point_labels, 'point', [teeth[0]['label']])
+        np.testing.assert_array_equal(triangle_coordinates(by_cell[teeth[0]['label']]),
+                                      triangle_coordinates(by_point[teeth[0]['label']]))
+
+    def test_explicit_label_type_is_respected(self):
+        arch, _ = make_arch(num_teeth=2, triangles_per_tooth=2000)
+        self.assertEqual(mesh_labels(arch, label_type='point')[1], 'point')
+        with self.assertRaises(ValueError):
+            mesh_labels(arch, label_type='cell')
+        self.assertIsNone(mesh_labels(arch, 'Missing', 'cell'))
+
+    def test_read_labels(self):
+        labels = np.array([0, 11, -1], dtype='<i4')
+        np.testing.assert_array_equal(read_labels(memoryview(labels.tobytes())), labels)
+        with self.assertRaises(ValueError):
+            read_labels(b'\0' * 5)
+
+
+class MeshStoreLabelTests(IsolatedStateMixin, SimpleTestCase):
+
+    def test_label_arrays_survive_the_mesh_store(self):
+        arch, _ = make_arch(num_teeth=2, triangles_per_tooth=2000)
+        normals = numpy_to_vtk(np.zeros((arch.GetNumberOfPoints(), 3), dtype=np.float32), deep=1)
+        normals.SetName('Normals')
+        arch.GetPointData().AddArray(normals)
+        cell_ids = numpy_to_vtk(np.arange(arch.GetNumberOfPolys(), dtype=np.int64), deep=1)
+        cell_ids.SetName('FaceId')
+        arch.GetCellData().AddArray(cell_ids)
+
+        store = MeshStore(f'{self.temp_dir}/store')
+        handle, _ = store.put(crown_to_xml(arch, 'appended'))
+        info = store.info(handle)
+        self.assertEqual((info['pointData'], info['cellData']), (['Label'], ['FaceId']))
+
+        stored = store.get(handle)
+        labels, label_type = mesh_labels(stored)
+        self.assertEqual(label_type, 'point')
+        np.testing.assert_array_equal(labels, tooth_labels(arch))
+        np.testing.assert_array_equal(vtk_to_numpy(stored.GetCellData().GetArray('FaceId')),
+                                      np.arange(arch.GetNumberOfPolys()))
+        self.assertIsNone(stored.GetPointData().GetArray('Normals'))
+
+
+class ArchEndpointTests(IsolatedStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.arch, self.teeth = make_arch(num_teeth=3, triangles_per_tooth=2000)
+        self.arch_xml = crown_to_xml(self.arch, 'appended')
+
+    def generate(self, **data):
+        data['jsonPart'] = SimpleUploadedFile('jsonPart', json.dumps(self.teeth).encode())
+        return self.client.post('/backend/generate_root_arch/', data)
+
+    def clear_caches(self):
+        get_result_cache().clear()
+        get_stage_cache().clear()
+
+    def test_embedded_labels_work_with_uploads_and_mesh_handles(self):
+        response = self.generate(polyData=SimpleUploadedFile('polyData', self.arch_xml))
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(set(results), {tooth['toothName'] for tooth in self.teeth})
+        self.assertFalse([name for name, result in results.items() if 'error' in result])
+
+        handle = self.client.post('/backend/meshes/', {
+            'polyData': SimpleUploadedFile('polyData', self.arch_xml)}).json()['handle']
+        self.clear_caches()
+        from_handle = self.generate(meshHandle=handle)
+        self.assertEqual(from_handle.status_code, 200)
+        self.assertEqual(from_handle.json()['results'], results)
+
+        self.clear_caches()
+        labels = tooth_labels(self.arch).astype('<i4').tobytes()
+        separate = self.generate(meshHandle=handle, labels=SimpleUploadedFile('labels', labels))
+        self.assertEqual(separate.json()['results'], results)
+
+    def test_missing_or_mismatched_labels_return_400(self):
+        self.arch.GetPointData().RemoveArray('Label')
+        unlabelled = crown_to_xml(self.arch, 'appended')
+        self.assertEqual(self.generate(polyData=SimpleUploadedFile('polyData', unlabelled)).status_code, 400)
+        response = self.generate(polyData=SimpleUploadedFile('polyData', unlabelled),
+                                 labels=SimpleUploadedFile('labels', b'\0' * 4 * 10))
+        self.assertEqual(response.status_code, 400)
+
+    def test_label_array_option_is_part_of_the_cache_key(self):
+        # 第二个标签数组中第一颗牙齿被标为牙龈，按它切分时这颗牙齿不存在
+        partial = tooth_labels(self.arch).copy()
+        partial[partial == self.teeth[0]['label']] = 0
+        array = numpy_to_vtk(partial, deep=1)
+        array.SetName('Partial')
+        self.arch.GetPointData().AddArray(array)
+        handle = self.client.post('/backend/meshes/', {
+            'polyData': SimpleUploadedFile('polyData', crown_to_xml(self.arch, 'appended'))}).json()['handle']
+
+        full = self.generate(meshHandle=handle).json()['results']
+        self.assertFalse([name for name, result in full.items() if 'error' in result])
+        first_tooth = self.teeth[0]['toothName']
+        partial_results = self.generate(meshHandle=handle, labelArray='Partial').json()['results']
+        self.assertIn('error', partial_results[first_tooth])
+        self.assertEqual({name: result for name, result in partial_results.items() if name != first_tooth},
+                         {name: result for name, result in full.items() if name != first_tooth})
+
+        self.clear_caches()
+        self.assertEqual(self.generate(meshHandle=handle, labelArray='Partial').json()['results'], partial_results)
+
+    def test_label_type_contradicting_the_label_array_returns_400(self):
+        response = self.generate(polyData=SimpleUploadedFile('polyData', self.arch_xml), labelType='cell')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('labelType', response.json()['message'])
@@ -0,0 +1,52 @@
+import json
+import threading
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from django.test.client import AsyncClient
+
+from backend import views
+from backend.tests.helpers import IsolatedStateMixin
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+
+
+class GenerateRootAsyncTests(IsolatedStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crown = crown_to_xml(make_crown(2000))
+
+    def upload(self, name='UL1'):
+        return {
+            'polyData': SimpleUploadedFile('polyData', self.crown),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params(name)).encode()),
+        }
+
+    async def test_async_view_matches_sync_view_and_computes_off_the_event_loop(self):
+        threads = []
+
+        def recording_compute(*args):
+            threads.append(threading.current_thread().name)
+            return compute_root_body(*args)
+
+        compute_root_body = views.compute_root_body
+        with mock.patch('backend.views.compute_root_body', recording_compute):
+            response = await AsyncClient().post('/backend/generate_root_async/', self.upload())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('root-vtk'))
+
+        # 同步接口命中异步接口写入的结果缓存时响应体也应完全相同，这里先清空缓存再比较
+        views.get_result_cache().clear()
+        expected = self.client.post('/backend/generate_root/', self.upload())
+        self.assertEqual(response.content, expected.content)
+
+    async def test_invalid_quality_is_rejected(self):
+        response = await AsyncClient().post('/backend/generate_root_async/?quality=bogus', self.upload())
+        self.assertEqual(response.status_code, 400)
+
+    async def test_crown_without_boundary_is_rejected(self):
+        self.crown = b'not a mesh'
+        response = await AsyncClient().post('/backend/generate_root_async/', self.upload())
+        self.assertEqual(response.status_code, 400)
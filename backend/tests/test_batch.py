@@ -0,0 +1,72 @@
+import base64
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from vtkmodules.vtkFiltersCore import vtkTriangleFilter
+from vtkmodules.vtkFiltersSources import vtkSphereSource
+
+from backend import pipeline
+from backend.pipeline import get_process_pool, reset_process_pool
+from backend.tests.helpers import IsolatedStateMixin, mesh_arrays
+from backend.utils import parse_polydata
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+
+
+def closed_sphere_xml():
+    sphere = vtkSphereSource()
+    triangles = vtkTriangleFilter()
+    triangles.SetInputConnection(sphere.GetOutputPort())
+    triangles.Update()
+    return crown_to_xml(triangles.GetOutput())
+
+
+class BatchEndpointTests(IsolatedStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(reset_process_pool)
+
+    def test_results_match_single_requests_and_errors_stay_per_tooth(self):
+        crowns = {'UL1': crown_to_xml(make_crown(2000, seed=1)), 'UL2': crown_to_xml(make_crown(2000, seed=2)),
+                  'UL3': closed_sphere_xml()}
+        response = self.client.post('/backend/generate_root_batch/', {
+            'polyData': [SimpleUploadedFile('polyData', crown) for crown in crowns.values()],
+            'jsonPart': [SimpleUploadedFile('jsonPart', json.dumps(make_root_params(name)).encode())
+                         for name in crowns],
+        })
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(set(results), set(crowns))
+        self.assertIn('error', results['UL3'])
+
+        for name in ('UL1', 'UL2'):
+            single = self.client.post('/backend/generate_root/', {
+                'polyData': SimpleUploadedFile('polyData', crowns[name]),
+                'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params(name)).encode()),
+            }).json()['polydata']
+            expected_points, expected_triangles = mesh_arrays(parse_polydata(base64.b64decode(single)))
+            points, triangles = mesh_arrays(parse_polydata(base64.b64decode(results[name]['polydata'])))
+            np.testing.assert_array_equal(points, expected_points)
+            np.testing.assert_array_equal(triangles, expected_triangles)
+
+    def test_mismatched_parts_are_rejected(self):
+        response = self.client.post('/backend/generate_root_batch/', {
+            'polyData': [SimpleUploadedFile('polyData', crown_to_xml(make_crown(2000)))] * 2,
+            'jsonPart': [SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode())],
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class ProcessPoolTests(SimpleTestCase):
+
+    def test_reset_drops_the_pool(self):
+        self.addCleanup(reset_process_pool)
+        pool = get_process_pool()
+        self.assertIsInstance(pool, ProcessPoolExecutor)
+        self.assertIs(get_process_pool(), pool)
+        reset_process_pool()
+        self.assertIsNone(pipeline._process_pool)
+        self.assertIsNot(get_process_pool(), pool)
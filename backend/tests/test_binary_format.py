@@ -0,0 +1,58 @@
+import base64
+import json
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from vtkmodules.vtkFiltersSources import vtkPlaneSource
+
+from backend.tests.helpers import IsolatedStateMixin, mesh_arrays
+from backend.utils import MESH_CONTENT_TYPE, MESH_HEADER, bytes_to_polydata, parse_polydata, polydata_to_bytes
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+
+
+class BinaryMeshFormatTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        crown = make_crown(2000)
+        mesh_bytes = polydata_to_bytes(crown)
+        points, triangles = mesh_arrays(crown)
+        self.assertEqual(len(mesh_bytes), MESH_HEADER.size + 12 * len(points) + 12 * len(triangles))
+        decoded_points, decoded_triangles = mesh_arrays(bytes_to_polydata(mesh_bytes))
+        np.testing.assert_array_equal(decoded_points, points)
+        np.testing.assert_array_equal(decoded_triangles, triangles)
+
+    def test_quads_are_triangulated(self):
+        plane = vtkPlaneSource()
+        plane.SetResolution(3, 2)
+        plane.Update()
+        decoded = bytes_to_polydata(polydata_to_bytes(plane.GetOutput()))
+        self.assertEqual(decoded.GetNumberOfPolys(), 12)
+        self.assertEqual(decoded.GetNumberOfPoints(), 12)
+
+    def test_rejects_unknown_magic(self):
+        mesh_bytes = bytearray(polydata_to_bytes(make_crown(2000)))
+        mesh_bytes[:4] = b'XXXX'
+        with self.assertRaises(ValueError):
+            bytes_to_polydata(bytes(mesh_bytes))
+
+
+class BinaryResponseTests(IsolatedStateMixin, SimpleTestCase):
+
+    def post(self, **headers):
+        return self.client.post('/backend/generate_root/', {
+            'polyData': SimpleUploadedFile('polyData', crown_to_xml(make_crown(2000))),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode()),
+        }, **headers)
+
+    def test_accept_header_selects_binary_response(self):
+        binary = self.post(HTTP_ACCEPT=MESH_CONTENT_TYPE)
+        self.assertEqual(binary['Content-Type'], MESH_CONTENT_TYPE)
+        legacy = self.post()
+        self.assertEqual(legacy['Content-Type'], 'application/json')
+
+        from_xml = parse_polydata(base64.b64decode(legacy.json()['polydata']))
+        expected_points, expected_triangles = mesh_arrays(from_xml)
+        points, triangles = mesh_arrays(bytes_to_polydata(binary.content))
+        np.testing.assert_allclose(points, expected_points, rtol=1e-6)
+        np.testing.assert_array_equal(triangles, expected_triangles)
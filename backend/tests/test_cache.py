@@ -0,0 +1,104 @@
+import json
+import os
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from backend.cache import ResultCache, get_result_cache, make_cache_key
+from backend.tests.helpers import IsolatedStateMixin
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+
+
+class CacheKeyTests(SimpleTestCase):
+
+    def test_json_part_key_order_does_not_matter(self):
+        params = make_root_params()
+        reordered = dict(reversed(list(params.items())))
+        self.assertEqual(make_cache_key('a' * 64, params, 'xml'), make_cache_key('a' * 64, reordered, 'xml'))
+
+    def test_every_part_changes_the_key(self):
+        params = make_root_params()
+        key = make_cache_key('a' * 64, params, 'xml', {'compressor': 'zlib', 'compression_level': 5})
+        self.assertNotEqual(key, make_cache_key('b' * 64, params, 'xml', {'compressor': 'zlib', 'compression_level': 5}))
+        self.assertNotEqual(key, make_cache_key('a' * 64, make_root_params('UL2'), 'xml',
+                                                {'compressor': 'zlib', 'compression_level': 5}))
+        self.assertNotEqual(key, make_cache_key('a' * 64, params, 'binary',
+                                                {'compressor': 'zlib', 'compression_level': 5}))
+        self.assertNotEqual(key, make_cache_key('a' * 64, params, 'xml', {'compressor': 'zlib', 'compression_level': 9}))
+
+
+class ResultCacheTests(IsolatedStateMixin, SimpleTestCase):
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        cache = ResultCache(max_bytes=10)
+        cache.set('a', b'aaaa')
+        cache.set('b', b'bbbb')
+        cache.get('a')
+        cache.set('c', b'cccc')
+        self.assertEqual(cache.get('a'), b'aaaa')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_disk_tier_is_shared_between_processes(self):
+        directory = os.path.join(self.temp_dir, 'results')
+        ResultCache(max_bytes=100, directory=directory).set('ab' * 32, b'payload')
+        other = ResultCache(max_bytes=100, directory=directory)
+        self.assertEqual(other.stats()['disk_bytes'], len(b'payload'))
+        self.assertEqual(other.get('ab' * 32), b'payload')
+        self.assertEqual(other.stats()['disk_hits'], 1)
+
+    def test_disk_tier_evicts_oldest_files_above_cap(self):
+        directory = os.path.join(self.temp_dir, 'results')
+        cache = ResultCache(max_bytes=100, directory=directory, max_disk_bytes=35)
+        keys = [f'{index:02d}' * 32 for index in range(3)]
+        for age, key in zip((30, 20, 10), keys):
+            cache.set(key, b'x' * 10)
+            path = cache._disk_path(key)
+            os.utime(path, (os.path.getmtime(path) - age,) * 2)
+        # 读取第一个键使其成为最近使用的文件
+        cache.clear()
+        cache.get(keys[0])
+
+        cache.set('ff' * 32, b'x' * 10)
+        remaining = {key for key in keys + ['ff' * 32] if os.path.exists(cache._disk_path(key))}
+        self.assertEqual(remaining, {keys[0], keys[2], 'ff' * 32})
+        stats = cache.stats()
+        self.assertEqual(stats['disk_bytes'], 30)
+        self.assertEqual(stats['disk_evictions'], 1)
+
+
+class EndpointCacheTests(IsolatedStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crown_xml = crown_to_xml(make_crown(2000))
+
+    def generate(self):
+        return self.client.post('/backend/generate_root/', {
+            'polyData': SimpleUploadedFile('polyData', self.crown_xml),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode()),
+        })
+
+    def test_repeated_request_hits_cache(self):
+        first = self.generate()
+        second = self.generate()
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(get_result_cache().stats()['hits'], 1)
+
+    def test_xml_options_are_part_of_the_key(self):
+        self.generate()
+        with override_settings(ROOT_XML_COMPRESSOR='none'):
+            uncompressed = self.generate()
+        self.assertEqual(get_result_cache().stats()['hits'], 0)
+        self.assertEqual(get_result_cache().stats()['entries'], 2)
+        self.assertEqual(uncompressed.status_code, 200)
+
+    def test_single_and_batch_requests_share_entries(self):
+        single = self.generate().json()['polydata']
+        response = self.client.post('/backend/generate_root_batch/', {
+            'polyData': [SimpleUploadedFile('polyData', self.crown_xml)],
+            'jsonPart': [SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode())],
+        })
+        self.assertEqual(response.json()['results']['UL1']['polydata'], single)
+        stats = get_result_cache().stats()
+        self.assertEqual((stats['hits'], stats['entries']), (1, 1))
@@ -0,0 +1,147 @@
+import gzip
+import json
+import zlib
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from backend.middleware import parse_accept_encoding
+from backend.tests.helpers import IsolatedStateMixin
+from backend.utils import decompress_buffer, zstandard
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+
+
+def compress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(data)
+    # 流式压缩，帧头中不记录原始大小，与前端的流式压缩一致
+    compressor = zstandard.ZstdCompressor().compressobj()
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+        return reader.read()
+
+
+class DecompressBufferTests(SimpleTestCase):
+
+    def encodings(self):
+        return ('gzip', 'zstd') if zstandard is not None else ('gzip',)
+
+    def test_round_trip_and_uncompressed_data_is_returned_as_is(self):
+        data = b'<VTKFile>' + bytes(range(256)) * 100
+        for encoding in self.encodings():
+            self.assertEqual(bytes(decompress_buffer(memoryview(compress(data, encoding)))), data)
+        buffer = memoryview(data)
+        self.assertIs(decompress_buffer(buffer), buffer)
+
+    def test_output_is_bounded(self):
+        data = b'\0' * 1000
+        for encoding in self.encodings():
+            payload = memoryview(compress(data, encoding))
+            self.assertEqual(len(decompress_buffer(payload, max_size=1000)), 1000)
+            with self.assertRaisesRegex(ValueError, '超过 999 字节'):
+                decompress_buffer(payload, max_size=999)
+
+    def test_gzip_members_are_concatenated(self):
+        payload = gzip.compress(b'first ') + gzip.compress(b'second') + b'\0' * 8
+        self.assertEqual(bytes(decompress_buffer(memoryview(payload))), b'first second')
+        with self.assertRaises(ValueError):
+            decompress_buffer(memoryview(payload), max_size=8)
+
+    def test_corrupt_or_truncated_gzip_is_rejected(self):
+        payload = gzip.compress(b'x' * 1000)
+        for broken in (payload[:-12], payload[:10] + b'\xff' * 20, payload + b'garbage'):
+            with self.assertRaises(ValueError):
+                decompress_buffer(memoryview(broken))
+
+
+class CompressedUploadTests(IsolatedStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crown = crown_to_xml(make_crown(2000))
+
+    def generate(self, polydata, **extra):
+        return self.client.post('/backend/generate_root/', {
+            'polyData': SimpleUploadedFile('polyData', polydata),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode()),
+        }, **extra)
+
+    def test_compressed_upload_gives_the_same_root(self):
+        expected = self.generate(self.crown).json()['polydata']
+        encodings = ('gzip', 'zstd') if zstandard is not None else ('gzip',)
+        for encoding in encodings:
+            response = self.generate(compress(self.crown, encoding))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['polydata'], expected)
+
+    @override_settings(ROOT_UPLOAD_MAX_DECOMPRESSED_BYTES=1024 * 1024)
+    def test_oversized_payload_is_rejected(self):
+        # 8 MiB 的零压缩后只有几 KB
+        bomb = gzip.compress(b'\0' * 8 * 1024 * 1024)
+        self.assertLess(len(bomb), 64 * 1024)
+        arch_teeth = [dict(make_root_params(), label=11)]
+        for path, json_part in (('/backend/generate_root/', make_root_params()), ('/backend/meshes/', None),
+                                ('/backend/generate_root_arch/', arch_teeth)):
+            response = self.client.post(path, {
+                'polyData': SimpleUploadedFile('polyData', bomb),
+                'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(json_part).encode()),
+            })
+            self.assertEqual(response.status_code, 400, path)
+            self.assertIn('超过', response.json()['message'], path)
+        if zstandard is not None:
+            self.assertEqual(self.generate(compress(b'\0' * 8 * 1024 * 1024, 'zstd')).status_code, 400)
+        # 未超过上限的压缩上传不受影响
+        self.assertEqual(self.generate(gzip.compress(self.crown)).status_code, 200)
+
+
+class ResponseCompressionTests(IsolatedStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crown = crown_to_xml(make_crown(2000))
+        self.expected = self.generate().content
+
+    def generate(self, query='', **headers):
+        return self.client.post(f'/backend/generate_root/{query}', {
+            'polyData': SimpleUploadedFile('polyData', self.crown),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode()),
+        }, headers=headers)
+
+    def test_accept_encoding_is_parsed_with_q_values(self):
+        self.assertEqual(parse_accept_encoding('gzip;q=0.5, ZSTD , br;q=x, '),
+                         {'gzip': 0.5, 'zstd': 1.0, 'br': 0.0})
+
+    def test_zstd_is_preferred_over_gzip(self):
+        response = self.generate(accept_encoding='gzip, zstd')
+        expected_encoding = 'zstd' if zstandard is not None else 'gzip'
+        self.assertEqual(response['Content-Encoding'], expected_encoding)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(decompress(response.content, expected_encoding), self.expected)
+
+        response = self.generate(accept_encoding='gzip, zstd;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.expected)
+
+    def test_uncompressed_without_accept_encoding_or_for_small_responses(self):
+        self.assertFalse(self.generate().has_header('Content-Encoding'))
+        response = self.client.get('/backend/meshes/not-a-handle/', headers={'accept_encoding': 'gzip'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_response_is_compressed_chunk_by_chunk(self):
+        response = self.generate('?stream=1', accept_encoding='gzip')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+        # 每块都以同步刷新结束，已收到的部分可以立即解压
+        decompressor = zlib.decompressobj(31)
+        received = decompressor.decompress(b''.join(chunks[:-1]))
+        self.assertTrue(self.expected.startswith(received))
+        self.assertGreater(len(received), 0)
+        self.assertEqual(received + decompressor.decompress(chunks[-1]), self.expected)
@@ -0,0 +1,79 @@
+import contextlib
+import gzip
+import io
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from backend.tests.helpers import boundary_loops, mesh_arrays, triangle_coordinates
+from backend.utils import decompress_buffer, detect_mesh_format, parse_polydata, zstandard
+from benchmarks.crowns import crown_grid_shape, crown_to_ply, crown_to_stl, crown_to_xml, make_crown, perturb_upload
+from benchmarks.suite import compare
+
+
+
+class PerturbUploadTests(SimpleTestCase):
+
+    def setUp(self):
+        crown = make_crown(2000)
+        self.uploads = {'xml': crown_to_xml(crown), 'stl': crown_to_stl(crown), 'ply': crown_to_ply(crown)}
+        self.expected = triangle_coordinates(crown)
+
+    def assert_same_mesh(self, upload, mesh_format):
+        data = decompress_buffer(memoryview(upload))
+        self.assertEqual(detect_mesh_format(data), mesh_format)
+        np.testing.assert_allclose(triangle_coordinates(parse_polydata(data)), self.expected, rtol=1e-6)
+
+    def test_bytes_change_but_the_mesh_does_not(self):
+        for mesh_format, upload in self.uploads.items():
+            with self.subTest(mesh_format):
+                first, second = perturb_upload(upload, 1), perturb_upload(upload, 2)
+                self.assertEqual(len({upload, first, second}), 3)
+                self.assert_same_mesh(first, mesh_format)
+                self.assert_same_mesh(second, mesh_format)
+
+    def test_compressed_uploads_stay_compressed(self):
+        compressors = {'gzip': gzip.compress}
+        if zstandard is not None:
+            compressors['zstd'] = zstandard.ZstdCompressor().compress
+        for name, compress in compressors.items():
+            with self.subTest(name):
+                upload = compress(self.uploads['stl'])
+                perturbed = perturb_upload(upload, 1)
+                self.assertEqual(perturbed[:2], upload[:2])
+                self.assertNotEqual(bytes(decompress_buffer(memoryview(perturbed))), self.uploads['stl'])
+                self.assert_same_mesh(perturbed, 'stl')
+
+
+class MakeCrownTests(SimpleTestCase):
+
+    def test_same_seed_gives_the_same_mesh(self):
+        points, triangles = mesh_arrays(make_crown(5000, seed=3))
+        same_points, same_triangles = mesh_arrays(make_crown(5000, seed=3))
+        np.testing.assert_array_equal(points, same_points)
+        np.testing.assert_array_equal(triangles, same_triangles)
+        self.assertFalse(np.array_equal(points, mesh_arrays(make_crown(5000, seed=4))[0]))
+
+    def test_triangle_count_is_within_one_ring_of_the_target(self):
+        for target in (2000, 5000, 50000, 200000):
+            _, segments = crown_grid_shape(target)
+            self.assertLessEqual(abs(make_crown(target).GetNumberOfPolys() - target), 2 * segments)
+
+    def test_crown_has_one_open_margin(self):
+        crown = make_crown(5000)
+        _, segments = crown_grid_shape(5000)
+        self.assertEqual(boundary_loops(crown), (segments, 1))
+
+
+class CompareTests(SimpleTestCase):
+
+    def test_counts_entries_above_the_threshold(self):
+        def report(commit, timings):
+            return {'meta': {'commit': commit},
+                    'results': {'5000': {'functions': {name: {'min': value} for name, value in timings.items()}}}}
+
+        baseline = report('a', {'fast': 1.0, 'slow': 1.0, 'removed': 1.0})
+        current = report('b', {'fast': 0.5, 'slow': 1.3, 'added': 9.0})
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            self.assertEqual(compare(current, baseline, 1.25), 1)
+        self.assertIn('REGRESSION', output.getvalue())
@@ -0,0 +1,109 @@
+import base64
+import json
+import struct
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from backend.tests.helpers import IsolatedStateMixin, mesh_arrays, triangle_coordinates
+from backend.utils import STL_HEADER_SIZE, detect_mesh_format, parse_ply, parse_polydata, parse_stl, \
+    polydata_points_to_numpy
+from benchmarks.crowns import crown_to_ply, crown_to_stl, crown_to_xml, make_crown, make_root_params
+
+
+def ply_header(byte_order, vertex_properties, num_vertices, num_faces, face_list='uchar int'):
+    lines = ['ply', f'format {byte_order} 1.0', 'comment 测试', f'element vertex {num_vertices}']
+    lines += [f'property {prop_type} {name}' for name, prop_type in vertex_properties]
+    lines += [f'element face {num_faces}', f'property list {face_list} vertex_indices', 'end_header']
+    return ('\n'.join(lines) + '\n').encode()
+
+
+class StlTests(SimpleTestCase):
+
+    def test_binary_stl_is_welded_into_the_original_mesh(self):
+        crown = make_crown(2000)
+        stl = crown_to_stl(crown)
+        self.assertEqual(detect_mesh_format(stl), 'stl')
+        polydata = parse_polydata(stl)
+        self.assertEqual(polydata.GetNumberOfPoints(), crown.GetNumberOfPoints())
+        np.testing.assert_array_equal(triangle_coordinates(polydata), triangle_coordinates(crown))
+
+    def test_header_starting_with_solid_is_still_binary(self):
+        stl = crown_to_stl(make_crown(2000))
+        stl = b'solid exported by scanner'.ljust(80, b' ') + stl[80:]
+        self.assertEqual(detect_mesh_format(stl), 'stl')
+        self.assertEqual(parse_polydata(stl).GetNumberOfPolys(), make_crown(2000).GetNumberOfPolys())
+
+    def test_ascii_and_truncated_stl_are_rejected(self):
+        with self.assertRaisesRegex(ValueError, '二进制 STL'):
+            parse_polydata(b'solid crown\nfacet normal 0 0 1\n')
+        stl = crown_to_stl(make_crown(2000))
+        with self.assertRaisesRegex(ValueError, '不完整'):
+            parse_stl(stl[:-10])
+
+    def test_degenerate_triangles_are_dropped(self):
+        vertices = np.array([[[0, 0, 0], [1, 0, 0], [0, 1, 0]], [[0, 0, 0], [0, 0, 0], [1, 0, 0]]], np.float32)
+        records = np.zeros(2, dtype=[('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+        records['vertices'] = vertices
+        stl = bytes(80) + struct.pack('<I', 2) + records.tobytes()
+        self.assertEqual(len(stl), STL_HEADER_SIZE + 100)
+        self.assertEqual(parse_stl(stl).GetNumberOfPolys(), 1)
+
+
+class PlyTests(SimpleTestCase):
+
+    def test_vtk_written_ply_matches_the_mesh(self):
+        crown = make_crown(2000)
+        ply = crown_to_ply(crown)
+        self.assertEqual(detect_mesh_format(ply), 'ply')
+        expected_points, expected_triangles = mesh_arrays(crown)
+        points, triangles = mesh_arrays(parse_polydata(ply))
+        np.testing.assert_array_equal(points, expected_points)
+        np.testing.assert_array_equal(triangles, expected_triangles)
+
+    def test_big_endian_with_extra_properties_and_polygons(self):
+        points = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0], [2, 0, 0]], dtype=np.float32)
+        header = ply_header('binary_big_endian', [('x', 'float'), ('y', 'float'), ('z', 'float'),
+                                                  ('red', 'uchar'), ('quality', 'double')], 5, 2)
+        vertex = np.zeros(5, dtype=[('x', '>f4'), ('y', '>f4'), ('z', '>f4'), ('red', 'u1'), ('quality', '>f8')])
+        vertex['x'], vertex['y'], vertex['z'] = points.T
+        # 一个四边形和一个三角形
+        faces = bytes([4]) + struct.pack('>4i', 0, 1, 2, 3) + bytes([3]) + struct.pack('>3i', 1, 4, 2)
+        polydata = parse_ply(header + vertex.tobytes() + faces)
+        np.testing.assert_array_equal(polydata_points_to_numpy(polydata), points)
+        self.assertEqual(polydata.GetNumberOfPolys(), 2)
+        self.assertEqual(polydata.GetPolys().GetNumberOfConnectivityIds(), 7)
+
+    def test_ascii_and_truncated_ply_are_rejected(self):
+        header = ply_header('ascii', [('x', 'float'), ('y', 'float'), ('z', 'float')], 3, 1)
+        with self.assertRaisesRegex(ValueError, '二进制 PLY'):
+            parse_polydata(header + b'0 0 0\n1 0 0\n0 1 0\n3 0 1 2\n')
+        ply = crown_to_ply(make_crown(2000))
+        with self.assertRaises(ValueError):
+            parse_polydata(ply[:-100])
+        with self.assertRaisesRegex(ValueError, '文件头不完整'):
+            parse_polydata(b'ply\nformat binary_little_endian 1.0\n')
+
+
+class MeshFormatEndpointTests(IsolatedStateMixin, SimpleTestCase):
+
+    def generate(self, polydata):
+        return self.client.post('/backend/generate_root/', {
+            'polyData': SimpleUploadedFile('polyData', polydata),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode()),
+        })
+
+    def test_stl_and_ply_uploads_give_the_same_root_as_xml(self):
+        crown = make_crown(2000)
+        expected = triangle_coordinates(parse_polydata(base64.b64decode(
+            self.generate(crown_to_xml(crown)).json()['polydata'])))
+        for upload in (crown_to_stl(crown), crown_to_ply(crown)):
+            response = self.generate(upload)
+            self.assertEqual(response.status_code, 200)
+            root = parse_polydata(base64.b64decode(response.json()['polydata']))
+            np.testing.assert_allclose(triangle_coordinates(root), expected, atol=1e-4)
+
+    def test_ascii_stl_returns_400(self):
+        response = self.generate(b'solid crown\nfacet normal 0 0 1\n')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,128 @@
+import base64
+import json
+import runpy
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from backend import jobs
+from backend.models import RootJob
+from backend.tests.helpers import IsolatedStateMixin, mesh_arrays
+from backend.utils import parse_polydata
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+
+
+class RecordingExecutor:
+    '''
+    只记录提交的任务，由测试决定何时在当前线程中执行。
+    '''
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+
+
+class RootJobTests(IsolatedStateMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.executor = RecordingExecutor()
+        patcher = mock.patch('backend.jobs._job_executor', self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.crown = crown_to_xml(make_crown(2000))
+
+    def submit(self):
+        response = self.client.post('/backend/jobs/', {
+            'polyData': SimpleUploadedFile('polyData', self.crown),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode()),
+        })
+        self.assertEqual(response.status_code, 202)
+        return response.json()['job_id']
+
+    def test_finished_job_returns_the_same_root_as_generate_root(self):
+        job_id = self.submit()
+        self.assertEqual(self.executor.submitted, [(RootJob.objects.get().pk,)])
+        self.assertEqual(self.client.get(f'/backend/jobs/{job_id}/').json()['status'], RootJob.STATUS_PENDING)
+
+        jobs.run_job(job_id)
+        data = self.client.get(f'/backend/jobs/{job_id}/').json()
+        self.assertEqual((data['status'], data['stage'], data['progress']), (RootJob.STATUS_SUCCEEDED, 'done', 1.0))
+        # 任务完成后不再保留上传的牙冠
+        self.assertEqual(bytes(RootJob.objects.get(pk=job_id).polydata), b'')
+
+        single = self.client.post('/backend/generate_root/', {
+            'polyData': SimpleUploadedFile('polyData', self.crown),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode()),
+        }).json()['polydata']
+        expected_points, expected_triangles = mesh_arrays(parse_polydata(base64.b64decode(single)))
+        points, triangles = mesh_arrays(parse_polydata(base64.b64decode(data['polydata'])))
+        np.testing.assert_array_equal(points, expected_points)
+        np.testing.assert_array_equal(triangles, expected_triangles)
+
+    def test_job_claimed_by_another_worker_is_not_run_again(self):
+        job_id = self.submit()
+        RootJob.objects.filter(pk=job_id).update(status=RootJob.STATUS_RUNNING, stage='smooth')
+        with mock.patch('backend.jobs.RootPipeline') as pipeline:
+            jobs.run_job(job_id)
+        pipeline.assert_not_called()
+        self.assertEqual(RootJob.objects.get(pk=job_id).stage, 'smooth')
+
+    def test_failed_job_reports_the_error(self):
+        self.crown = b'not a mesh'
+        job_id = self.submit()
+        with self.assertLogs('backend.jobs', 'ERROR'):
+            jobs.run_job(job_id)
+        data = self.client.get(f'/backend/jobs/{job_id}/').json()
+        self.assertEqual(data['status'], RootJob.STATUS_FAILED)
+        self.assertTrue(data['error'])
+
+    def test_resume_requeues_pending_and_stale_running_jobs(self):
+        pending, stale, fresh, done = (self.submit() for _ in range(4))
+        self.executor.submitted.clear()
+        long_ago = timezone.now() - timedelta(hours=1)
+        RootJob.objects.filter(pk=stale).update(status=RootJob.STATUS_RUNNING, updated_at=long_ago)
+        RootJob.objects.filter(pk=fresh).update(status=RootJob.STATUS_RUNNING)
+        RootJob.objects.filter(pk=done).update(status=RootJob.STATUS_SUCCEEDED, updated_at=long_ago)
+
+        self.assertEqual(jobs.resume_jobs(), 2)
+        self.assertEqual({str(job_id) for job_id, in self.executor.submitted}, {pending, stale})
+        self.assertEqual(RootJob.objects.get(pk=fresh).status, RootJob.STATUS_RUNNING)
+
+    def test_worker_start_resumes_jobs_without_a_request(self):
+        pending, stale = self.submit(), self.submit()
+        RootJob.objects.filter(pk=stale).update(status=RootJob.STATUS_RUNNING,
+                                                updated_at=timezone.now() - timedelta(hours=1))
+        # 模拟 worker 重启：新进程中还没有线程池，之后也没有任何请求
+        restarted = RecordingExecutor()
+        with mock.patch('backend.jobs._job_executor', None), \
+                mock.patch('backend.jobs.ThreadPoolExecutor', return_value=restarted):
+            jobs.start_job_executor()
+            self.assertIs(jobs._job_executor, restarted)
+        self.assertEqual({str(job_id) for job_id, in restarted.submitted}, {pending, stale})
+
+    def test_worker_start_survives_a_database_error(self):
+        with mock.patch('backend.jobs._job_executor', None), \
+                mock.patch('backend.jobs.resume_jobs', side_effect=DatabaseError('no such table')), \
+                self.assertLogs('backend.jobs', 'ERROR'):
+            jobs.start_job_executor()
+            # 下一次调用 get_job_executor 时重新恢复
+            self.assertIsNone(jobs._job_executor)
+
+    @override_settings(ROOT_WARM_UP=False)
+    def test_gunicorn_worker_hook_resumes_jobs(self):
+        config = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+        with mock.patch('backend.jobs.start_job_executor') as start:
+            config['post_worker_init'](None)
+        start.assert_called_once_with()
+
+    def test_unknown_job_returns_404(self):
+        self.assertEqual(self.client.get('/backend/jobs/00000000-0000-0000-0000-000000000000/').status_code, 404)
@@ -0,0 +1,31 @@
+import json
+
+from django.test import SimpleTestCase
+
+from backend.tests.helpers import IsolatedStateMixin
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+from benchmarks.loadtest import encode_unique
+from benchmarks.throughput import encode_multipart
+
+
+def make_entry(files):
+    body, content_type = encode_multipart(files, None)
+    return {'files': files, 'fields': None, 'json_files': {}, 'body': body, 'content_type': content_type}
+
+
+class EncodeUniqueTests(IsolatedStateMixin, SimpleTestCase):
+
+    def test_unique_requests_miss_both_caches(self):
+        entry = make_entry({'polyData': crown_to_xml(make_crown(2000)),
+                            'jsonPart': json.dumps(make_root_params()).encode()})
+        bodies = [encode_unique(entry, sequence) for sequence in range(3)]
+        self.assertEqual(len({body for body, _ in bodies}), 3)
+        for body, content_type in bodies:
+            response = self.client.post('/backend/generate_root/', body, content_type=content_type)
+            self.assertEqual(response.status_code, 200)
+        stats = self.client.get('/backend/cache_stats/').json()
+        self.assertEqual((stats['hits'], stats['stage_cache']['hits']), (0, 0))
+
+    def test_mesh_handle_requests_are_sent_unchanged(self):
+        entry = make_entry({'jsonPart': json.dumps(dict(make_root_params(), meshHandle='0' * 64)).encode()})
+        self.assertEqual(encode_unique(entry, 1), (entry['body'], entry['content_type']))
@@ -0,0 +1,89 @@
+import base64
+import json
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from vtkmodules.vtkCommonDataModel import vtkPolyData
+
+from backend.tests.helpers import IsolatedStateMixin, mesh_arrays
+from backend.utils import MESH_CONTENT_TYPE, MESH_HEADER, bytes_to_polydata, downsample_closed_line, \
+    numpy_to_points, parse_polydata, polydata_points_to_numpy
+from backend.views import PROGRESSIVE_PREVIEW, progressive_steps
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+
+
+def root_triangles(response):
+    return parse_polydata(base64.b64decode(response.json()['polydata'])).GetNumberOfPolys()
+
+
+class DownsampleClosedLineTests(SimpleTestCase):
+
+    def test_line_stays_closed_with_even_spacing(self):
+        angles = np.linspace(0, 2 * np.pi, 201)
+        line = vtkPolyData()
+        line.SetPoints(numpy_to_points(np.column_stack((np.cos(angles), np.sin(angles), np.zeros_like(angles)))))
+
+        points = polydata_points_to_numpy(downsample_closed_line(line, 21))
+        self.assertEqual(len(points), 21)
+        np.testing.assert_array_equal(points[0], points[-1])
+        spacing = np.linalg.norm(np.diff(points, axis=0), axis=1)
+        self.assertLess(spacing.max() / spacing.min(), 1.01)
+        self.assertIs(downsample_closed_line(line, 500), line)
+
+    def test_progressive_steps_skip_a_preview_that_is_not_coarser(self):
+        self.assertEqual(progressive_steps('final', 0), [PROGRESSIVE_PREVIEW, ('final', 0)])
+        self.assertEqual(progressive_steps(*PROGRESSIVE_PREVIEW), [PROGRESSIVE_PREVIEW])
+
+
+class LevelOfDetailEndpointTests(IsolatedStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crown = crown_to_xml(make_crown(20000))
+
+    def generate(self, query='', **headers):
+        return self.client.post(f'/backend/generate_root/{query}', {
+            'polyData': SimpleUploadedFile('polyData', self.crown),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode()),
+        }, headers=headers)
+
+    def test_lod_and_max_triangles_reduce_the_root(self):
+        counts = [root_triangles(self.generate(f'?lod={lod}')) for lod in range(3)]
+        self.assertGreater(counts[0], counts[1])
+        self.assertGreater(counts[1], counts[2])
+        # 每增加一级三角形数大约减半
+        self.assertLess(counts[1], 0.6 * counts[0])
+        for max_triangles in (80, 150):
+            self.assertLessEqual(root_triangles(self.generate(f'?maxTriangles={max_triangles}')), max_triangles)
+
+    def test_invalid_values_are_rejected(self):
+        for query in ('?lod=-1', '?lod=5', '?lod=x', '?maxTriangles=0', '?maxTriangles=1.5'):
+            self.assertEqual(self.generate(query).status_code, 400, query)
+
+    def test_progressive_json_sends_preview_then_full_root(self):
+        expected = self.generate().json()
+        response = self.generate('?progressive=1')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        preview, final = (json.loads(line) for line in lines)
+        self.assertEqual(final, expected)
+        preview_triangles = parse_polydata(base64.b64decode(preview['polydata'])).GetNumberOfPolys()
+        preview_quality, preview_lod = PROGRESSIVE_PREVIEW
+        expected_preview = root_triangles(self.generate(f'?quality={preview_quality}&lod={preview_lod}'))
+        self.assertEqual(preview_triangles, expected_preview)
+
+    def test_progressive_binary_concatenates_two_meshes(self):
+        response = self.generate('?progressive=1', accept=MESH_CONTENT_TYPE)
+        body = b''.join(response.streaming_content)
+        _, _, _, num_points, num_triangles = MESH_HEADER.unpack_from(body)
+        preview_size = MESH_HEADER.size + 12 * (num_points + num_triangles)
+        preview = bytes_to_polydata(body[:preview_size])
+        final = bytes_to_polydata(body[preview_size:])
+        self.assertLess(preview.GetNumberOfPolys(), final.GetNumberOfPolys())
+        expected_points, expected_triangles = mesh_arrays(
+            bytes_to_polydata(self.generate(accept=MESH_CONTENT_TYPE).content))
+        points, triangles = mesh_arrays(final)
+        np.testing.assert_array_equal(points, expected_points)
+        np.testing.assert_array_equal(triangles, expected_triangles)
@@ -0,0 +1,107 @@
+import json
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from backend.pipeline import generate_root_polydata
+from backend.root import RootCone
+from backend.tests.helpers import IsolatedStateMixin, mesh_arrays
+from backend.utils import create_closed_surface, mesh_from_numpy, validate_manifold, weld_polydata, weld_vertices
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+
+# 四面体：四个方向一致（朝外）的三角形
+TETRAHEDRON_POINTS = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]], dtype=np.float32)
+TETRAHEDRON = np.array([[0, 2, 1], [0, 1, 3], [1, 2, 3], [0, 3, 2]])
+
+
+class WeldVerticesTests(SimpleTestCase):
+
+    def test_exact_weld_keeps_first_occurrence_order(self):
+        vertices = np.array([[1, 0, 0], [0, 0, 0], [1, 0, 0], [-0.0, 0, 0], [0, 1e-7, 0]], dtype=np.float32)
+        points, inverse = weld_vertices(vertices)
+        np.testing.assert_array_equal(points, vertices[[0, 1, 4]])
+        np.testing.assert_array_equal(inverse, [0, 1, 0, 1, 2])
+
+    def test_tolerance_merges_points_in_the_same_grid_cell(self):
+        vertices = np.array([[0, 0, 0], [0.00002, 0, 0], [0.001, 0, 0]], dtype=np.float32)
+        points, inverse = weld_vertices(vertices, tolerance=1e-4)
+        self.assertEqual(len(points), 2)
+        np.testing.assert_array_equal(inverse, [0, 0, 1])
+        self.assertEqual(weld_vertices(np.empty((0, 3)))[1].size, 0)
+
+    def test_weld_polydata_joins_parts_and_drops_duplicates(self):
+        points = TETRAHEDRON_POINTS
+        # 每个三角形单独作为一个网格，外加一个重复的三角形
+        parts = [mesh_from_numpy(points[triangle], np.array([[0, 1, 2]])) for triangle in TETRAHEDRON]
+        parts.append(mesh_from_numpy(points[TETRAHEDRON[0][::-1]], np.array([[0, 1, 2]])))
+        welded = weld_polydata(parts)
+        welded_points, triangles = mesh_arrays(welded)
+        self.assertEqual(len(welded_points), 4)
+        self.assertEqual(len(triangles), 4)
+        report = validate_manifold(welded)
+        self.assertTrue(report['manifold'])
+        self.assertEqual((report['boundary_edges'], report['euler_characteristic']), (0, 2))
+
+
+class ValidateManifoldTests(SimpleTestCase):
+
+    def test_flipped_duplicate_and_degenerate_triangles_are_reported(self):
+        flipped = TETRAHEDRON.copy()
+        flipped[0] = flipped[0][::-1]
+        report = validate_manifold(mesh_from_numpy(TETRAHEDRON_POINTS, flipped))
+        self.assertFalse(report['manifold'])
+        self.assertEqual(report['inconsistent_edges'], 3)
+
+        polydata = mesh_from_numpy(TETRAHEDRON_POINTS, TETRAHEDRON)
+        polys = polydata.GetPolys()
+        polys.InsertNextCell(3, [0, 2, 1])
+        polys.InsertNextCell(3, [1, 1, 2])
+        report = validate_manifold(polydata)
+        self.assertEqual((report['duplicate_triangles'], report['degenerate_triangles']), (1, 1))
+        self.assertEqual(report['non_manifold_edges'], 3)
+
+    def test_generated_roots_are_manifold_with_one_open_loop(self):
+        for crown_size, seed, quality, lod in ((2000, 0, 'final', 0), (20000, 1, 'preview', 2),
+                                               (5000, 2, 'standard', 0)):
+            root = generate_root_polydata(make_crown(crown_size, seed=seed), make_root_params(),
+                                          quality=quality, lod=lod)
+            report = validate_manifold(root)
+            self.assertTrue(report['manifold'], report)
+            self.assertEqual(report['boundary_loops'], 1)
+            self.assertEqual(report['unused_points'], 0)
+            # 只有一个开放边界环的圆盘，欧拉示性数为 1
+            self.assertEqual(report['euler_characteristic'], 1)
+
+
+class CreateCapTests(SimpleTestCase):
+
+    def test_cap_is_a_fan_that_closes_the_strip(self):
+        root_cone = RootCone(make_root_params())
+        root_cone.create_circle(resolution=12)
+        circle = root_cone.circle
+        cap = root_cone.create_cap(circle)
+        points, triangles = mesh_arrays(cap)
+        self.assertEqual(len(triangles), 12)
+        np.testing.assert_allclose(points[0], root_cone.center, atol=1e-5)
+        np.testing.assert_array_equal(triangles[:, 0], 0)
+        np.testing.assert_array_equal(triangles[:, 2], np.roll(triangles[:, 1], -1))
+
+        # 与以圆为第二条线的条带拼接后，接缝处的边被两侧沿相反方向经过
+        upper_cone = RootCone(dict(make_root_params(), topSphereCenter=[0.0, 0.0, -3.0]))
+        upper_cone.create_circle(resolution=12)
+        report = validate_manifold(weld_polydata([create_closed_surface(upper_cone.circle, circle), cap]))
+        self.assertTrue(report['manifold'], report)
+        self.assertEqual(report['boundary_loops'], 1)
+
+
+class ValidateEndpointTests(IsolatedStateMixin, SimpleTestCase):
+
+    def test_validate_adds_the_report_header(self):
+        response = self.client.post('/backend/generate_root/?validate=1', {
+            'polyData': SimpleUploadedFile('polyData', crown_to_xml(make_crown(2000))),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode()),
+        })
+        report = json.loads(response['X-Mesh-Validation'])
+        self.assertTrue(report['manifold'])
+        self.assertEqual(report['boundary_loops'], 1)
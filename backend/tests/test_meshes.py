@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from vtkmodules.util.numpy_support import vtk_to_numpy
+
+from backend.cache import get_result_cache
+from backend.meshes import MeshStore, directory_bytes, get_mesh_store
+from backend.tests.helpers import IsolatedStateMixin, mesh_arrays
+from backend.utils import parse_polydata
+from benchmarks.crowns import crown_to_xml, make_arch, make_crown, make_root_params
+
+
+def file_mappings():
+    '''
+    读取当前进程映射的文件区间（仅 Linux）。
+
+    :return: list，(起始地址, 结束地址, 文件路径)
+    '''
+    mappings = []
+    with open('/proc/self/maps') as f:
+        for line in f:
+            fields = line.split(maxsplit=5)
+            if len(fields) == 6:
+                start, end = (int(value, 16) for value in fields[0].split('-'))
+                mappings.append((start, end, fields[5].strip()))
+    return mappings
+
+
+class MeshStoreTests(IsolatedStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = MeshStore(f'{self.temp_dir}/store')
+        self.crown = crown_to_xml(make_crown(2000))
+
+    def test_get_maps_the_saved_arrays_without_copying(self):
+        handle, created = self.store.put(self.crown)
+        self.assertEqual((handle, created), (hashlib.sha256(self.crown).hexdigest(), True))
+        self.assertEqual(self.store.put(memoryview(self.crown)), (handle, False))
+
+        polydata = self.store.get(handle)
+        expected_points, expected_triangles = mesh_arrays(parse_polydata(self.crown))
+        points, triangles = mesh_arrays(polydata)
+        np.testing.assert_array_equal(points, expected_points)
+        np.testing.assert_array_equal(triangles, expected_triangles)
+        # vtk 数组的内存位于 points.npy 的映射区间内
+        address = vtk_to_numpy(polydata.GetPoints().GetData()).__array_interface__['data'][0]
+        self.assertTrue(any(path.endswith(f'{handle}/points.npy') and start <= address < end
+                            for start, end, path in file_mappings()))
+
+    def test_mapped_arrays_are_copy_on_write(self):
+        handle, _ = self.store.put(self.crown)
+        vtk_to_numpy(self.store.get(handle).GetPoints().GetData())[:] = 0
+        self.assertFalse(np.all(mesh_arrays(self.store.get(handle))[0] == 0))
+
+    def test_invalid_and_unknown_handles(self):
+        for handle in ('0' * 64, '../' + 'a' * 61, 'A' * 64):
+            self.assertFalse(self.store.exists(handle))
+            self.assertIsNone(self.store.get(handle))
+            self.assertIsNone(self.store.info(handle))
+
+    def test_mesh_without_polys_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.store.put(b'not a mesh')
+
+
+class MeshStoreEvictionTests(IsolatedStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crowns = [crown_to_xml(make_crown(2000, seed=seed)) for seed in range(3)]
+        probe = MeshStore(f'{self.temp_dir}/probe')
+        self.mesh_bytes = directory_bytes(probe._path(probe.put(self.crowns[0])[0]))
+
+    def test_least_recently_used_mesh_is_evicted(self):
+        store = MeshStore(f'{self.temp_dir}/store', max_bytes=int(2.5 * self.mesh_bytes))
+        first, _ = store.put(self.crowns[0])
+        second, _ = store.put(self.crowns[1])
+        os.utime(store._path(first), (100, 100))
+        os.utime(store._path(second), (200, 200))
+        # 使用过的网格排到最后
+        self.assertIsNotNone(store.get(first))
+        third, _ = store.put(self.crowns[2])
+
+        self.assertEqual([store.exists(handle) for handle in (first, second, third)], [True, False, True])
+        self.assertEqual(store.evictions, 1)
+        self.assertEqual(store.current_bytes, 2 * self.mesh_bytes)
+        self.assertEqual(MeshStore(store.directory).current_bytes, 2 * self.mesh_bytes)
+        self.assertEqual(store.put(self.crowns[1]), (second, True))
+
+    def test_mesh_larger_than_the_store_is_kept_until_the_next_upload(self):
+        store = MeshStore(f'{self.temp_dir}/store', max_bytes=1)
+        first, _ = store.put(self.crowns[0])
+        self.assertIsNotNone(store.get(first))
+        second, _ = store.put(self.crowns[1])
+        self.assertEqual([store.exists(handle) for handle in (first, second)], [False, True])
+
+    def test_partly_removed_mesh_is_missing(self):
+        store = MeshStore(f'{self.temp_dir}/store')
+        arch, _ = make_arch(num_teeth=2, triangles_per_tooth=2000)
+        for name in ('connectivity.npy', 'point-0.npy'):
+            handle, _ = store.put(crown_to_xml(arch))
+            os.remove(os.path.join(store._path(handle), name))
+            self.assertIsNone(store.get(handle))
+            self.assertIsNone(store.info(handle))
+            shutil.rmtree(store._path(handle))
+
+
+class MeshHandleEndpointTests(IsolatedStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crown = crown_to_xml(make_crown(2000))
+
+    def generate(self, **mesh):
+        data = {'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode())}
+        data.update(mesh)
+        return self.client.post('/backend/generate_root/', data)
+
+    def test_generating_from_a_handle_matches_the_upload(self):
+        response = self.client.post('/backend/meshes/', {'polyData': SimpleUploadedFile('polyData', self.crown)})
+        self.assertEqual(response.status_code, 201)
+        handle = response.json()['handle']
+        self.assertEqual(handle, hashlib.sha256(self.crown).hexdigest())
+        again = self.client.post('/backend/meshes/', {'polyData': SimpleUploadedFile('polyData', self.crown)})
+        self.assertEqual(again.status_code, 200)
+
+        info = self.client.get(f'/backend/meshes/{handle}/').json()
+        crown = make_crown(2000)
+        self.assertEqual((info['points'], info['polys']), (crown.GetNumberOfPoints(), crown.GetNumberOfPolys()))
+
+        from_handle = self.generate(meshHandle=handle)
+        get_result_cache().clear()
+        from_upload = self.generate(polyData=SimpleUploadedFile('polyData', self.crown))
+        self.assertEqual(from_handle.status_code, 200)
+        self.assertEqual(from_handle.content, from_upload.content)
+
+    def test_unknown_handle_returns_404(self):
+        self.assertEqual(self.client.get(f"/backend/meshes/{'0' * 64}/").status_code, 404)
+        self.assertEqual(self.client.get('/backend/meshes/not-a-handle/').status_code, 404)
+        self.assertEqual(self.generate(meshHandle='0' * 64).status_code, 404)
+
+    def test_partly_removed_handle_returns_400(self):
+        handle = self.client.post('/backend/meshes/', {
+            'polyData': SimpleUploadedFile('polyData', self.crown)}).json()['handle']
+        os.remove(os.path.join(get_mesh_store()._path(handle), 'points.npy'))
+        response = self.generate(meshHandle=handle)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f'/backend/meshes/{handle}/').status_code, 404)
+
+    @override_settings(ROOT_MESH_DIR_MAX_BYTES=1)
+    def test_evicted_handle_returns_404(self):
+        first = self.client.post('/backend/meshes/', {
+            'polyData': SimpleUploadedFile('polyData', self.crown)}).json()['handle']
+        response = self.client.post('/backend/meshes/', {
+            'polyData': SimpleUploadedFile('polyData', crown_to_xml(make_crown(2000, seed=1)))})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.generate(meshHandle=first).status_code, 404)
@@ -0,0 +1,76 @@
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from backend.metrics import Histogram, StageTimer
+from backend.tests.helpers import IsolatedStateMixin
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+
+
+def metric_value(text, sample):
+    '''
+    从 Prometheus 文本中读取一个样本的值，样本不存在时返回 0。
+
+    :param text: str，/backend/metrics/ 的响应
+    :param sample: str，指标名称和标签，例如 'teethsite_cache_hits_total'
+    :return: float
+    '''
+    for line in text.splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+class StageTimerTests(SimpleTestCase):
+
+    def test_same_stage_accumulates_and_keeps_first_position(self):
+        timer = StageTimer()
+        timer.add('parse', 0.001)
+        timer.add('smooth', 0.002)
+        timer.add('parse', 0.003)
+        self.assertEqual(list(timer.stages), ['parse', 'smooth'])
+        self.assertAlmostEqual(timer.stages['parse'], 0.004)
+        self.assertTrue(timer.server_timing().startswith('parse;dur=4.0, smooth;dur=2.0, total;dur='))
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('h', 'doc', ('stage',), (1, 2))
+        for value in (0.5, 1.5, 3):
+            histogram.observe(('smooth',), value)
+        lines = histogram.render()
+        self.assertIn('h_bucket{stage="smooth",le="1"} 1', lines)
+        self.assertIn('h_bucket{stage="smooth",le="2"} 2', lines)
+        self.assertIn('h_bucket{stage="smooth",le="+Inf"} 3', lines)
+        self.assertIn('h_count{stage="smooth"} 3', lines)
+
+
+class ServerTimingTests(IsolatedStateMixin, SimpleTestCase):
+
+    def generate(self):
+        return self.client.post('/backend/generate_root/', {
+            'polyData': SimpleUploadedFile('polyData', crown_to_xml(make_crown(2000))),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode()),
+        })
+
+    def test_header_lists_pipeline_stages_and_cache_hit_skips_them(self):
+        stages = [entry.split(';')[0] for entry in self.generate()['Server-Timing'].split(', ')]
+        self.assertEqual(stages, ['cache', 'parse', 'smooth', 'clean', 'boundary', 'surface', 'serialize', 'total'])
+        stages = [entry.split(';')[0] for entry in self.generate()['Server-Timing'].split(', ')]
+        self.assertEqual(stages, ['cache', 'total'])
+
+    def test_metrics_count_requests_and_cache_hits(self):
+        before = self.client.get('/backend/metrics/').content.decode()
+        self.generate()
+        self.generate()
+        after = self.client.get('/backend/metrics/')
+        self.assertTrue(after['Content-Type'].startswith('text/plain; version=0.0.4'))
+        after = after.content.decode()
+
+        requests = 'teethsite_requests_total{endpoint="generate_root",status="200"}'
+        self.assertEqual(metric_value(after, requests) - metric_value(before, requests), 2)
+        self.assertEqual(metric_value(after, 'teethsite_cache_hits_total'), 1)
+        self.assertEqual(metric_value(after, 'teethsite_cache_misses_total'), 1)
+        stage_count = 'teethsite_stage_duration_seconds_count{stage="smooth"}'
+        self.assertEqual(metric_value(after, stage_count) - metric_value(before, stage_count), 1)
+        triangles = 'teethsite_mesh_triangles_count{direction="input"}'
+        self.assertEqual(metric_value(after, triangles) - metric_value(before, triangles), 1)
@@ -0,0 +1,126 @@
+import json
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from vtkmodules.vtkCommonDataModel import vtkPolyData
+
+from backend.cache import ResultCache
+from backend.pipeline import RootPipeline, count_mesh_copies, data_bytes, generate_root_polydata, polydata_memory_bytes
+from backend.root import RootCone
+from backend.tests.helpers import IsolatedStateMixin, mesh_arrays, triangle_coordinates
+from backend.utils import clean_single_point_faces, create_closed_surface, create_new_line, extract_edge, \
+    smooth_line, smooth_polydata, translate_polydata, weld_polydata
+from backend.utils import parse_polydata
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params, perturb_upload
+
+
+def step_by_step_root(crown, params):
+    '''
+    逐个调用 backend.utils 中的函数生成牙根，每一步都单独执行，作为流水线的参照。
+    '''
+    boundary_line = extract_edge(clean_single_point_faces(smooth_polydata(crown)))
+    smoothed_line = smooth_line(boundary_line)
+    root_cone = RootCone(params)
+    root_cone.create_circle(resolution=smoothed_line.GetNumberOfPoints())
+    translate_edge = translate_polydata(smoothed_line, [-component for component in root_cone.up_normal])
+    closed_surface = create_closed_surface(smoothed_line, translate_edge)
+    modified_circle = create_new_line(translate_edge, root_cone.circle)
+    closed_surface2 = create_closed_surface(translate_edge, modified_circle)
+    return weld_polydata([closed_surface, closed_surface2, root_cone.create_cap(modified_circle)])
+
+
+class RootPipelineTests(SimpleTestCase):
+
+    def test_pipeline_matches_step_by_step_functions(self):
+        crown = make_crown(5000)
+        params = make_root_params()
+        expected_points, expected_triangles = mesh_arrays(step_by_step_root(crown, params))
+        points, triangles = mesh_arrays(generate_root_polydata(crown, params))
+        np.testing.assert_array_equal(points, expected_points)
+        np.testing.assert_array_equal(triangles, expected_triangles)
+
+    def test_crown_stages_do_not_copy_the_mesh(self):
+        pipeline = RootPipeline()
+        result = pipeline.run(make_crown(5000), make_root_params())
+        self.assertEqual(pipeline.report['crown_stage_copies'], 0)
+        self.assertGreater(pipeline.report['final_data_bytes'], data_bytes([result]))
+
+    def test_copy_detection_ignores_modified_arrays(self):
+        crown = make_crown(2000)
+        copied = vtkPolyData()
+        copied.DeepCopy(crown)
+        shared = vtkPolyData()
+        shared.ShallowCopy(crown)
+        self.assertEqual(count_mesh_copies([(crown, copied, set())]), 2)
+        self.assertEqual(count_mesh_copies([(crown, copied, {'points', 'polys'})]), 0)
+        self.assertEqual(count_mesh_copies([(crown, shared, set())]), 0)
+        self.assertEqual(data_bytes([crown, shared]), data_bytes([crown]))
+        self.assertGreater(data_bytes([crown, copied]), 1.9 * data_bytes([crown]))
+
+    def test_stage_callback_reports_progress_in_order(self):
+        stages = []
+        RootPipeline(on_stage=lambda stage, progress: stages.append((stage, progress))).run(
+            make_crown(2000), make_root_params())
+        self.assertEqual([stage for stage, _ in stages], ['smooth', 'boundary', 'surface'])
+        self.assertEqual([progress for _, progress in stages], sorted(progress for _, progress in stages))
+
+    def test_closed_crown_is_rejected(self):
+        from vtkmodules.vtkFiltersCore import vtkTriangleFilter
+        from vtkmodules.vtkFiltersSources import vtkSphereSource
+        sphere = vtkSphereSource()
+        triangles = vtkTriangleFilter()
+        triangles.SetInputConnection(sphere.GetOutputPort())
+        triangles.Update()
+        with self.assertRaises(ValueError):
+            generate_root_polydata(triangles.GetOutput(), make_root_params())
+
+
+class StageCacheTests(IsolatedStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crown = crown_to_xml(make_crown(2000))
+
+    def generate(self, crown, tooth_name):
+        response = self.client.post('/backend/generate_root/', {
+            'polyData': SimpleUploadedFile('polyData', crown),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params(tooth_name)).encode()),
+        })
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def stage_stats(self):
+        return self.client.get('/backend/cache_stats/').json()['stage_cache']
+
+    def test_second_run_reuses_the_crown_stages(self):
+        stage_cache = ResultCache(64 * 1024 * 1024, size_of=polydata_memory_bytes)
+        crown = make_crown(2000)
+        first = RootPipeline(stage_cache=stage_cache)
+        expected = first.run(crown, make_root_params(), mesh_key='crown')
+        second = RootPipeline(stage_cache=stage_cache)
+        result = second.run(crown, make_root_params(), mesh_key='crown')
+        self.assertEqual((first.report['stage_cache'], second.report['stage_cache']), ('miss', 'hit'))
+        np.testing.assert_array_equal(mesh_arrays(result)[0], mesh_arrays(expected)[0])
+
+    def test_changing_only_the_tooth_name_hits_the_stage_cache(self):
+        self.generate(self.crown, 'UL1')
+        self.generate(self.crown, 'UL2')
+        self.assertEqual(self.stage_stats()['hits'], 2)
+
+    def test_perturbed_upload_misses_both_caches(self):
+        first = parse_polydata(perturb_upload(self.crown, 1))
+        np.testing.assert_array_equal(triangle_coordinates(first), triangle_coordinates(parse_polydata(self.crown)))
+        self.assertNotEqual(perturb_upload(self.crown, 1), perturb_upload(self.crown, 2))
+
+        self.generate(perturb_upload(self.crown, 1), 'UL1')
+        self.generate(perturb_upload(self.crown, 2), 'UL1')
+        stats = self.client.get('/backend/cache_stats/').json()
+        self.assertEqual((stats['hits'], stats['stage_cache']['hits']), (0, 0))
+
+    @override_settings(ROOT_STAGE_CACHE_MAX_BYTES=0)
+    def test_zero_capacity_disables_the_stage_cache(self):
+        self.generate(self.crown, 'UL1')
+        self.generate(self.crown, 'UL2')
+        stats = self.stage_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (0, 0, 0))
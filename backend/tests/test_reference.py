@@ -0,0 +1,248 @@
+'''
+向量化实现与原来的逐元素实现的对照测试。
+
+这里保留了原来的实现作为参照，对同一份输入比较两者的输出。
+'''
+import numpy as np
+from django.test import SimpleTestCase
+from vtkmodules.vtkCommonCore import vtkIdList, vtkPoints
+from vtkmodules.vtkCommonComputationalGeometry import vtkParametricSpline
+from vtkmodules.vtkCommonDataModel import vtkCellArray, vtkPolyData
+from vtkmodules.vtkFiltersSources import vtkParametricFunctionSource
+from vtkmodules.vtkCommonTransforms import vtkTransform
+from vtkmodules.vtkFiltersGeneral import vtkTransformPolyDataFilter
+from vtkmodules.util.numpy_support import vtk_to_numpy
+
+from backend.root import RootCone
+from backend.tests.helpers import mesh_arrays
+from backend.utils import clean_single_point_faces, create_closed_surface, create_new_line, extract_boundary_loops, \
+    extract_edge, min_distance_offset, numpy_to_cell_array, numpy_to_points, polydata_points_to_numpy, smooth_line, \
+    smooth_polydata
+from benchmarks.crowns import make_crown, make_root_params
+
+
+def reference_clean_single_point_faces(polydata):
+    polydata_copy = vtkPolyData()
+    polydata_copy.DeepCopy(polydata)
+    faces = polydata_copy.GetPolys()
+    point_face_count = {}
+    face = vtkIdList()
+    faces.InitTraversal()
+    while faces.GetNextCell(face):
+        for i in range(face.GetNumberOfIds()):
+            point_face_count[face.GetId(i)] = point_face_count.get(face.GetId(i), 0) + 1
+
+    new_faces = vtkCellArray()
+    faces.InitTraversal()
+    while faces.GetNextCell(face):
+        if all(point_face_count[face.GetId(i)] != 1 for i in range(face.GetNumberOfIds())):
+            new_faces.InsertNextCell(face)
+    polydata_copy.SetPolys(new_faces)
+    return polydata_copy
+
+
+def reference_circle_points(root_cone, resolution):
+    height = 6
+    center = [root_cone.top_sphere_center[i] - height * root_cone.up_normal[i] for i in range(3)]
+    direction = root_cone.up_normal
+    points = vtkPoints()
+    for i in range(resolution):
+        angle = 2 * np.pi * i / resolution
+        points.InsertNextPoint(root_cone.radius * np.cos(angle), root_cone.radius * np.sin(angle), 0)
+    circle = vtkPolyData()
+    circle.SetPoints(points)
+    transform = vtkTransform()
+    transform.Translate(center)
+    transform.RotateWXYZ(np.degrees(np.arccos(direction[2])), -direction[1], direction[0], 0)
+    transform_filter = vtkTransformPolyDataFilter()
+    transform_filter.SetTransform(transform)
+    transform_filter.SetInputData(circle)
+    transform_filter.Update()
+    return vtk_to_numpy(transform_filter.GetOutput().GetPoints().GetData())
+
+
+def reference_closed_surface(line1, line2):
+    points = vtkPoints()
+    for line in (line1, line2):
+        for i in range(line.GetNumberOfPoints()):
+            points.InsertNextPoint(line.GetPoint(i))
+    triangles = vtkCellArray()
+    num_points = line1.GetNumberOfPoints()
+    for i in range(num_points):
+        triangles.InsertNextCell(3, [i % num_points, (i + 1) % num_points, i % num_points + num_points])
+        triangles.InsertNextCell(3, [(i + 1) % num_points, (i + 1) % num_points + num_points, i % num_points + num_points])
+    side_surface = vtkPolyData()
+    side_surface.SetPoints(points)
+    side_surface.SetPolys(triangles)
+    return side_surface
+
+
+def reference_new_line(line1, line2):
+    start_point = np.array(line1.GetPoint(0))
+    min_distance = float('inf')
+    nearest_point_index = -1
+    for i in range(line2.GetNumberOfPoints()):
+        distance = np.linalg.norm(np.array(line2.GetPoint(i)) - start_point)
+        if distance < min_distance:
+            min_distance = distance
+            nearest_point_index = i
+    points = vtkPoints()
+    num_points = line2.GetNumberOfPoints()
+    for i in range(nearest_point_index, nearest_point_index + num_points):
+        points.InsertNextPoint(line2.GetPoint(i % num_points))
+    line3 = vtkPolyData()
+    line3.SetPoints(points)
+    return line3
+
+
+def reference_smooth_line(boundary_line):
+    line_indices = {}
+    cells = boundary_line.GetLines()
+    cells.InitTraversal()
+    id_list = vtkIdList()
+    while cells.GetNextCell(id_list):
+        if id_list.GetNumberOfIds() == 2:
+            line_indices[str(id_list.GetId(0))] = id_list.GetId(1)
+    points = vtkPoints()
+    last_index = 0
+    for _ in range(boundary_line.GetNumberOfPoints() + 1):
+        points.InsertNextPoint(boundary_line.GetPoint(last_index))
+        last_index = line_indices[str(last_index)]
+    spline = vtkParametricSpline()
+    spline.SetPoints(points)
+    function_source = vtkParametricFunctionSource()
+    function_source.SetParametricFunction(spline)
+    function_source.Update()
+    return function_source.GetOutput()
+
+
+def closed_line(points):
+    line = vtkPolyData()
+    line.SetPoints(numpy_to_points(np.asarray(points, dtype=np.float32)))
+    return line
+
+
+def cell_arrays(polydata):
+    polys = polydata.GetPolys()
+    return vtk_to_numpy(polys.GetOffsetsArray()), vtk_to_numpy(polys.GetConnectivityArray())
+
+
+class CleanSinglePointFacesTests(SimpleTestCase):
+
+    def assert_same_as_reference(self, polydata):
+        expected_offsets, expected_connectivity = cell_arrays(reference_clean_single_point_faces(polydata))
+        offsets, connectivity = cell_arrays(clean_single_point_faces(polydata))
+        np.testing.assert_array_equal(offsets, expected_offsets)
+        np.testing.assert_array_equal(connectivity, expected_connectivity)
+
+    def test_smoothed_crown(self):
+        self.assert_same_as_reference(smooth_polydata(make_crown(5000), iterations=20))
+
+    def test_mixed_polygons_with_dangling_faces(self):
+        # 一个四边形、两个共享一条边的三角形，以及一个有孤立顶点的三角形和一个空的面片
+        polydata = vtkPolyData()
+        polydata.SetPoints(numpy_to_points(np.random.default_rng(0).random((9, 3))))
+        polys = vtkCellArray()
+        for cell in ([0, 1, 2, 3], [1, 2, 4], [2, 4, 1], [4, 5, 6], [], [3, 0, 7, 8, 2]):
+            polys.InsertNextCell(len(cell), cell)
+        polydata.SetPolys(polys)
+        self.assert_same_as_reference(polydata)
+
+    def test_input_is_not_modified_and_points_are_shared(self):
+        # 在牙冠上附加一个带新顶点的三角形，新顶点只被这一个面片使用
+        points, triangles = mesh_arrays(make_crown(2000))
+        crown = vtkPolyData()
+        crown.SetPoints(numpy_to_points(np.vstack((points, [[0.0, 0.0, 10.0]]))))
+        crown.SetPolys(numpy_to_cell_array(np.vstack((triangles, [[0, 1, len(points)]]))))
+        before = vtk_to_numpy(crown.GetPolys().GetConnectivityArray()).copy()
+        cleaned = clean_single_point_faces(crown)
+        np.testing.assert_array_equal(vtk_to_numpy(crown.GetPolys().GetConnectivityArray()), before)
+        self.assertLess(cleaned.GetNumberOfPolys(), crown.GetNumberOfPolys())
+        self.assertEqual(cleaned.GetPoints().GetData().__this__, crown.GetPoints().GetData().__this__)
+
+
+class CreateCircleTests(SimpleTestCase):
+
+    def test_points_match_transformed_reference(self):
+        tilted = dict(make_root_params(), topSphereCenter=[1.5, -2.0, -3.0], radiusSphereCenter=[2.5, 1.0, -3.5])
+        for params in (make_root_params(), tilted):
+            for resolution in (3, 17, 256):
+                with self.subTest(params=params['topSphereCenter'], resolution=resolution):
+                    root_cone = RootCone(params)
+                    circle = root_cone.create_circle(resolution)
+                    np.testing.assert_allclose(vtk_to_numpy(circle.GetPoints().GetData()),
+                                               reference_circle_points(root_cone, resolution), atol=1e-5)
+                    self.assertIs(root_cone.circle, circle)
+
+
+class CreateClosedSurfaceTests(SimpleTestCase):
+
+    def test_strip_matches_reference(self):
+        angles = 2 * np.pi * np.arange(40) / 40
+        ring = np.column_stack((np.cos(angles), np.sin(angles), np.zeros(40)))
+        line1 = closed_line(ring)
+        line2 = closed_line(ring * 0.5 + [0.0, 0.0, -1.0])
+        expected_points, expected_triangles = mesh_arrays(reference_closed_surface(line1, line2))
+        points, triangles = mesh_arrays(create_closed_surface(line1, line2))
+        np.testing.assert_array_equal(points, expected_points)
+        np.testing.assert_array_equal(triangles, expected_triangles)
+
+    def test_second_line_is_resampled_to_first(self):
+        angles = 2 * np.pi * np.arange(40) / 40
+        ring = np.column_stack((np.cos(angles), np.sin(angles), np.zeros(40)))
+        points, triangles = mesh_arrays(create_closed_surface(closed_line(ring), closed_line(ring[::2] * 2)))
+        self.assertEqual((len(points), len(triangles)), (80, 80))
+        # 重新采样的点仍在第二条线（半径为 2 的正多边形）的边上
+        radii = np.linalg.norm(points[40:, :2], axis=1)
+        self.assertTrue(np.all((radii <= 2 + 1e-5) & (radii >= 2 * np.cos(np.pi / 20) - 1e-5)))
+
+
+class CreateNewLineTests(SimpleTestCase):
+
+    def test_nearest_alignment_matches_reference(self):
+        rng = np.random.default_rng(0)
+        for num_points in (5, 64, 301):
+            with self.subTest(num_points=num_points):
+                angles = 2 * np.pi * np.arange(num_points) / num_points + rng.random()
+                line1 = closed_line(rng.normal(size=(num_points, 3)))
+                line2 = closed_line(np.column_stack((np.cos(angles), np.sin(angles), rng.normal(size=num_points))))
+                np.testing.assert_array_equal(polydata_points_to_numpy(create_new_line(line1, line2)),
+                                              polydata_points_to_numpy(reference_new_line(line1, line2)))
+
+    def test_min_distance_offset_matches_brute_force(self):
+        rng = np.random.default_rng(1)
+        points1 = rng.normal(size=(50, 3))
+        points2 = np.roll(points1, 17, axis=0) + rng.normal(scale=0.01, size=(50, 3))
+        costs = [np.sum((points1 - np.roll(points2, -k, axis=0)) ** 2) for k in range(50)]
+        self.assertEqual(min_distance_offset(points1, points2), int(np.argmin(costs)))
+        self.assertEqual(min_distance_offset(points1, points2), 17)
+
+
+class SmoothLineTests(SimpleTestCase):
+
+    def test_crown_boundary_matches_reference(self):
+        for seed in (0, 1):
+            with self.subTest(seed=seed):
+                boundary = extract_edge(clean_single_point_faces(make_crown(5000, seed=seed)))
+                np.testing.assert_allclose(polydata_points_to_numpy(smooth_line(boundary)),
+                                           polydata_points_to_numpy(reference_smooth_line(boundary)), atol=1e-6)
+
+    def test_largest_of_several_loops_is_kept(self):
+        angles = 2 * np.pi * np.arange(30) / 30
+        ring = np.column_stack((np.cos(angles), np.sin(angles), np.zeros(30)))
+        boundary = vtkPolyData()
+        boundary.SetPoints(numpy_to_points(np.vstack((ring * 0.5, ring * 3))))
+        segments = np.arange(30)
+        edges = np.vstack((np.column_stack((segments, np.roll(segments, -1))),
+                           np.column_stack((segments, np.roll(segments, -1))) + 30))
+        boundary.SetLines(numpy_to_cell_array(edges))
+        self.assertEqual([len(loop) for loop in extract_boundary_loops(boundary)], [30, 30])
+        radii = np.linalg.norm(polydata_points_to_numpy(smooth_line(boundary))[:, :2], axis=1)
+        self.assertGreater(radii.min(), 2.5)
+
+    def test_boundary_without_loops_is_rejected(self):
+        boundary = vtkPolyData()
+        boundary.SetPoints(numpy_to_points(np.zeros((0, 3))))
+        boundary.SetLines(vtkCellArray())
+        with self.assertRaises(ValueError):
+            smooth_line(boundary)
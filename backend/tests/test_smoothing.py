@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from backend.utils import SMOOTH_PRESETS, polydata_points_to_numpy, run_windowed_sinc, smooth_polydata
+from benchmarks.crowns import make_crown
+
+
+def smoothed_points(polydata, **kwargs):
+    return polydata_points_to_numpy(smooth_polydata(polydata, **kwargs))
+
+
+def best_time(function, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+class SmoothPresetTests(SimpleTestCase):
+
+    def setUp(self):
+        self.crown = make_crown(5000)
+
+    def test_final_matches_original_fixed_parameters(self):
+        np.testing.assert_array_equal(smoothed_points(self.crown, **SMOOTH_PRESETS['final']),
+                                      polydata_points_to_numpy(run_windowed_sinc(self.crown, 200, 45)))
+
+    def test_standard_stays_close_to_final(self):
+        final = smoothed_points(self.crown, **SMOOTH_PRESETS['final'])
+        standard = smoothed_points(self.crown, **SMOOTH_PRESETS['standard'])
+        difference = np.linalg.norm(standard - final, axis=1)
+        movement = np.linalg.norm(final - polydata_points_to_numpy(self.crown), axis=1)
+        self.assertLess(difference.max(), 2e-3 * self.crown.GetLength())
+        self.assertLess(difference.mean(), 0.5 * movement.mean())
+
+    def test_presets_get_closer_to_final_as_iterations_grow(self):
+        final = smoothed_points(self.crown, **SMOOTH_PRESETS['final'])
+        differences = [np.linalg.norm(smoothed_points(self.crown, **SMOOTH_PRESETS[quality]) - final, axis=1).mean()
+                       for quality in ('preview', 'standard')]
+        self.assertGreater(differences[0], differences[1])
+
+    def test_standard_is_no_slower_than_final(self):
+        crown = make_crown(20000)
+        final = best_time(lambda: smooth_polydata(crown, **SMOOTH_PRESETS['final']))
+        standard = best_time(lambda: smooth_polydata(crown, **SMOOTH_PRESETS['standard']))
+        self.assertLessEqual(standard, final)
+
+    def test_preview_runs_fewer_iterations(self):
+        np.testing.assert_array_equal(smoothed_points(self.crown, **SMOOTH_PRESETS['preview']),
+                                      polydata_points_to_numpy(run_windowed_sinc(self.crown, 20, 45)))
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from backend import pipeline
+
+# 在子进程中导入视图模块，输出已加载的 vtkmodules 子模块
+LIST_VTK_MODULES = '''
+import json, sys
+import django
+django.setup()
+import backend.views
+print(json.dumps(sorted(name for name in sys.modules if name.startswith('vtkmodules.'))))
+'''
+
+
+class StartupTests(SimpleTestCase):
+
+    def test_views_import_no_rendering_modules(self):
+        output = subprocess.run(
+            [sys.executable, '-c', LIST_VTK_MODULES], cwd=settings.BASE_DIR, check=True, capture_output=True,
+            text=True, env=dict(os.environ, DJANGO_SETTINGS_MODULE='teethsite_backend.settings'),
+        ).stdout
+        modules = json.loads(output.splitlines()[-1])
+        self.assertNotIn('vtkmodules.all', modules)
+        self.assertFalse([name for name in modules if 'Rendering' in name or 'OpenGL' in name])
+
+    def test_warm_up_generates_a_root(self):
+        roots = []
+
+        def recording_generate(*args, **kwargs):
+            roots.append(generate_root_polydata(*args, **kwargs))
+            return roots[-1]
+
+        generate_root_polydata = pipeline.generate_root_polydata
+        with mock.patch('backend.pipeline.generate_root_polydata', recording_generate):
+            pipeline.warm_up()
+        self.assertEqual(len(roots), 1)
+        self.assertGreater(roots[0].GetNumberOfPolys(), 0)
@@ -0,0 +1,83 @@
+import base64
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from django.test.client import AsyncClient
+
+from backend.cache import get_result_cache
+from backend.pipeline import generate_root_polydata
+from backend.tests.helpers import IsolatedStateMixin
+from backend.utils import MESH_CONTENT_TYPE, iter_polydata_bytes, iter_polydata_xml, polydata_to_bytes, \
+    polydata_to_string
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+
+
+def make_root():
+    '''
+    每次生成新的牙根：vtkXMLPolyDataWriter 写出数组时会在数组的信息中缓存取值范围，
+    之后再写同一个网格时 XML 中会多出 InformationKey，因此每次序列化都使用新生成的网格。
+    '''
+    return generate_root_polydata(make_crown(5000), make_root_params())
+
+
+class ChunkedSerializationTests(SimpleTestCase):
+
+    def test_binary_chunks_join_to_the_buffered_bytes(self):
+        root = make_root()
+        expected = polydata_to_bytes(root)
+        for chunk_size in (None, 1, 100, 4096):
+            chunks = list(iter_polydata_bytes(root, chunk_size))
+            self.assertEqual(b''.join(chunks), expected)
+            if chunk_size is not None:
+                self.assertLessEqual(max(len(chunk) for chunk in chunks), max(chunk_size, 16))
+
+    def test_xml_chunks_have_a_fixed_size_and_join_to_the_buffered_xml(self):
+        expected = base64.b64decode(polydata_to_string(make_root()))
+        chunks = list(iter_polydata_xml(make_root(), 999))
+        self.assertEqual(b''.join(chunks), expected)
+        self.assertTrue(all(len(chunk) == 999 for chunk in chunks[:-1]))
+        # 每块都是 3 的倍数，逐块 Base64 编码再拼接与整体编码相同
+        self.assertEqual(b''.join(base64.b64encode(chunk) for chunk in chunks), base64.b64encode(expected))
+
+
+@override_settings(ROOT_STREAM_CHUNK_SIZE=1000)
+class StreamingEndpointTests(IsolatedStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crown = crown_to_xml(make_crown(5000))
+
+    def upload(self):
+        return {
+            'polyData': SimpleUploadedFile('polyData', self.crown),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode()),
+        }
+
+    def test_streamed_body_matches_buffered_body(self):
+        for headers in ({}, {'accept': MESH_CONTENT_TYPE}):
+            buffered = self.client.post('/backend/generate_root/', self.upload(), headers=headers)
+            # 第一次请求之后结果已在缓存中，流式输出的是缓存的响应体；清空后再生成一次
+            for clear in (False, True):
+                if clear:
+                    get_result_cache().clear()
+                response = self.client.post('/backend/generate_root/?stream=1', self.upload(), headers=headers)
+                self.assertTrue(response.streaming)
+                self.assertEqual(response['Content-Type'], buffered['Content-Type'])
+                chunks = list(response.streaming_content)
+                self.assertGreater(len(chunks), 2)
+                self.assertEqual(b''.join(chunks), buffered.content)
+
+    async def test_async_streamed_body_matches_buffered_body(self):
+        client = AsyncClient()
+        buffered = await client.post('/backend/generate_root_async/', self.upload())
+        get_result_cache().clear()
+        response = await client.post('/backend/generate_root_async/?stream=1', self.upload())
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), buffered.content)
+
+    def test_input_errors_return_400_before_streaming(self):
+        self.crown = b'not a mesh'
+        response = self.client.post('/backend/generate_root/?stream=1', self.upload())
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
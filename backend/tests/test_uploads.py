@@ -0,0 +1,58 @@
+import json
+from unittest import mock
+
+import numpy as np
+from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile, TemporaryUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from backend import views
+from backend.tests.helpers import IsolatedStateMixin, mesh_arrays
+from backend.utils import parse_polydata
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+
+
+class ParsePolydataTests(SimpleTestCase):
+
+    def test_xml_modes_parse_to_same_mesh(self):
+        crown = make_crown(2000)
+        expected_points, expected_triangles = mesh_arrays(crown)
+        for data_mode in ('ascii', 'binary', 'appended'):
+            with self.subTest(data_mode=data_mode):
+                buffer = crown_to_xml(crown, data_mode)
+                for upload in (buffer, memoryview(buffer)):
+                    points, triangles = mesh_arrays(parse_polydata(upload))
+                    np.testing.assert_allclose(points, expected_points, rtol=1e-6)
+                    np.testing.assert_array_equal(triangles, expected_triangles)
+
+    def test_str_input_is_still_accepted(self):
+        buffer = crown_to_xml(make_crown(2000))
+        polydata = parse_polydata(buffer.decode())
+        self.assertEqual(polydata.GetNumberOfPolys(), make_crown(2000).GetNumberOfPolys())
+
+
+class MemoryUploadTests(IsolatedStateMixin, SimpleTestCase):
+
+    def upload(self):
+        crown_xml = crown_to_xml(make_crown(2000))
+        with mock.patch.object(views, 'read_uploaded_file', wraps=views.read_uploaded_file) as read:
+            response = self.client.post('/backend/meshes/', {'polyData': SimpleUploadedFile('polyData', crown_xml)})
+        self.assertIn(response.status_code, (200, 201))
+        self.assertGreater(len(crown_xml), 1024)
+        return read.call_args.args[0]
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_upload_above_django_limit_stays_in_memory(self):
+        self.assertIsInstance(self.upload(), InMemoryUploadedFile)
+
+    @override_settings(ROOT_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_upload_above_root_limit_falls_back_to_temp_file(self):
+        self.assertIsInstance(self.upload(), TemporaryUploadedFile)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_generate_root_accepts_large_upload(self):
+        response = self.client.post('/backend/generate_root/', {
+            'polyData': SimpleUploadedFile('polyData', crown_to_xml(make_crown(2000))),
+            'jsonPart': SimpleUploadedFile('jsonPart', json.dumps(make_root_params()).encode()),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['polydata'])
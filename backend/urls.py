@@ -3,4 +3,13 @@ from . import views
 
 urlpatterns = [
     path('generate_root/', views.generate_root, name='generate_root'),
+    path('generate_root_async/', views.generate_root_async, name='generate_root_async'),
+    path('generate_root_batch/', views.generate_root_batch, name='generate_root_batch'),
+    path('generate_root_arch/', views.generate_root_arch, name='generate_root_arch'),
+    path('meshes/', views.upload_mesh, name='upload_mesh'),
+    path('meshes/<str:handle>/', views.mesh_info, name='mesh_info'),
+    path('jobs/', views.submit_root_job, name='submit_root_job'),
+    path('jobs/<uuid:job_id>/', views.root_job_status, name='root_job_status'),
+    path('cache_stats/', views.cache_stats, name='cache_stats'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
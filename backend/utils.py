@@ -1,43 +1,476 @@
 import math
-import tempfile
-import os
 import base64
+import os
+import struct
+import tempfile
+import zlib
 
 import numpy as np
-import vtkmodules.all as vtk
+from vtkmodules.vtkCommonComputationalGeometry import vtkParametricSpline
+from vtkmodules.vtkCommonCore import VTK_CHAR, vtkPoints
+from vtkmodules.vtkCommonDataModel import vtkCellArray, vtkPolyData
+from vtkmodules.vtkCommonTransforms import vtkTransform
+from vtkmodules.vtkFiltersCore import (
+    vtkAppendPolyData,
+    vtkCleanPolyData,
+    vtkClipPolyData,
+    vtkCutter,
+    vtkDecimatePro,
+    vtkFeatureEdges,
+    vtkTriangleFilter,
+    vtkWindowedSincPolyDataFilter,
+)
+from vtkmodules.vtkFiltersGeneral import vtkTransformPolyDataFilter
+from vtkmodules.vtkFiltersModeling import vtkSelectPolyData
+from vtkmodules.vtkFiltersSources import vtkParametricFunctionSource
+from vtkmodules.vtkIOXML import vtkXMLPolyDataReader, vtkXMLPolyDataWriter
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+
+try:
+    import zstandard
+except ImportError:  # zstd 是可选的，未安装时只支持 gzip
+    zstandard = None
+
+# 二进制网格格式：16 字节头（魔数、版本、保留位、点数、三角形数），
+# 随后是小端 float32 点坐标 (N, 3) 和小端 int32 三角形索引 (M, 3)
+MESH_MAGIC = b'TSRM'
+MESH_VERSION = 1
+MESH_HEADER = struct.Struct('<4sHHII')
+MESH_CONTENT_TYPE = 'application/octet-stream'
+
+# 压缩上传数据的魔数
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# 压缩上传数据解压后的默认大小上限，远大于实际的牙冠和全牙列网格，防止很小的压缩包解压出大量数据耗尽内存
+DECOMPRESSED_MAX_BYTES = 256 * 1024 * 1024
+
+# 返回给前端的 VTK XML 中数据数组的压缩方式和压缩级别，与 vtkXMLPolyDataWriter 的默认值一致
+XML_COMPRESSORS = ('zlib', 'lz4', 'lzma', 'none')
+XML_COMPRESSOR = 'zlib'
+XML_COMPRESSION_LEVEL = 5
+
+# 拼接牙根各部分时合并顶点的网格边长（毫米），接缝处的顶点坐标完全相同
+WELD_TOLERANCE = 1e-4
+
+# 二进制 STL：80 字节文件头、uint32 三角形数，每个三角形 50 字节（法向、三个顶点、属性字）
+STL_HEADER_SIZE = 84
+STL_TRIANGLE = np.dtype([('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+PLY_MAGIC = b'ply'
+PLY_END_HEADER = b'end_header'
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+
+
+def numpy_to_cell_array(cells):
+    '''
+    将形状为 (N, K) 的单元索引数组整体转换为 vtkCellArray，每行是一个单元。
+
+    :param cells: numpy 数组，(N, K) 的点索引
+    :return: vtkCellArray对象
+    '''
+    cells = np.asarray(cells, dtype=np.int64)
+    num_cells, cell_size = cells.shape
+    offsets = np.arange(0, (num_cells + 1) * cell_size, cell_size, dtype=np.int64)
+    cell_array = vtkCellArray()
+    cell_array.SetData(numpy_to_vtk(offsets, deep=1), numpy_to_vtk(cells.ravel(), deep=1))
+    return cell_array
 
 
-def parse_polydata(polydata_string):
+def numpy_to_points(points):
     '''
-    解析输入的 PolyData 字符串并返回相应的 vtkPolyData 对象。
+    将形状为 (N, 3) 的坐标数组整体转换为 vtkPoints。
 
-    :param polydata_string: 包含 PolyData 信息的字符串
-    :type polydata_string: str
-    :return: 与输入字符串对应的 vtkPolyData 对象
+    :param points: numpy 数组，(N, 3) 的点坐标
+    :return: vtkPoints对象，数据类型与输入数组一致
+    '''
+    vtk_points = vtkPoints()
+    vtk_points.SetData(numpy_to_vtk(np.ascontiguousarray(points), deep=1))
+    return vtk_points
+
+
+def parse_polydata(polydata_buffer):
+    '''
+    解析输入的网格数据并返回相应的 vtkPolyData 对象。
+
+    按文件内容识别格式：二进制 STL 和二进制 PLY 分别由 parse_stl、parse_ply 解析，
+    其他数据按 VTK XML 由 parse_xml_polydata 解析。
+
+    :param polydata_buffer: 包含网格信息的数据，可以是 bytes、bytearray、memoryview 或 str
+    :type polydata_buffer: bytes | bytearray | memoryview | str
+    :return: 与输入数据对应的 vtkPolyData 对象
     :rtype: vtkPolyData
+    :raises ValueError: STL 或 PLY 数据不完整，或者是不支持的 ascii STL/PLY
     '''
-    # 由于 vtkXMLPolyDataReader 期望一个文件，我们需要先将字符串写入一个临时文件
-    temp = tempfile.NamedTemporaryFile(delete=False)
-    temp.write(polydata_string.encode('utf-8'))
-    temp.close()
+    if isinstance(polydata_buffer, str):
+        # 兼容旧的调用方式，字符串只能是 ascii 格式的 XML
+        polydata_buffer = polydata_buffer.encode('utf-8')
 
-    # 创建一个 vtkXMLPolyDataReader
-    reader = vtk.vtkXMLPolyDataReader()
-    reader.SetFileName(temp.name)
-    reader.Update()
+    mesh_format = detect_mesh_format(polydata_buffer)
+    if mesh_format == 'stl':
+        return parse_stl(polydata_buffer)
+    if mesh_format == 'ply':
+        return parse_ply(polydata_buffer)
+    return parse_xml_polydata(polydata_buffer)
 
-    # 删除临时文件
-    os.unlink(temp.name)
+
+def detect_mesh_format(polydata_buffer):
+    '''
+    按文件内容识别上传网格的格式。
+
+    二进制 STL 没有魔数，文件头可能以 solid 开头，因此以文件长度与文件头中的三角形数是否吻合来识别。
+
+    :param polydata_buffer: bytes 或 memoryview
+    :return: 'stl'、'ply' 或 'xml'
+    :raises ValueError: ascii 格式的 STL
+    '''
+    size = len(polydata_buffer)
+    if size >= STL_HEADER_SIZE:
+        (num_triangles,) = struct.unpack_from('<I', polydata_buffer, STL_HEADER_SIZE - 4)
+        if size == STL_HEADER_SIZE + num_triangles * STL_TRIANGLE.itemsize:
+            return 'stl'
+    head = bytes(polydata_buffer[:5])
+    if head[:3] == PLY_MAGIC and head[3:4] in (b'\n', b'\r'):
+        return 'ply'
+    if head == b'solid':
+        raise ValueError('只支持二进制 STL，请以二进制格式导出')
+    return 'xml'
+
+
+def parse_xml_polydata(polydata_buffer):
+    '''
+    解析 VTK XML 格式的 PolyData 数据。
+
+    数据直接在内存中交给 vtkXMLPolyDataReader，不经过临时文件，也不做 str 的解码/编码往返。
+    支持 ascii、binary 以及 appended（raw 或 base64）格式，支持 zlib 等压缩的 VTK XML。
+
+    :param polydata_buffer: bytes、bytearray 或 memoryview
+    :return: vtkPolyData对象
+    '''
+    # 以 numpy 视图包装内存，再浅拷贝为 vtkCharArray，reader 直接从这块内存读取
+    buffer_array = np.frombuffer(polydata_buffer, dtype=np.int8)
+    input_array = numpy_to_vtk(buffer_array, deep=0, array_type=VTK_CHAR)
+
+    reader = vtkXMLPolyDataReader()
+    reader.ReadFromInputStringOn()
+    reader.SetInputArray(input_array)
+    reader.Update()
+    # 解除对输入内存的引用，调用方可以立即释放上传缓冲区
+    reader.SetInputArray(None)
 
     # 从 reader 中获取 polydata
-    polydata = reader.GetOutput()
+    return reader.GetOutput()
 
-    # 现在你可以使用 polydata 进行进一步的处理
-    # ...
 
+def parse_stl(polydata_buffer):
+    '''
+    解析二进制 STL 数据。
+
+    STL 的每个三角形都单独保存三个顶点，坐标完全相同的顶点合并为一个点，
+    否则网格的相邻三角形互不相连，无法提取牙冠的开放边界。合并后退化的三角形被丢弃。
+
+    :param polydata_buffer: bytes 或 memoryview，完整的二进制 STL 文件
+    :return: vtkPolyData对象，点坐标为 float32 的三角网格
+    :raises ValueError: 文件长度与三角形数不符
+    '''
+    (num_triangles,) = struct.unpack_from('<I', polydata_buffer, STL_HEADER_SIZE - 4)
+    if len(polydata_buffer) != STL_HEADER_SIZE + num_triangles * STL_TRIANGLE.itemsize:
+        raise ValueError('STL 数据不完整')
+    triangles = np.frombuffer(polydata_buffer, dtype=STL_TRIANGLE, count=num_triangles, offset=STL_HEADER_SIZE)
+    points, inverse = weld_vertices(triangles['vertices'].reshape(-1, 3))
+    return mesh_from_numpy(points, inverse.reshape(-1, 3))
+
+
+def weld_vertices(vertices, tolerance=None):
+    '''
+    合并重合的顶点。
+
+    tolerance 为 None 时只合并坐标完全相同的顶点，以三个 float32 坐标的位模式作为键；
+    否则使用边长为 tolerance 的空间网格，坐标取整到同一个网格点的顶点合并，以网格点的整数坐标作为键。
+    三个整数键混合为一个 uint64 散列值排序分组，比逐行比较坐标更快；分组后逐点核对，
+    极少数散列冲突时退回按整行比较。合并后的点按每组第一次出现的顺序排列。
+
+    :param vertices: numpy 数组，(N, 3) 的坐标
+    :param tolerance: 可选的网格边长
+    :return: (合并后的 (M, 3) float32 坐标, 长度为 N 的 int64 数组，每个顶点在合并后坐标中的索引)
+    '''
+    # 加 0 把 -0.0 变为 0.0
+    vertices = np.ascontiguousarray(vertices, dtype=np.float32) + np.float32(0)
+    if not len(vertices):
+        return vertices, np.empty(0, dtype=np.int64)
+    if tolerance is None:
+        grid = vertices.view(np.uint32).astype(np.uint64)
+    else:
+        grid = np.floor(vertices / np.float32(tolerance) + np.float32(0.5)).astype(np.int64).view(np.uint64)
+    keys = (grid[:, 0] * np.uint64(0x9E3779B97F4A7C15)) ^ (grid[:, 1] * np.uint64(0xC2B2AE3D27D4EB4F)) ^ \
+        (grid[:, 2] * np.uint64(0x165667B19E3779F9))
+
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    is_first = np.empty(len(keys), dtype=bool)
+    is_first[0] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=is_first[1:])
+    group_starts = np.flatnonzero(is_first)
+    group_ids = np.cumsum(is_first) - 1
+    # 同一组中相邻的两行坐标键必须完全相同
+    sorted_grid = np.take(grid, order, axis=0)
+    same = np.ones(len(keys) - 1, dtype=bool)
+    for axis in range(3):
+        column = sorted_grid[:, axis]
+        same &= column[1:] == column[:-1]
+    if not np.all(same | is_first[1:]):
+        rows = np.ascontiguousarray(grid).view(np.dtype((np.void, grid.itemsize * 3))).ravel()
+        _, inverse = np.unique(rows, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind='stable')
+        group_ids = inverse[order]
+        group_starts = np.flatnonzero(np.diff(group_ids, prepend=-1))
+
+    # 每组中最小的原始索引，按它重新给各组编号
+    first = np.minimum.reduceat(order, group_starts)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(first))
+    inverse = np.empty(len(keys), dtype=np.int64)
+    inverse[order] = rank[group_ids]
+    return vertices[np.sort(first)], inverse
+
+
+def parse_ply(polydata_buffer):
+    '''
+    解析二进制（小端或大端）PLY 数据，读取 vertex 元素的 x、y、z 属性和 face 元素的顶点索引列表。
+
+    全部为三角形的面片按固定长度的记录一次性读取；含有多边形时逐个面片读取。
+    vertex 和 face 之外的元素被忽略，但它们位于 face 之前时只能包含定长属性。
+
+    :param polydata_buffer: bytes 或 memoryview，完整的 PLY 文件
+    :return: vtkPolyData对象
+    :raises ValueError: ascii 格式、缺少必要的元素或属性、数据不完整
+    '''
+    header_end = bytes(polydata_buffer[:65536]).find(PLY_END_HEADER)
+    if header_end < 0:
+        raise ValueError('PLY 文件头不完整')
+    offset = bytes(polydata_buffer[header_end:header_end + 12]).index(b'\n') + header_end + 1
+    header = bytes(polydata_buffer[:header_end]).decode('ascii', errors='replace').splitlines()
+
+    byte_order = None
+    elements = []
+    for line in header[1:]:
+        words = line.split()
+        if not words or words[0] in ('comment', 'obj_info'):
+            continue
+        if words[0] == 'format':
+            if words[1] not in ('binary_little_endian', 'binary_big_endian'):
+                raise ValueError('只支持二进制 PLY，请以二进制格式导出')
+            byte_order = '<' if words[1] == 'binary_little_endian' else '>'
+        elif words[0] == 'element':
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == 'property' and elements:
+            try:
+                if words[1] == 'list':
+                    prop = (words[4], byte_order + PLY_TYPES[words[2]], byte_order + PLY_TYPES[words[3]])
+                else:
+                    prop = (words[2], byte_order + PLY_TYPES[words[1]], None)
+            except (KeyError, IndexError, TypeError) as e:
+                raise ValueError(f'无法解析 PLY 属性: {line}') from e
+            elements[-1][2].append(prop)
+    if byte_order is None:
+        raise ValueError('PLY 文件缺少 format')
+
+    points = cells = None
+    try:
+        for name, count, properties in elements:
+            if name == 'face':
+                cells, offset = read_ply_faces(polydata_buffer, offset, count, properties)
+                break
+            if any(list_type is not None for _, _, list_type in properties):
+                raise ValueError(f'不支持 face 之前含有列表属性的 PLY 元素: {name}')
+            record = np.dtype([(prop_name, prop_type) for prop_name, prop_type, _ in properties])
+            data = np.frombuffer(polydata_buffer, dtype=record, count=count, offset=offset)
+            offset += record.itemsize * count
+            if name == 'vertex':
+                points = np.column_stack([data[axis] for axis in 'xyz']).astype(np.float32)
+    except (ValueError, KeyError) as e:
+        raise ValueError(f'PLY 数据不完整或缺少必要的属性: {e}') from e
+    if points is None or cells is None:
+        raise ValueError('PLY 文件缺少 vertex 或 face 元素')
+    offsets, connectivity = cells
+    if len(connectivity) and not 0 <= connectivity.min() <= connectivity.max() < len(points):
+        raise ValueError('PLY 面片的顶点索引超出范围')
+
+    polydata = vtkPolyData()
+    polydata.SetPoints(numpy_to_points(points))
+    polys = vtkCellArray()
+    polys.SetData(numpy_to_vtk(offsets, deep=1), numpy_to_vtk(connectivity, deep=1))
+    polydata.SetPolys(polys)
+    return polydata
+
+
+def read_ply_faces(polydata_buffer, offset, count, properties):
+    '''
+    读取 PLY 的 face 元素。
+
+    :param polydata_buffer: bytes 或 memoryview
+    :param offset: int，face 元素数据的起始位置
+    :param count: int，面片数
+    :param properties: list，(名称, 类型, 列表长度类型或 None)
+    :return: ((offsets, connectivity), face 元素之后的位置)，两个数组均为 int64
+    '''
+    names = [prop_name for prop_name, _, list_type in properties if list_type is not None]
+    index_name = 'vertex_indices' if 'vertex_indices' in names else 'vertex_index'
+    if index_name not in names or len(names) != 1:
+        raise ValueError('PLY 的 face 元素应只有一个顶点索引列表属性')
+
+    # 先假设全部是三角形，按定长记录读取；长度字段不全为 3 时再逐个读取
+    triangle_fields = []
+    for prop_name, prop_type, list_type in properties:
+        if list_type is None:
+            triangle_fields.append((prop_name, prop_type))
+        else:
+            triangle_fields += [('size', prop_type), ('indices', list_type, 3)]
+    record = np.dtype(triangle_fields)
+    if offset + record.itemsize * count <= len(polydata_buffer):
+        faces = np.frombuffer(polydata_buffer, dtype=record, count=count, offset=offset)
+        if np.all(faces['size'] == 3):
+            connectivity = faces['indices'].astype(np.int64).ravel()
+            offsets = np.arange(0, 3 * count + 1, 3, dtype=np.int64)
+            return (offsets, connectivity), offset + record.itemsize * count
+
+    sizes = np.empty(count, dtype=np.int64)
+    indices = []
+    for face in range(count):
+        for prop_name, prop_type, list_type in properties:
+            if list_type is None:
+                offset += np.dtype(prop_type).itemsize
+                continue
+            size = int(np.frombuffer(polydata_buffer, dtype=prop_type, count=1, offset=offset)[0])
+            offset += np.dtype(prop_type).itemsize
+            indices.append(np.frombuffer(polydata_buffer, dtype=list_type, count=size, offset=offset))
+            offset += np.dtype(list_type).itemsize * size
+            sizes[face] = size
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    connectivity = np.concatenate(indices).astype(np.int64) if indices else np.empty(0, dtype=np.int64)
+    return (offsets, connectivity), offset
+
+
+def mesh_from_numpy(points, triangles):
+    '''
+    由点坐标和三角形索引数组构造三角网格，丢弃有重复顶点的退化三角形。
+
+    :param points: numpy 数组，(N, 3) 的点坐标
+    :param triangles: numpy 数组，(M, 3) 的点索引
+    :return: vtkPolyData对象
+    '''
+    valid = (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & \
+            (triangles[:, 0] != triangles[:, 2])
+    polydata = vtkPolyData()
+    polydata.SetPoints(numpy_to_points(points))
+    polydata.SetPolys(numpy_to_cell_array(triangles[valid]))
     return polydata
 
 
+def read_uploaded_file(uploaded_file, max_size=DECOMPRESSED_MAX_BYTES):
+    '''
+    读取 Django 上传文件的内容，尽量避免额外的内存拷贝。
+
+    内存中的上传文件直接返回其底层缓冲区的 memoryview，磁盘上的临时文件则整体读出。
+    返回值可以用作 with 语句的上下文管理器，退出时释放缓冲区。
+
+    gzip 或 zstd 压缩的上传文件按魔数识别，自动解压后返回解压后的内容。
+
+    :param uploaded_file: Django 的 UploadedFile 对象
+    :param max_size: int，压缩数据解压后的大小上限（字节）
+    :return: 文件内容的 memoryview
+    :raises ValueError: 压缩数据损坏或解压后超过 max_size
+    '''
+    file = getattr(uploaded_file, 'file', None)
+    if hasattr(file, 'getbuffer'):
+        buffer = file.getbuffer()
+    else:
+        uploaded_file.seek(0)
+        buffer = memoryview(uploaded_file.read())
+    return decompress_buffer(buffer, max_size)
+
+
+def decompress_buffer(buffer, max_size=DECOMPRESSED_MAX_BYTES):
+    '''
+    按魔数识别并解压 gzip 或 zstd 压缩的数据，未压缩的数据原样返回。
+
+    解压时最多输出 max_size + 1 个字节，超出上限立即停止，不会先把全部数据解压到内存中。
+
+    :param buffer: memoryview，原始数据
+    :param max_size: int，解压后的大小上限（字节）
+    :return: memoryview，解压后的数据
+    :raises ValueError: 数据损坏、解压后超过 max_size，或者是 zstd 数据但没有安装 zstandard
+    '''
+    if buffer[:2] == GZIP_MAGIC:
+        try:
+            return memoryview(decompress_gzip(buffer, max_size))
+        except zlib.error as e:
+            raise ValueError(f'gzip 数据解压失败: {e}') from e
+    if buffer[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ValueError('服务器未安装 zstandard，无法解压 zstd 数据')
+        try:
+            # 流式解压，不要求帧头中记录了原始大小
+            with zstandard.ZstdDecompressor().stream_reader(buffer) as reader:
+                return memoryview(read_limited(reader.read, max_size))
+        except zstandard.ZstdError as e:
+            raise ValueError(f'zstd 数据解压失败: {e}') from e
+    return buffer
+
+
+def decompress_gzip(buffer, max_size):
+    '''
+    解压 gzip 数据，与 gzip.decompress 一样支持多个成员首尾相接，但输出不超过 max_size。
+
+    :param buffer: memoryview，gzip 数据
+    :param max_size: int，解压后的大小上限（字节）
+    :return: bytes
+    :raises ValueError: 数据不完整或解压后超过 max_size
+    :raises zlib.error: 数据损坏
+    '''
+    chunks = []
+    remaining = max_size + 1
+    while True:
+        # 16 + MAX_WBITS 表示带 gzip 文件头和校验的格式
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunk = decompressor.decompress(buffer, remaining)
+        chunks.append(chunk)
+        remaining -= len(chunk)
+        if remaining <= 0:
+            raise ValueError(f'解压后的数据超过 {max_size} 字节')
+        if not decompressor.eof:
+            raise ValueError('gzip 数据不完整')
+        buffer = decompressor.unused_data
+        # 与 gzip.decompress 一致，忽略末尾的零填充
+        if not buffer.lstrip(b'\0'):
+            return b''.join(chunks)
+
+
+def read_limited(read, max_size):
+    '''
+    反复调用 read 直到数据结束，读到的数据超过 max_size 时立即停止。
+
+    :param read: 类文件对象的 read 方法，读完时返回空 bytes
+    :param max_size: int，大小上限（字节）
+    :return: bytes
+    :raises ValueError: 数据超过 max_size
+    '''
+    chunks = []
+    total = 0
+    while True:
+        chunk = read(max_size + 1 - total)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+        total += len(chunk)
+        if total > max_size:
+            raise ValueError(f'解压后的数据超过 {max_size} 字节')
+
+
 def print_point_coordinates(polydata):
     '''
     打印多边形数据中点的坐标信息。
@@ -51,30 +484,91 @@ def print_point_coordinates(polydata):
         print(f"Point {i}: {point}")
 
 
-def smooth_polydata(polydata, iterations=200, angle=45):
+# 平滑质量预设：迭代次数、预先抽稀的目标三角形数（None 表示不抽稀）
+# final 与原来的固定参数一致；preview 只做少量迭代，用于交互预览
+# 窗口 sinc 过滤器的迭代次数越多，结果越接近理想的低通滤波，顶点随迭代次数单调地收敛到 final 的结果。
+# standard 是一次 100 次迭代的平滑：在 5 千到 5 万个三角形的牙冠上，与 final 的顶点平均相差 0.0014～0.0045 mm，
+# 耗时为 final 的 0.55～0.65 倍。把过滤器拆成多轮、逐轮检查位移的提前停止会改变滤波器的响应，因此不采用
+# vtkDecimatePro 的耗时与约 100 次平滑迭代相当，因此预设中默认不抽稀
+SMOOTH_PRESETS = {
+    'preview': {'iterations': 20, 'decimate': None},
+    'standard': {'iterations': 100, 'decimate': None},
+    'final': {'iterations': 200, 'decimate': None},
+}
+DEFAULT_SMOOTH_PRESET = 'final'
+
+
+def decimate_polydata(polydata, target_triangles):
+    '''
+    将三角网格抽稀到目标三角形数，边界上的点不会被删除，保证后续提取的边界不变。
+
+    :param polydata: vtkPolyData对象，输入的三角网格
+    :param target_triangles: 目标三角形数，网格不超过该数量时直接返回输入
+    :return: vtkPolyData对象，抽稀后的网格
+    '''
+    num_triangles = polydata.GetNumberOfPolys()
+    if num_triangles <= target_triangles:
+        return polydata
+    decimate = vtkDecimatePro()
+    decimate.SetInputData(polydata)
+    decimate.SetTargetReduction(1 - target_triangles / num_triangles)
+    decimate.PreserveTopologyOn()
+    decimate.BoundaryVertexDeletionOff()
+    decimate.Update()
+    return decimate.GetOutput()
+
+
+def smooth_polydata(polydata, iterations=200, angle=45, decimate=None):
     '''
     对输入的PolyData进行平滑处理。
 
     :param polydata: 输入的PolyData数据对象
     :param iterations: 平滑迭代次数，默认为200
-    :param angle: 特征边平滑的特征角度（度），默认为180
+    :param angle: 特征边平滑的特征角度（度），默认为45
+    :param decimate: 平滑前抽稀的目标三角形数，默认为None，不抽稀
+    :return: 平滑后的PolyData对象
+    '''
+    if decimate:
+        polydata = decimate_polydata(polydata, decimate)
+    return run_windowed_sinc(polydata, iterations, angle)
+
+
+def run_windowed_sinc(polydata, iterations, angle):
+    '''
+    执行一次 vtkWindowedSincPolyDataFilter 平滑。
+
+    :param polydata: 输入的PolyData数据对象
+    :param iterations: 平滑迭代次数
+    :param angle: 特征边平滑的特征角度（度）
     :return: 平滑后的PolyData对象
     '''
-    smoother = vtk.vtkWindowedSincPolyDataFilter()
+    smoother = create_windowed_sinc(iterations, angle)
     smoother.SetInputData(polydata)
 
+    # 执行平滑滤波
+    smoother.Update()
+
+    # 获取平滑后的输出PolyData
+    return smoother.GetOutput()
+
+
+def create_windowed_sinc(iterations=200, angle=45):
+    '''
+    创建并配置平滑过滤器，不设置输入，可以直接连接到流水线中。
+
+    :param iterations: 平滑迭代次数
+    :param angle: 特征边平滑的特征角度（度）
+    :return: vtkWindowedSincPolyDataFilter对象
+    '''
+    smoother = vtkWindowedSincPolyDataFilter()
+
     # 设置平滑参数
     smoother.SetNumberOfIterations(iterations)  # 设置平滑迭代次数
     # smoother.BoundarySmoothingOn()  # 开启边界平滑
     smoother.FeatureEdgeSmoothingOn()  # 开启特征边平滑
     smoother.SetEdgeAngle(angle)  # 设置特征角度
     # smoother.SetPassBand(passBand)  # 设置通带参数
-
-    # 执行平滑滤波
-    smoother.Update()
-
-    # 获取平滑后的输出PolyData
-    return smoother.GetOutput()
+    return smoother
 
 
 def extract_edge(polydata):
@@ -84,11 +578,7 @@ def extract_edge(polydata):
     :param polydata: vtkPolyData，输入的多边形数据
     :return: vtkPolyData，提取后的边界线数据
     '''
-    extract_edges = vtk.vtkFeatureEdges()
-    extract_edges.BoundaryEdgesOn()
-    extract_edges.FeatureEdgesOff()
-    extract_edges.ManifoldEdgesOff()
-    extract_edges.NonManifoldEdgesOff()
+    extract_edges = create_edge_filter()
     # 设置输入数据
     extract_edges.SetInputData(polydata)  # input_poly_data是输入的多边形数据
 
@@ -97,6 +587,20 @@ def extract_edge(polydata):
     return extract_edges.GetOutput()
 
 
+def create_edge_filter():
+    '''
+    创建只提取边界边的 vtkFeatureEdges，不设置输入，可以直接连接到流水线中。
+
+    :return: vtkFeatureEdges对象
+    '''
+    extract_edges = vtkFeatureEdges()
+    extract_edges.BoundaryEdgesOn()
+    extract_edges.FeatureEdgesOff()
+    extract_edges.ManifoldEdgesOff()
+    extract_edges.NonManifoldEdgesOff()
+    return extract_edges
+
+
 def clip_data(port, plane):
     '''
     对给定的3D数据进行剖切操作。
@@ -108,7 +612,7 @@ def clip_data(port, plane):
     :return: vtkPolyData
         返回剖切后的3D数据，类型为vtkPolyData。
     '''
-    clip_polydata = vtk.vtkCutter()
+    clip_polydata = vtkCutter()
     clip_polydata.SetInputConnection(port)
     clip_polydata.SetCutFunction(plane)
     clip_polydata.GenerateCutScalarsOn()
@@ -123,13 +627,80 @@ def append_data(polydata_list):
     :param polydata_list: 包含多个PolyData对象的列表
     :return: 合并后的PolyData对象
     '''
-    append_filter = vtk.vtkAppendPolyData()
+    append_filter = vtkAppendPolyData()
     for polydata in polydata_list:
         append_filter.AddInputData(polydata)
     append_filter.Update()
     return append_filter
 
 
+def weld_polydata(polydata_list, tolerance=WELD_TOLERANCE):
+    '''
+    将多个三角网格拼接为一个网格，接缝处重合的顶点合并为同一个点。
+
+    顶点按空间网格合并（见 weld_vertices），合并后退化的三角形以及顶点相同的重复三角形被丢弃，
+    只保留输入中的面片，线和顶点单元不会写入。
+
+    :param polydata_list: 包含多个 vtkPolyData 的列表，面片均为三角形
+    :param tolerance: 合并顶点的网格边长
+    :return: vtkPolyData对象
+    '''
+    points = []
+    triangles = []
+    offset = 0
+    for polydata in polydata_list:
+        points.append(polydata_points_to_numpy(polydata))
+        triangles.append(vtk_to_numpy(polydata.GetPolys().GetConnectivityArray()).reshape(-1, 3) + offset)
+        offset += polydata.GetNumberOfPoints()
+    points, inverse = weld_vertices(np.vstack(points), tolerance)
+    triangles = inverse[np.vstack(triangles)]
+
+    # 三个顶点相同（不论顺序）的三角形只保留第一个
+    _, first = np.unique(np.sort(triangles, axis=1), axis=0, return_index=True)
+    return mesh_from_numpy(points, triangles[np.sort(first)])
+
+
+def validate_manifold(polydata):
+    '''
+    检查三角网格是否是方向一致的流形。
+
+    每条边最多被两个三角形共享，且共享一条边的两个三角形沿相反方向经过它时，网格是方向一致的流形；
+    只被一个三角形使用的边是开放边界，牙根网格应只有一个开放边界环（与牙冠相接的颈缘）。
+
+    :param polydata: vtkPolyData对象，三角网格
+    :return: dict，各项统计以及 manifold（是否为没有退化、重复面片的方向一致的流形）
+    '''
+    num_points = polydata.GetNumberOfPoints()
+    triangles = vtk_to_numpy(polydata.GetPolys().GetConnectivityArray()).reshape(-1, 3).astype(np.int64)
+    degenerate = (triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2]) | \
+        (triangles[:, 0] == triangles[:, 2])
+    duplicate = len(triangles) - len(np.unique(np.sort(triangles, axis=1), axis=0))
+
+    directed = triangles[~degenerate][:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    undirected_keys = np.min(directed, axis=1) * num_points + np.max(directed, axis=1)
+    _, edge_counts = np.unique(undirected_keys, return_counts=True)
+    _, directed_counts = np.unique(directed[:, 0] * num_points + directed[:, 1], return_counts=True)
+    used = np.zeros(num_points, dtype=bool)
+    used[triangles.ravel()] = True
+
+    report = {
+        'points': num_points,
+        'triangles': len(triangles),
+        'edges': len(edge_counts),
+        'boundary_edges': int(np.count_nonzero(edge_counts == 1)),
+        'boundary_loops': len(extract_boundary_loops(extract_edge(polydata))),
+        'non_manifold_edges': int(np.count_nonzero(edge_counts > 2)),
+        'inconsistent_edges': int(np.count_nonzero(directed_counts > 1)),
+        'degenerate_triangles': int(np.count_nonzero(degenerate)),
+        'duplicate_triangles': int(duplicate),
+        'unused_points': int(num_points - np.count_nonzero(used)),
+        'euler_characteristic': int(num_points - len(edge_counts) + len(triangles)),
+    }
+    report['manifold'] = not any(report[name] for name in (
+        'non_manifold_edges', 'inconsistent_edges', 'degenerate_triangles', 'duplicate_triangles'))
+    return report
+
+
 def display_polydata(polydata_list=None, port_list=None):
     '''
     渲染显示一系列polydata
@@ -138,22 +709,36 @@ def display_polydata(polydata_list=None, port_list=None):
     :param port_list: 包含vtkAlgorithmOutput对象的列表，用于渲染显示。
     :return: 无返回值。
     '''
+    # 渲染相关的模块只在调试显示时加载，服务端进程不需要加载 OpenGL
+    # noinspection PyUnresolvedReferences
+    import vtkmodules.vtkInteractionStyle
+    # noinspection PyUnresolvedReferences
+    import vtkmodules.vtkRenderingOpenGL2
+    from vtkmodules.vtkRenderingCore import (
+        vtkActor,
+        vtkDataSetMapper,
+        vtkPolyDataMapper,
+        vtkRenderWindow,
+        vtkRenderWindowInteractor,
+        vtkRenderer
+    )
+
     # 创建渲染器、窗口和交互器
     if port_list is None:
         port_list = []
     if polydata_list is None:
         polydata_list = []
-    renderer = vtk.vtkRenderer()
+    renderer = vtkRenderer()
 
 
     # 遍历polydata_list中的每个PolyData
     for polydata in polydata_list:
         # 创建映射器，并设置PolyData作为输入
-        mapper = vtk.vtkPolyDataMapper()
+        mapper = vtkPolyDataMapper()
         mapper.SetInputData(polydata)
 
         # 创建表示几何图形的实体
-        actor = vtk.vtkActor()
+        actor = vtkActor()
         actor.SetMapper(mapper)
 
         # 将表示几何图形的实体添加到渲染器中
@@ -161,23 +746,23 @@ def display_polydata(polydata_list=None, port_list=None):
 
     for port in port_list:
         # 创建映射器，并设置PolyData作为输入
-        mapper = vtk.vtkDataSetMapper()
+        mapper = vtkDataSetMapper()
         try:
             mapper.SetInputConnection(port)
         except Exception as e:
             print(f"Error when setting input connection: {e}")
 
         # 创建表示几何图形的实体
-        actor = vtk.vtkActor()
+        actor = vtkActor()
         actor.SetMapper(mapper)
 
         # 将表示几何图形的实体添加到渲染器中
         renderer.AddActor(actor)
 
     # 开始渲染和交互
-    render_window = vtk.vtkRenderWindow()
+    render_window = vtkRenderWindow()
     render_window.AddRenderer(renderer)
-    interactor = vtk.vtkRenderWindowInteractor()
+    interactor = vtkRenderWindowInteractor()
     interactor.SetRenderWindow(render_window)
     interactor.Initialize()
     render_window.Render()
@@ -192,9 +777,9 @@ def translate_polydata(polydata, translate):
     :param translate: 包含三个浮点数的列表或元组，表示平移的x、y、z分量。
     :return: 平移后的vtkPolyData对象。
     '''
-    translation = vtk.vtkTransform()
+    translation = vtkTransform()
     translation.Translate(translate)
-    transform_filter = vtk.vtkTransformPolyDataFilter()
+    transform_filter = vtkTransformPolyDataFilter()
     transform_filter.SetInputData(polydata)
     transform_filter.SetTransform(translation)
     transform_filter.Update()
@@ -211,67 +796,54 @@ def clean_data(data):
 
     :return: vtkCleanPolyData对象，清理后的数据对象。
     '''
-    clean_filter = vtk.vtkCleanPolyData()
+    clean_filter = vtkCleanPolyData()
     clean_filter.SetInputConnection(data.GetOutputPort())
     clean_filter.Update()
     return clean_filter
 
 
 def clean_single_point_faces(polydata):
-    # 创建一个PolyData对象（这里假设你已经有一个PolyData对象）
-    polydata_copy = vtk.vtkPolyData()
-    polydata_copy.DeepCopy(polydata)  # 创建一个副本以避免原始数据修改
-
-    # 获取面片数据
-    faces = polydata_copy.GetPolys()
-
-    # 创建一个点-面片关联的数据结构
-    point_face_count = {}  # 用于存储每个点与面片的共享顶点数量
-
-    # 遍历面片数据，统计点与面片的共享顶点数量
-    faces.InitTraversal()
-    face = vtk.vtkIdList()
-
-    while faces.GetNextCell(face):
-        num_points = face.GetNumberOfIds()
-        for i in range(num_points):
-            point_id = face.GetId(i)
-            if point_id not in point_face_count:
-                point_face_count[point_id] = 1
-            else:
-                point_face_count[point_id] += 1
-
-    # 清理只有一个共享顶点的面片
-    cells_to_keep = set()
-
-    faces.InitTraversal()
-    cell_id = 0
-
-    while faces.GetNextCell(face):
-        delete_face = False
-        num_points = face.GetNumberOfIds()
+    '''
+    删除包含孤立顶点（只被一个面片使用的顶点）的面片。
 
-        for i in range(num_points):
-            point_id = face.GetId(i)
-            if point_face_count[point_id] == 1:
-                delete_face = True
-                break
+    直接在面片的 connectivity/offsets 数组上用 numpy 统计顶点的使用次数，
+    一次性计算需要保留的面片，再整体写回新的面片数组。
 
-        if not delete_face:
-            cells_to_keep.add(cell_id)
+    :param polydata: vtkPolyData对象，待清理的网格
+    :return: vtkPolyData对象，清理后的网格。与输入共享点坐标等数据，输入数据不会被修改
+    '''
+    # 浅拷贝，替换面片数组不会影响原始数据
+    polydata_copy = vtkPolyData()
+    polydata_copy.ShallowCopy(polydata)
 
-        cell_id += 1
+    # 获取面片数据
+    faces = polydata_copy.GetPolys()
+    offsets = vtk_to_numpy(faces.GetOffsetsArray())
+    connectivity = vtk_to_numpy(faces.GetConnectivityArray())
+    if connectivity.size == 0:
+        return polydata_copy
+
+    # 统计每个点被面片使用的次数
+    point_face_count = np.bincount(connectivity)
+    cell_sizes = np.diff(offsets)
+
+    # 面片中只要有一个顶点的使用次数为 1，就删除该面片
+    single_point = (point_face_count[connectivity] == 1).astype(np.int64)
+    non_empty = cell_sizes > 0
+    single_point_cells = np.zeros(len(cell_sizes), dtype=bool)
+    single_point_cells[non_empty] = np.add.reduceat(single_point, offsets[:-1][non_empty]) > 0
+    if not single_point_cells.any():
+        # 没有需要删除的面片，继续共享原来的面片数组
+        return polydata_copy
+    cells_to_keep = ~single_point_cells
 
     # 创建一个新的面片数据，只包含要保留的单元
-    new_faces = vtk.vtkCellArray()
-    faces.InitTraversal()
-    cell_id = 0
-
-    while faces.GetNextCell(face):
-        if cell_id in cells_to_keep:
-            new_faces.InsertNextCell(face)
-
-        cell_id += 1
+    new_connectivity = connectivity[np.repeat(cells_to_keep, cell_sizes)]
+    new_offsets = np.zeros(np.count_nonzero(cells_to_keep) + 1, dtype=np.int64)
+    np.cumsum(cell_sizes[cells_to_keep], out=new_offsets[1:])
+    new_faces = vtkCellArray()
+    new_faces.SetData(numpy_to_vtk(new_offsets, deep=1),
+                      numpy_to_vtk(new_connectivity.astype(np.int64), deep=1))
 
     # 设置新的面片数据并更新PolyData
     polydata_copy.SetPolys(new_faces)
@@ -280,184 +852,413 @@ def clean_single_point_faces(polydata):
 
 
 def select_polydata(polydata, line):
-    select_filter = vtk.vtkSelectPolyData()
+    select_filter = vtkSelectPolyData()
     select_filter.SetInputData(polydata)
     select_filter.SetLoop(line.GetPoints())
     select_filter.GenerateSelectionScalarsOn()
     select_filter.SetSelectionModeToLargestRegion()
     select_filter.Update()
-    clip_filter = vtk.vtkClipPolyData()
+    clip_filter = vtkClipPolyData()
     clip_filter.SetInputConnection(select_filter.GetOutputPort())
     clip_filter.Update()
     return clip_filter
 
 
-def smooth_line(boundary_line=None):
-    if boundary_line is None:
-        return
+def extract_boundary_loops(boundary_line):
+    '''
+    将 extract_edge 提取出的边界线段按顺序连接成闭合环。
+
+    使用整数数组建立点的邻接关系，沿线段方向依次行走；边界可能由多个互不相连的环组成，全部返回。
+    每个环从其中编号最小的点开始。
+
+    :param boundary_line: vtkPolyData对象，由线段组成的边界线
+    :return: list，每个元素是一个环按顺序排列的点索引数组
+    '''
+    lines = boundary_line.GetLines()
+    offsets = vtk_to_numpy(lines.GetOffsetsArray())
+    connectivity = vtk_to_numpy(lines.GetConnectivityArray())
+    if connectivity.size < 2:
+        return []
+
+    # 同一条折线中相邻的两个点组成一条边
+    same_cell = np.ones(len(connectivity) - 1, dtype=bool)
+    same_cell[offsets[1:-1] - 1] = False
+    edges = np.column_stack((connectivity[:-1][same_cell], connectivity[1:][same_cell]))
+
+    # 沿线段方向的后继点，以及不区分方向的邻接表（CSR 形式），用于方向不一致或分叉的边
+    num_points = boundary_line.GetNumberOfPoints()
+    successor = np.full(num_points, -1, dtype=np.int64)
+    successor[edges[:, 0]] = edges[:, 1]
+    undirected = np.concatenate((edges, edges[:, ::-1]))
+    undirected = undirected[np.argsort(undirected[:, 0], kind='stable')]
+    neighbor_starts = np.searchsorted(undirected[:, 0], np.arange(num_points + 1)).tolist()
+    neighbors = undirected[:, 1].tolist()
+    successor = successor.tolist()
+
+    visited = [False] * num_points
+    loops = []
+    for seed in np.unique(edges).tolist():
+        if visited[seed]:
+            continue
+        visited[seed] = True
+        loop = [seed]
+        current = seed
+        while True:
+            next_index = successor[current]
+            if next_index < 0 or visited[next_index]:
+                next_index = next((neighbor for neighbor in
+                                   neighbors[neighbor_starts[current]:neighbor_starts[current + 1]]
+                                   if not visited[neighbor]), -1)
+            if next_index < 0:
+                break
+            visited[next_index] = True
+            loop.append(next_index)
+            current = next_index
+        loops.append(np.array(loop, dtype=np.int64))
+    return loops
+
+
+def smooth_line(boundary_line=None, spacing=None):
+    '''
+    将边界线整理成有序的闭合环，并用参数样条平滑。
 
-    line_indices = {}  # 用于存储线段的点索引
+    边界由多个环组成时，只保留周长最大的环。
 
-    if not boundary_line:
-        return line_indices
+    :param boundary_line: vtkPolyData对象，extract_edge 提取出的边界线
+    :param spacing: 样条重新采样的弧长间距，为 None 时使用 vtkParametricFunctionSource 的默认分辨率
+    :return: vtkPolyData对象，平滑后的闭合线，首尾两个点重合
+    '''
+    if boundary_line is None:
+        return
 
-    cells = boundary_line.GetLines()
-    cells.InitTraversal()
-    id_list = vtk.vtkIdList()
+    loops = extract_boundary_loops(boundary_line)
+    if not loops:
+        raise ValueError('边界线中没有闭合环')
 
-    while cells.GetNextCell(id_list):
-        if id_list.GetNumberOfIds() == 2:
-            # 提取每个线段的两个点的索引并添加到数组中
-            point_index1 = id_list.GetId(0)
-            point_index2 = id_list.GetId(1)
-            line_indices[str(point_index1)] = point_index2
-    points = vtk.vtkPoints()
-    last_index = 0
-    for i in range(boundary_line.GetNumberOfPoints()+1):
-        point = boundary_line.GetPoint(last_index)
-        last_index = line_indices[str(last_index)]
-        points.InsertNextPoint(point)
+    # 选择周长最大的环
+    boundary_points = polydata_points_to_numpy(boundary_line)
+    loop_points = [boundary_points[loop] for loop in loops]
+    perimeters = [closed_line_length(points) for points in loop_points]
+    largest = int(np.argmax(perimeters))
 
-    spline = vtk.vtkParametricSpline()
-    spline.SetPoints(points)
+    # 首尾相连，回到起点
+    points = loop_points[largest]
+    spline = vtkParametricSpline()
+    spline.SetPoints(numpy_to_points(np.vstack((points, points[:1]))))
 
-    functionSource = vtk.vtkParametricFunctionSource()
+    functionSource = vtkParametricFunctionSource()
     functionSource.SetParametricFunction(spline)
+    if spacing:
+        # 样条按弧长参数化，均匀的参数分辨率即为均匀的弧长间距
+        functionSource.SetUResolution(max(3, int(np.ceil(perimeters[largest] / spacing))))
     functionSource.Update()
 
-    splineMapper = vtk.vtkPolyDataMapper()
-    splineMapper.SetInputData(functionSource.GetOutput())
-
-    splineActor = vtk.vtkActor()
-    splineActor.SetMapper(splineMapper)
-
-    resultPolydata = vtk.vtkPolyData()
-    resultPolydata.SetPoints(points)
-
-    resultGlyphFilter = vtk.vtkVertexGlyphFilter()
-    resultGlyphFilter.AddInputData(resultPolydata)
-    resultGlyphFilter.Update()
-
-    # resultMapper = vtk.vtkPolyDataMapper()
-    # resultMapper.SetInputConnection(resultGlyphFilter.GetOutputPort())
-    # resultActor = vtk.vtkActor()
-    # resultActor.SetMapper(resultMapper)
-    # resultActor.GetProperty().SetPointSize(5)  # 设置点的尺寸大小
-    # resultActor.GetProperty().SetColor(1, 0.0, 0.0)
-    #
-    # ren1 = vtk.vtkRenderer()
-    # ren1.AddActor(splineActor)
-    # ren1.AddActor(resultActor)
-    # ren1.SetBackground(0.1, 0.2, 0.4)
-    #
-    # renWin = vtk.vtkRenderWindow()
-    # renWin.AddRenderer(ren1)
-    # renWin.SetSize(300, 300)
-    #
-    # iren = vtk.vtkRenderWindowInteractor()
-    # iren.SetRenderWindow(renWin)
-    # iren.Initialize()
-    # iren.Start()
-
     return functionSource.GetOutput()
 
 
+def polydata_points_to_numpy(polydata):
+    '''
+    以 numpy 数组的形式获取 PolyData 的点坐标，不拷贝数据。
+
+    :param polydata: vtkPolyData对象
+    :return: numpy 数组，(N, 3) 的点坐标，没有点时返回空数组
+    '''
+    if polydata.GetPoints() is None:
+        return np.empty((0, 3))
+    return vtk_to_numpy(polydata.GetPoints().GetData())
+
+
+def closed_line_fractions(points):
+    '''
+    计算闭合折线上每个点所在位置的弧长比例（第 0 个点为 0，首尾相连的线段计入总长度）。
+
+    :param points: numpy 数组，(N, 3) 的点坐标
+    :return: numpy 数组，(N,) 的弧长比例，取值范围 [0, 1)
+    '''
+    segment_lengths = np.linalg.norm(np.roll(points, -1, axis=0) - points, axis=1)
+    total_length = segment_lengths.sum()
+    if total_length == 0:
+        return np.arange(len(points)) / len(points)
+    return np.concatenate(([0.0], np.cumsum(segment_lengths[:-1]))) / total_length
+
+
+def closed_line_length(points):
+    '''
+    计算闭合折线的周长（包含首尾相连的线段）。
+
+    :param points: numpy 数组，(N, 3) 的点坐标
+    :return: float，周长
+    '''
+    return float(np.linalg.norm(np.roll(points, -1, axis=0) - points, axis=1).sum())
+
+
+def resample_closed_line(points, fractions):
+    '''
+    在闭合折线上按弧长比例线性插值，重新采样得到新的点。
+
+    :param points: numpy 数组，(N, 3) 的点坐标
+    :param fractions: numpy 数组，(M,) 的弧长比例，取值范围 [0, 1)
+    :return: numpy 数组，(M, 3) 的点坐标
+    '''
+    closed_points = np.vstack((points, points[:1]))
+    source_fractions = np.append(closed_line_fractions(points), 1.0)
+    return np.column_stack([np.interp(fractions, source_fractions, closed_points[:, axis])
+                            for axis in range(3)])
+
+
+def downsample_closed_line(line, num_points):
+    '''
+    按弧长均匀地将 smooth_line 输出的闭合线重新采样为更少的点，用于降低牙根网格的分辨率。
+
+    :param line: vtkPolyData对象，首尾两个点重合的闭合线
+    :param num_points: int，重新采样后的点数（包含重合的末点），不小于 4
+    :return: vtkPolyData对象，首尾两个点重合的闭合线；点数已经不多于 num_points 时直接返回 line
+    '''
+    points = polydata_points_to_numpy(line)
+    if num_points >= len(points):
+        return line
+    loop = points[:-1]
+    resampled = resample_closed_line(loop, np.arange(num_points - 1) / (num_points - 1))
+    resampled = np.vstack((resampled, resampled[:1])).astype(points.dtype)
+
+    new_line = vtkPolyData()
+    new_line.SetPoints(numpy_to_points(resampled))
+    new_line.SetLines(numpy_to_cell_array(np.arange(num_points)[None, :]))
+    return new_line
+
+
 def create_closed_surface(line1, line2):
-    # 创建vtkPoints对象
-    points = vtk.vtkPoints()
-
-    # 添加line1的点
-    for i in range(line1.GetNumberOfPoints()):
-        point = line1.GetPoint(i)
-        points.InsertNextPoint(point[0], point[1], point[2])
-
-    # 添加line2的点，注意z轴上的位移间隔
-    for i in range(line2.GetNumberOfPoints()):
-        point = line2.GetPoint(i)
-        points.InsertNextPoint(point[0], point[1], point[2])
-
-    # 创建vtkCellArray对象
-    triangles = vtk.vtkCellArray()
-
-    # 构造三角形单元
-    num_points = line1.GetNumberOfPoints()
-    for i in range(num_points):
-        triangle1 = vtk.vtkTriangle()
-        triangle1.GetPointIds().SetId(0, i % num_points)
-        triangle1.GetPointIds().SetId(1, (i + 1) % num_points)
-        triangle1.GetPointIds().SetId(2, i % num_points + num_points)
-
-        triangle2 = vtk.vtkTriangle()
-        triangle2.GetPointIds().SetId(0, (i + 1) % num_points)
-        triangle2.GetPointIds().SetId(1, (i + 1) % num_points + num_points)
-        triangle2.GetPointIds().SetId(2, i % num_points + num_points)
-
-        triangles.InsertNextCell(triangle1)
-        triangles.InsertNextCell(triangle2)
+    '''
+    在两条闭合线之间构造三角形条带，将两条线连接成一个侧面。
 
-    # 创建vtkPolyData对象
-    side_surface = vtk.vtkPolyData()
+    line1 的第 i 个点与 line2 的第 i 个点相对应，每个点构造两个三角形，共 2N 个。
+    两条线的点数不同时，line2 会按 line1 各点的弧长比例重新采样。
 
-    # 将vtkPoints和vtkCellArray与vtkPolyData关联
-    side_surface.SetPoints(points)
-    side_surface.SetPolys(triangles)
+    :param line1: vtkPolyData对象，第一条闭合线
+    :param line2: vtkPolyData对象，第二条闭合线
+    :return: vtkPolyData对象，两条线之间的侧面
+    '''
+    points1 = polydata_points_to_numpy(line1)
+    points2 = polydata_points_to_numpy(line2)
+    num_points = len(points1)
+    if len(points2) != num_points:
+        points2 = resample_closed_line(points2, closed_line_fractions(points1))
+
+    # 构造三角形单元，第 i 个点对应 (i, i+1, i+N) 和 (i+1, i+1+N, i+N) 两个三角形
+    current_ids = np.arange(num_points)
+    next_ids = np.roll(current_ids, -1)
+    triangles = np.empty((num_points, 2, 3), dtype=np.int64)
+    triangles[:, 0] = np.column_stack((current_ids, next_ids, current_ids + num_points))
+    triangles[:, 1] = np.column_stack((next_ids, next_ids + num_points, current_ids + num_points))
+
+    # 创建vtkPolyData对象
+    side_surface = vtkPolyData()
+    side_surface.SetPoints(numpy_to_points(np.vstack((points1, points2)).astype(np.float32)))
+    side_surface.SetPolys(numpy_to_cell_array(triangles.reshape(-1, 3)))
 
     return side_surface
 
 
-def create_new_line(line1, line2):
-    # 获取line1的点数据
-    line1_points = line1.GetPoints()
+def create_new_line(line1, line2, align='nearest'):
+    '''
+    重新排列 line2 的点，使其起点与 line1 的起点对齐，便于两条线之间构造三角形条带。
 
-    # 获取line2的点数据
-    line2_points = line2.GetPoints()
+    align 为 'nearest' 时，以 line2 中距离 line1 第一个点最近的点作为起点；
+    为 'min_distance' 时，选择使两条线对应点之间距离平方和最小的起点，避免条带出现扭曲的三角形。
+    后者对所有偏移量的代价用 FFT 做循环互相关一次算出，复杂度为 O(N log N)。
 
-    # 获取line1的第一个点作为起始点
-    start_point = np.array(line1_points.GetPoint(0))
+    :param line1: vtkPolyData对象，参考线
+    :param line2: vtkPolyData对象，需要重新排列的闭合线
+    :param align: str，对齐方式，'nearest' 或 'min_distance'
+    :return: vtkPolyData对象，只包含重新排列后的点
+    '''
+    points1 = polydata_points_to_numpy(line1)
+    points2 = polydata_points_to_numpy(line2)
 
     # 初始化一个空的新PolyData对象
-    line3 = vtk.vtkPolyData()
-    points = vtk.vtkPoints()
+    line3 = vtkPolyData()
+    if len(points2) == 0:
+        return line3
 
-    # 找到line2中距离start_point最近的点
-    min_distance = float('inf')
-    nearest_point_index = -1
+    if align == 'nearest':
+        # 找到line2中距离line1第一个点最近的点，单次查询直接向量化计算即可，无需建立空间索引
+        start_index = int(np.argmin(np.sum((points2 - points1[0]) ** 2, axis=1)))
+    elif align == 'min_distance':
+        start_index = min_distance_offset(points1, points2)
+    else:
+        raise ValueError(f'不支持的对齐方式: {align}')
 
-    for i in range(line2_points.GetNumberOfPoints()):
-        point = np.array(line2_points.GetPoint(i))
-        distance = np.linalg.norm(point - start_point)
+    # 将起点及其后续点循环移位到最前面
+    line3.SetPoints(numpy_to_points(np.roll(points2, -start_index, axis=0).astype(np.float32)))
 
-        if distance < min_distance:
-            min_distance = distance
-            nearest_point_index = i
+    return line3
 
-    if nearest_point_index != -1:
-        # 添加nearest_point及其后续点到line3
-        for i in range(nearest_point_index,
-                       nearest_point_index + line2_points.GetNumberOfPoints()):
-            point = line2_points.GetPoint(i % line2_points.GetNumberOfPoints())
-            points.InsertNextPoint(point)
 
-        line3.SetPoints(points)
+def min_distance_offset(points1, points2):
+    '''
+    计算使两条闭合线对应点距离平方和最小的循环偏移量。
 
-    return line3
+    对偏移量 k，代价为 sum_i |p1[i] - p2[(i + k) % N]|^2，其中只有互相关项依赖 k，
+    因此用 FFT 一次求出所有偏移量的互相关。两条线的点数不同时，line1 按 line2 各点的弧长比例重新采样。
+
+    :param points1: numpy 数组，(N1, 3) 的参考线点坐标
+    :param points2: numpy 数组，(N2, 3) 的闭合线点坐标
+    :return: int，line2 的起点索引
+    '''
+    points1 = np.asarray(points1, dtype=np.float64)
+    points2 = np.asarray(points2, dtype=np.float64)
+    if len(points1) != len(points2):
+        points1 = resample_closed_line(points1, closed_line_fractions(points2))
 
+    # corr[k] = sum_i p1[i] . p2[i + k]
+    spectrum = np.conj(np.fft.rfft(points1, axis=0)) * np.fft.rfft(points2, axis=0)
+    correlation = np.fft.irfft(spectrum, n=len(points2), axis=0).sum(axis=1)
+    return int(np.argmax(correlation))
 
-def polydata_to_string(polydata):
+
+def create_xml_writer(compressor=XML_COMPRESSOR, compression_level=XML_COMPRESSION_LEVEL):
+    '''
+    创建输出到字符串的 vtkXMLPolyDataWriter。
+
+    数据数组以 appended 二进制格式写入，并用 VTK 内置的压缩器压缩，不使用体积大、解析慢的 ascii 格式。
+
+    :param compressor: 压缩方式，见 XML_COMPRESSORS，'none' 表示不压缩
+    :param compression_level: 压缩级别，1（最快）到 9（体积最小）
+    :return: vtkXMLPolyDataWriter对象
+    '''
+    writer = vtkXMLPolyDataWriter()
+    writer.WriteToOutputStringOn()
+    writer.SetDataModeToAppended()
+    writer.EncodeAppendedDataOn()
+    if compressor == 'zlib':
+        writer.SetCompressorTypeToZLib()
+    elif compressor == 'lz4':
+        writer.SetCompressorTypeToLZ4()
+    elif compressor == 'lzma':
+        writer.SetCompressorTypeToLZMA()
+    elif compressor == 'none':
+        writer.SetCompressorTypeToNone()
+    else:
+        raise ValueError(f'不支持的压缩方式: {compressor}')
+    if compressor != 'none':
+        writer.SetCompressionLevel(compression_level)
+    return writer
+
+
+def polydata_to_string(polydata, compressor=XML_COMPRESSOR, compression_level=XML_COMPRESSION_LEVEL):
     '''
     将vtkPolyData对象转换为Base64编码的XML字符串，用于发送给前端。
 
     :param polydata: vtkPolyData对象，包含要转换的数据。
+    :param compressor: XML 中数据数组的压缩方式，见 create_xml_writer
+    :param compression_level: 压缩级别
     :return: Base64编码的XML字符串。
     '''
-    writer = vtk.vtkXMLPolyDataWriter()
+    writer = create_xml_writer(compressor, compression_level)
     writer.SetInputData(polydata)
-    writer.WriteToOutputStringOn()
     writer.Write()
     xml_string = writer.GetOutputString()
     base64_encoded = base64.b64encode(xml_string.encode()).decode()
     return base64_encoded
 
 
+def polydata_to_bytes(polydata):
+    '''
+    将vtkPolyData对象转换为紧凑的二进制网格格式，用于发送给支持该格式的前端。
+
+    只保留点坐标和三角面片，线、顶点和属性数据不会写入。非三角形的面片会先被三角化。
+
+    :param polydata: vtkPolyData对象，包含要转换的数据。
+    :return: 二进制网格数据，格式见 MESH_HEADER。
+    '''
+    return b''.join(iter_polydata_bytes(polydata))
+
+
+def iter_polydata_bytes(polydata, chunk_size=None):
+    '''
+    以二进制网格格式逐块输出 vtkPolyData，格式与 polydata_to_bytes 相同。
+
+    每块只转换对应的一段点坐标或三角形索引，除网格本身外占用的内存不超过 chunk_size。
+
+    :param polydata: vtkPolyData对象
+    :param chunk_size: 每块的最大字节数，为 None 时每个数组整体输出
+    :return: bytes 的生成器，依次为文件头、点坐标、三角形索引
+    '''
+    if polydata.GetNumberOfPolys() and \
+            polydata.GetPolys().GetNumberOfConnectivityIds() != 3 * polydata.GetNumberOfPolys():
+        triangle_filter = vtkTriangleFilter()
+        triangle_filter.PassLinesOff()
+        triangle_filter.PassVertsOff()
+        triangle_filter.SetInputData(polydata)
+        triangle_filter.Update()
+        polydata = triangle_filter.GetOutput()
+
+    if polydata.GetPoints() is None:
+        points = np.empty(0, dtype='<f4')
+    else:
+        points = vtk_to_numpy(polydata.GetPoints().GetData()).reshape(-1)
+    triangles = vtk_to_numpy(polydata.GetPolys().GetConnectivityArray())
+
+    yield MESH_HEADER.pack(MESH_MAGIC, MESH_VERSION, 0, len(points) // 3, len(triangles) // 3)
+    for values, dtype in ((points, '<f4'), (triangles, '<i4')):
+        # 两种类型的元素都是 4 字节
+        step = len(values) if chunk_size is None else max(1, chunk_size // 4)
+        for start in range(0, len(values), step or 1):
+            yield values[start:start + step].astype(dtype, copy=False).tobytes()
+
+
+def iter_polydata_xml(polydata, chunk_size, compressor=XML_COMPRESSOR, compression_level=XML_COMPRESSION_LEVEL):
+    '''
+    逐块输出 vtkPolyData 的 VTK XML 数据，内容与 polydata_to_string 解码后相同。
+
+    vtkXMLPolyDataWriter 先逐个数组写到临时文件，再按块读出，不在内存中拼出完整的 XML 字符串。
+    除最后一块外每块都正好是 chunk_size 字节，chunk_size 取 3 的倍数时可以逐块做 Base64 编码。
+
+    :param polydata: vtkPolyData对象
+    :param chunk_size: 每块的字节数
+    :param compressor: XML 中数据数组的压缩方式，见 create_xml_writer
+    :param compression_level: 压缩级别
+    :return: bytes 的生成器
+    '''
+    fd, path = tempfile.mkstemp(suffix='.vtp')
+    os.close(fd)
+    try:
+        writer = create_xml_writer(compressor, compression_level)
+        writer.WriteToOutputStringOff()
+        writer.SetFileName(path)
+        writer.SetInputData(polydata)
+        writer.Write()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.unlink(path)
+
+
+def bytes_to_polydata(mesh_bytes):
+    '''
+    将 polydata_to_bytes 生成的二进制网格数据还原为vtkPolyData对象。
+
+    :param mesh_bytes: 二进制网格数据
+    :return: vtkPolyData对象
+    '''
+    magic, version, _, num_points, num_triangles = MESH_HEADER.unpack_from(mesh_bytes)
+    if magic != MESH_MAGIC or version != MESH_VERSION:
+        raise ValueError('不支持的二进制网格格式')
+
+    offset = MESH_HEADER.size
+    points = np.frombuffer(mesh_bytes, dtype='<f4', count=num_points * 3, offset=offset)
+    offset += points.nbytes
+    triangles = np.frombuffer(mesh_bytes, dtype='<i4', count=num_triangles * 3, offset=offset)
+
+    polydata = vtkPolyData()
+    polydata.SetPoints(numpy_to_points(points.reshape(-1, 3)))
+    polydata.SetPolys(numpy_to_cell_array(triangles.reshape(-1, 3)))
+    return polydata
+
+
 if __name__ == '__main__':
     test_select()
\ No newline at end of file
@@ -1,100 +1,902 @@
-import copy
-import numpy as np
+import asyncio
 import base64
+import contextlib
+import json
+import time
+from concurrent.futures.process import BrokenProcessPool
 
-from django.shortcuts import render
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-import json
 
-from backend.utils import parse_polydata, extract_edge, smooth_polydata, \
-    translate_polydata, append_data, clean_data, polydata_to_string, \
-    display_polydata, select_polydata, smooth_line, create_closed_surface, \
-    create_new_line, clean_single_point_faces
-from backend.root import RootCone
+from backend.utils import parse_polydata, polydata_to_string, read_uploaded_file, \
+    polydata_to_bytes, iter_polydata_bytes, iter_polydata_xml, bytes_to_polydata, validate_manifold, \
+    MESH_CONTENT_TYPE, SMOOTH_PRESETS, DEFAULT_SMOOTH_PRESET, DECOMPRESSED_MAX_BYTES
+from backend.arch import LABEL_ARRAY, LABEL_TYPES, mesh_labels, read_labels, resolve_label_type, split_arch
+from backend.cache import get_result_cache, make_cache_key
+from backend.jobs import submit_job, get_job_executor
+from backend.meshes import get_mesh_store, make_mesh_handle
+from backend.metrics import METRICS, StageTimer
+from backend.models import RootJob
+from backend.pipeline import generate_root_polydata, generate_root_task, \
+    get_process_pool, reset_process_pool, get_thread_pool, get_stage_cache, get_xml_options
+
+
+# lod 参数的最大值，每一级边界线的点数减半
+MAX_LOD = 4
+# progressive 模式下先返回的预览网格使用的平滑预设和细节级别
+PROGRESSIVE_PREVIEW = ('preview', 2)
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+# 流式响应每块的默认字节数，取 3 的倍数使每块 XML 可以单独做 Base64 编码
+STREAM_CHUNK_SIZE = 3 * 2 ** 14
+# JSON 响应体中 Base64 编码的 XML 前后的部分，Base64 字符在 JSON 字符串中不需要转义
+ROOT_JSON_PREFIX = json.dumps({'message': '成功接收数据', 'polydata': ''})[:-2].encode()
+ROOT_JSON_SUFFIX = b'"}'
+# 请求体不超过该字节数时上传的网格整体保存在内存中，不写临时文件
+UPLOAD_MAX_MEMORY_SIZE = 64 * 2 ** 20
+
+
+class MeshUploadHandler(MemoryFileUploadHandler):
+    '''
+    网格上传使用的内存上传处理器。
+
+    Django 默认只把不超过 FILE_UPLOAD_MAX_MEMORY_SIZE（2.5 MB）的上传保存在内存中，
+    5 万个三角形以上的 ascii 牙冠都会先写到临时文件。这里改用 settings.ROOT_UPLOAD_MAX_MEMORY_SIZE
+    （默认 64 MiB）作为上限，其余接口仍使用 Django 的默认设置。
+    代价是每个并发请求最多在内存中持有这么多字节，worker 的内存应按 并发数 × 上限 预留；
+    超过上限的请求仍由 TemporaryFileUploadHandler 写入临时文件。
+    '''
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.activated = content_length is not None and \
+            content_length <= getattr(settings, 'ROOT_UPLOAD_MAX_MEMORY_SIZE', UPLOAD_MAX_MEMORY_SIZE)
+
+
+def use_memory_uploads(request):
+    '''
+    让请求中的网格上传使用 MeshUploadHandler，必须在第一次访问 request.POST 或 request.FILES 之前调用。
+
+    :param request: HttpRequest 对象
+    :return: 无返回值
+    '''
+    request.upload_handlers = [MeshUploadHandler(request), TemporaryFileUploadHandler(request)]
+
+
+def read_upload(uploaded_file):
+    '''
+    读取上传的文件，压缩数据解压后的大小不超过 settings.ROOT_UPLOAD_MAX_DECOMPRESSED_BYTES（默认 256 MiB）。
+
+    :param uploaded_file: Django 的 UploadedFile 对象
+    :return: 文件内容的 memoryview，见 read_uploaded_file
+    :raises ValueError: 压缩数据损坏或解压后超过上限，接口返回 400
+    '''
+    return read_uploaded_file(uploaded_file, getattr(settings, 'ROOT_UPLOAD_MAX_DECOMPRESSED_BYTES',
+                                                     DECOMPRESSED_MAX_BYTES))
+
+
+def accepts_binary_mesh(request):
+    '''
+    判断前端是否通过 Accept 头请求二进制网格格式。
+
+    :param request: HttpRequest 对象
+    :return: bool，请求二进制格式时为 True
+    '''
+    return MESH_CONTENT_TYPE in request.headers.get('Accept', '')
+
+
+def get_request_option(request, name, default=None):
+    '''
+    读取请求参数，multipart 表单字段优先，其次是 URL 查询参数。
+
+    :param request: HttpRequest 对象
+    :param name: 参数名
+    :param default: 参数不存在时的默认值
+    :return: str，参数值
+    '''
+    return request.POST.get(name, request.GET.get(name, default))
+
+
+def get_quality(request):
+    '''
+    读取平滑质量预设（quality 参数），可选值见 SMOOTH_PRESETS。
+
+    :param request: HttpRequest 对象
+    :return: str，预设名称，不支持的名称返回 None
+    '''
+    quality = get_request_option(request, 'quality', DEFAULT_SMOOTH_PRESET)
+    return quality if quality in SMOOTH_PRESETS else None
+
+
+def get_level_of_detail(request):
+    '''
+    读取输出网格的细节级别（lod 参数，0 到 MAX_LOD）和三角形数上限（maxTriangles 参数）。
+
+    :param request: HttpRequest 对象
+    :return: (int lod, int 或 None max_triangles)，参数不合法时返回 None
+    '''
+    try:
+        lod = int(get_request_option(request, 'lod', 0))
+        max_triangles = get_request_option(request, 'maxTriangles')
+        max_triangles = int(max_triangles) if max_triangles is not None else None
+    except ValueError:
+        return None
+    if not 0 <= lod <= MAX_LOD or (max_triangles is not None and max_triangles <= 0):
+        return None
+    return lod, max_triangles
+
+
+def encode_root_result(polydata, binary):
+    '''
+    将牙根网格序列化为结果缓存中保存的形式。
+
+    binary 为 True 时返回紧凑的二进制网格，否则返回 Base64 编码的 XML，
+    generate_root 的 JSON 响应、generate_root_batch 和 generate_root_arch 的结果共用这一形式。
+
+    :param polydata: vtkPolyData对象，生成的牙根网格
+    :param binary: bool，是否使用二进制格式
+    :return: bytes
+    '''
+    if binary:
+        return polydata_to_bytes(polydata)
+    return polydata_to_string(polydata, **get_xml_options()).encode()
+
+
+def root_body(payload, binary):
+    '''
+    由 encode_root_result 的结果构造 generate_root 的响应体。
+
+    binary 为 False 时返回与旧版前端兼容的 JSON，即 {"message": ..., "polydata": Base64 编码的 XML}。
+
+    :param payload: bytes，encode_root_result 的结果
+    :param binary: bool，是否为二进制格式
+    :return: bytes，响应体
+    '''
+    if binary:
+        return payload
+    return ROOT_JSON_PREFIX + payload + ROOT_JSON_SUFFIX
+
+
+def result_cache_key(mesh_key, json_part, binary, quality, lod=0, max_triangles=None):
+    '''
+    计算牙根结果在结果缓存中的键，所有接口使用同一种键。
+
+    键由网格内容摘要、牙根参数和输出形式组成；XML 形式的结果还包含 XML 的压缩参数，
+    修改 ROOT_XML_COMPRESSOR 或 ROOT_XML_COMPRESSION_LEVEL 后不会返回按旧参数编码的结果。
+
+    :param mesh_key: str，牙冠网格的内容摘要（网格句柄）
+    :param json_part: dict，牙根参数
+    :param binary: bool，是否为二进制格式
+    :param quality: 平滑质量预设的名称
+    :param lod: 输出网格的细节级别
+    :param max_triangles: 可选的输出三角形数上限
+    :return: str，缓存键
+    '''
+    variant = f"{'binary' if binary else 'xml'}:{quality}:{lod}:{max_triangles}"
+    return make_cache_key(mesh_key, json_part, variant, None if binary else get_xml_options())
+
+
+def get_stream_chunk_size():
+    '''
+    流式响应每块的字节数，settings.ROOT_STREAM_CHUNK_SIZE 可以修改，向下取整为 3 的倍数。
+
+    :return: int
+    '''
+    chunk_size = getattr(settings, 'ROOT_STREAM_CHUNK_SIZE', STREAM_CHUNK_SIZE)
+    return max(3, chunk_size - chunk_size % 3)
+
+
+def encode_root_chunks(polydata, binary, chunk_size, timer=None):
+    '''
+    将牙根网格逐块序列化，拼接后与 compute_root_body 的响应体相同。
+
+    每块只编码一段数据，除网格本身外占用的内存与输出大小无关。
+    JSON 格式中 XML 按 chunk_size 字节的块依次做 Base64 编码，chunk_size 必须是 3 的倍数。
+
+    :param polydata: vtkPolyData对象，生成的牙根网格
+    :param binary: bool，是否使用二进制格式
+    :param chunk_size: int，每块的字节数
+    :param timer: 可选的 StageTimer，各块的序列化耗时累加记为 serialize 阶段
+    :return: bytes 的生成器
+    '''
+    if binary:
+        chunks = iter_polydata_bytes(polydata, chunk_size)
+    else:
+        chunks = (base64.b64encode(chunk) for chunk in iter_polydata_xml(polydata, chunk_size, **get_xml_options()))
+    if timer is None:
+        timer = StageTimer()
+
+    if not binary:
+        yield ROOT_JSON_PREFIX
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        timer.add('serialize', time.perf_counter() - start)
+        if chunk is None:
+            break
+        yield chunk
+    if not binary:
+        yield ROOT_JSON_SUFFIX
+
+
+def iter_body_chunks(payload, binary, chunk_size):
+    '''
+    按块输出缓存中的结果（缓存命中时使用），拼接后与 root_body 的结果相同，不拷贝数据。
+
+    :param payload: bytes，encode_root_result 的结果
+    :param binary: bool，是否为二进制格式
+    :param chunk_size: int，每块的字节数
+    :return: bytes 或 memoryview 的生成器
+    '''
+    if not binary:
+        yield ROOT_JSON_PREFIX
+    view = memoryview(payload)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+    if not binary:
+        yield ROOT_JSON_SUFFIX
+
+
+def root_response(body, binary, timer=None, validate=False):
+    '''
+    使用序列化后的响应体构造 HttpResponse。
+
+    :param body: bytes，root_body 生成的响应体
+    :param binary: bool，是否为二进制格式
+    :param timer: 可选的 StageTimer，各阶段耗时通过 Server-Timing 响应头返回
+    :param validate: 为 True 时检查牙根网格是否为方向一致的流形，结果以 JSON 写入 X-Mesh-Validation 响应头
+    :return: HttpResponse 对象
+    '''
+    content_type = MESH_CONTENT_TYPE if binary else 'application/json'
+    response = HttpResponse(body, content_type=content_type)
+    if validate:
+        # 从响应体解码网格，缓存命中时同样可以检查
+        if binary:
+            polydata = bytes_to_polydata(body)
+        else:
+            polydata = parse_polydata(base64.b64decode(json.loads(body)['polydata']))
+        response['X-Mesh-Validation'] = json.dumps(validate_manifold(polydata))
+    if timer is not None:
+        response['Server-Timing'] = timer.server_timing()
+    return response
+
+
+def lookup_or_generate_root(polydata_file, json_part, quality, binary, timer, mesh_handle=None, lod=0,
+                            max_triangles=None):
+    '''
+    查询结果缓存，未命中时生成牙根网格，但不序列化。
+
+    参数与 compute_root_body 相同。
+
+    :return: (缓存键, 缓存的 encode_root_result 结果或 None, 生成的 vtkPolyData 或 None)，两者恰有一个不为 None
+    '''
+    cache = get_result_cache()
+    uploaded = read_upload(polydata_file) if mesh_handle is None else contextlib.nullcontext()
+    with uploaded as polydata_buffer:
+        # 相同的牙冠和牙根参数直接返回缓存的结果；网格摘要同时用作阶段缓存的键，句柄本身就是网格内容的摘要
+        with timer.stage('cache'):
+            mesh_key = mesh_handle if mesh_handle is not None else make_mesh_handle(polydata_buffer)
+            cache_key = result_cache_key(mesh_key, json_part, binary, quality, lod, max_triangles)
+            payload = cache.get(cache_key)
+        if payload is not None:
+            return cache_key, payload, None
+
+        def load_polydata():
+            with timer.stage('parse'):
+                if mesh_handle is not None:
+                    return load_stored_mesh(mesh_handle)
+                return parse_polydata(polydata_buffer)
+
+        # 只移动球心的请求命中阶段缓存，不再解析牙冠
+        result = generate_root_polydata(load_polydata, json_part, quality=quality, timer=timer,
+                                        mesh_key=mesh_key, lod=lod, max_triangles=max_triangles)
+    return cache_key, None, result
+
+
+def compute_root_body(polydata_file, json_part, quality, binary, timer=None, mesh_handle=None, lod=0,
+                      max_triangles=None):
+    '''
+    生成单颗牙齿的牙根并序列化为响应体，相同的输入直接返回缓存的结果。
+
+    该函数是阻塞的 CPU 计算，异步视图会把它放到线程池中执行。
+
+    :param polydata_file: 上传的牙冠文件，使用 mesh_handle 时为 None
+    :param json_part: dict，牙根参数
+    :param quality: 平滑质量预设的名称
+    :param binary: bool，是否使用二进制格式
+    :param timer: 可选的 StageTimer，记录解析、缓存查询、生成和序列化各阶段的耗时
+    :param mesh_handle: 可选的网格句柄，指定时使用 upload_mesh 保存的网格，不再解析上传文件
+    :param lod: 输出网格的细节级别，见 get_level_of_detail
+    :param max_triangles: 可选的输出三角形数上限
+    :return: bytes，响应体
+    '''
+    if timer is None:
+        timer = StageTimer()
+    cache_key, payload, result = lookup_or_generate_root(polydata_file, json_part, quality, binary, timer,
+                                                         mesh_handle, lod, max_triangles)
+    if payload is None:
+        with timer.stage('serialize'):
+            payload = encode_root_result(result, binary)
+        get_result_cache().set(cache_key, payload)
+    return root_body(payload, binary)
+
+
+def compute_root_chunks(polydata_file, json_part, quality, binary, timer=None, mesh_handle=None, lod=0,
+                        max_triangles=None):
+    '''
+    compute_root_body 的流式版本：牙根在调用时立即生成，序列化推迟到逐块读取响应体时进行。
+
+    流式输出的结果不写入结果缓存，完整的响应体不会同时出现在内存中；阶段缓存照常使用。
+    参数与 compute_root_body 相同。
+
+    :return: bytes 的迭代器
+    '''
+    if timer is None:
+        timer = StageTimer()
+    chunk_size = get_stream_chunk_size()
+    _, payload, result = lookup_or_generate_root(polydata_file, json_part, quality, binary, timer,
+                                                 mesh_handle, lod, max_triangles)
+    if payload is not None:
+        return iter_body_chunks(payload, binary, chunk_size)
+    return encode_root_chunks(result, binary, chunk_size, timer)
+
+
+def get_mesh_source(request, files):
+    '''
+    确定牙冠网格的来源：meshHandle 参数指定的已上传网格，或本次请求上传的 polyData 文件。
+
+    :param request: HttpRequest 对象
+    :param files: 请求中上传的文件
+    :return: (上传的牙冠文件或 None, 网格句柄或 None, 错误响应或 None)
+    '''
+    mesh_handle = get_request_option(request, 'meshHandle')
+    if mesh_handle is None:
+        return files['polyData'], None, None
+    if not get_mesh_store().exists(mesh_handle):
+        return None, None, JsonResponse({'message': '网格不存在，请重新上传'}, status=404)
+    return None, mesh_handle, None
+
+
+def load_stored_mesh(mesh_handle):
+    '''
+    打开 meshHandle 指定的已上传网格。
+
+    :param mesh_handle: str，网格句柄
+    :return: vtkPolyData对象
+    :raises ValueError: 网格在 get_mesh_source 检查之后被淘汰
+    '''
+    polydata = get_mesh_store().get(mesh_handle)
+    if polydata is None:
+        raise ValueError('网格不存在，请重新上传')
+    return polydata
 
-import vtkmodules.all as vtk
+
+def progressive_steps(quality, lod):
+    '''
+    progressive 模式下依次生成的 (平滑预设, 细节级别)：先是 PROGRESSIVE_PREVIEW 的预览，再是请求的牙根。
+
+    :return: list，请求本身已经不比预览精细时只有一项
+    '''
+    preview_quality, preview_lod = PROGRESSIVE_PREVIEW
+    steps = [(preview_quality, max(lod, preview_lod)), (quality, lod)]
+    return steps[1:] if steps[0] == steps[1] else steps
+
+
+def streaming_root_response(chunks, content_type, endpoint, timer):
+    '''
+    逐块发送响应体，发送结束（或客户端断开）时记录请求指标。
+
+    Server-Timing 响应头只包含发送响应头之前的阶段，流式序列化的耗时记录在指标中。
+
+    :param chunks: bytes 的迭代器或异步迭代器
+    :param content_type: 响应的 Content-Type
+    :param endpoint: str，指标中的接口名称
+    :param timer: StageTimer对象
+    :return: StreamingHttpResponse 对象
+    '''
+    if hasattr(chunks, '__aiter__'):
+        async def stream():
+            status = 500
+            try:
+                async for chunk in chunks:
+                    yield chunk
+                status = 200
+            finally:
+                METRICS.observe(endpoint, status, timer)
+    else:
+        def stream():
+            status = 500
+            try:
+                yield from chunks
+                status = 200
+            finally:
+                METRICS.observe(endpoint, status, timer)
+
+    response = StreamingHttpResponse(stream(), content_type=content_type)
+    response['Server-Timing'] = timer.server_timing()
+    return response
+
+
+async def iterate_in_executor(chunks, executor):
+    '''
+    在线程池中逐块读取同步迭代器，转换为异步迭代器。
+
+    ASGI 下 StreamingHttpResponse 会先把同步迭代器整体读入列表再发送，流式序列化就失去了意义。
+
+    :param chunks: bytes 的迭代器
+    :param executor: 执行读取的线程池
+    :return: 异步生成器
+    '''
+    loop = asyncio.get_running_loop()
+    chunks = iter(chunks)
+    while True:
+        chunk = await loop.run_in_executor(executor, next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def progressive_root_response(preview_chunks, compute_final, binary, timer):
+    '''
+    先返回低分辨率的预览牙根，再返回请求的牙根，前端可以先渲染预览网格。
+
+    JSON 格式的每个网格占一行（application/x-ndjson）；二进制格式的网格依次拼接，
+    各自的文件头中记录了点数和三角形数。
+
+    :param preview_chunks: 预览牙根的响应体，bytes 的可迭代对象
+    :param compute_final: 无参数的函数，返回请求的牙根的响应体，bytes 的可迭代对象
+    :param binary: bool，是否为二进制格式
+    :param timer: StageTimer对象，两次生成的阶段耗时累加记录
+    :return: StreamingHttpResponse 对象
+    '''
+    def frames():
+        for compute in (lambda: preview_chunks, compute_final):
+            yield from compute()
+            if not binary:
+                yield b'\n'
+
+    content_type = MESH_CONTENT_TYPE if binary else NDJSON_CONTENT_TYPE
+    return streaming_root_response(frames(), content_type, 'generate_root', timer)
 
 
 @csrf_exempt
 def generate_root(request):
     if request.method == 'POST':
+        use_memory_uploads(request)
+        timer = StageTimer()
+        binary = accepts_binary_mesh(request)
+        quality = get_quality(request)
+        if quality is None:
+            METRICS.observe('generate_root', 400, timer)
+            return JsonResponse({'message': '不支持的 quality 参数'}, status=400)
+        detail = get_level_of_detail(request)
+        if detail is None:
+            METRICS.observe('generate_root', 400, timer)
+            return JsonResponse({'message': f'lod 应为 0 到 {MAX_LOD} 的整数，maxTriangles 应为正整数'}, status=400)
         # 前端会将牙齿的polydata和牙根的各个坐标数据封装成一个二进制数据，分别解析
-        polydata_as_string = request.FILES['polyData'].read().decode('utf-8')
-        polydata = parse_polydata(polydata_as_string)
+        # polyData 可以是 VTK XML、二进制 STL 或二进制 PLY，按内容自动识别
+        # 已经通过 upload_mesh 上传过的牙冠可以只传 meshHandle
+        polydata_file, mesh_handle, error_response = get_mesh_source(request, request.FILES)
+        if error_response is not None:
+            METRICS.observe('generate_root', error_response.status_code, timer)
+            return error_response
         json_part = json.loads(request.FILES['jsonPart'].read().decode('utf-8'))
-        root_cone = RootCone(json_part)
-        # 在牙齿上方构造一个圆，作为牙根的根部，该圆的分辨率需要与牙齿的边界对应，便于后续构造封闭图形
-        # root_cone.create_circle(resolution=extract_edge(polydata).GetNumberOfPoints())
-        # print_point_coordinates(polydata)
-        # 平滑
-        smoothed_polydata = smooth_polydata(polydata)
-        smoothed_polydata = clean_single_point_faces(smoothed_polydata)
-        # 提取牙齿边界
-        boundary_line = vtk.vtkPolyData()
-        boundary_line.DeepCopy(extract_edge(smoothed_polydata))
-        smoothed_line = vtk.vtkPolyData()
-        smoothed_line.DeepCopy(smooth_line(boundary_line))
-        root_cone.create_circle(
-            resolution=smoothed_line.GetNumberOfPoints())
-        # 平移量，沿牙根方向
-        translate = copy.deepcopy(root_cone.up_normal)
-        vtk.vtkMath.MultiplyScalar(translate, -1)
-        # 将边界线向牙根方向平移一段距离
-        translate_edge = translate_polydata(smoothed_line, translate)
-        closed_surface = create_closed_surface(smoothed_line, translate_edge)
-
-        clip_line = root_cone.circle
-        modified_circle = create_new_line(translate_edge, clip_line)
-        closed_surface2 = create_closed_surface(modified_circle, translate_edge)
-        # 将牙齿、平移后的边界线、上方圆合并为一个polydata
-        append_result = append_data([closed_surface, closed_surface2, root_cone.circle])
-        # smoothed_result = smooth_polydata(append_result.GetOutput())
-        # 清洗
-        # clean_result = clean_data(append_result)
-        # 三角剖分算法，将一组三维点转换成一个三角网格
-        # delaunay = vtk.vtkDelaunay3D()
-        # delaunay.SetInputConnection(clean_result.GetOutputPort())
-        # 将输入的数据集（如三维模型或数据）转换为一个几何对象
-        # surface_filter = vtk.vtkGeometryFilter()
-        # surface_filter.SetInputConnection(delaunay.GetOutputPort())
-        # surface_filter.Update()
-        # vessel_polydata = surface_filter.GetOutput()
-        # display_polydata([root_cone.circle], [])
-
-        # append_filter = vtkAppendPolyData()
-        # origin_up_normal = root_cone.origin_up_normal
-        # for i in range(3):
-        #     plane_point = [0.0, 0.0, 0.0]
-        #     plane_point[0] = root_cone.top_sphere_center[0] - i * 0.5 * origin_up_normal[0]
-        #     plane_point[1] = root_cone.top_sphere_center[1] - i * 0.5 * origin_up_normal[1]
-        #     plane_point[2] = root_cone.top_sphere_center[2] - i * 0.5 * origin_up_normal[2]
-        #     plane = vtkPlane()
-        #     plane.SetOrigin(plane_point)
-        #     plane.SetNormal(root_cone.up_normal)
-        #     clip_filter = vtkCutter()
-        #     clip_filter.SetInputData(vessel_polydata)
-        #     clip_filter.SetCutFunction(plane)
-        #     clip_filter.GenerateCutScalarsOn()
-        #     clip_filter.Update()
-        #     append_filter.AddInputData(clip_filter.GetOutput())
-        #     append_filter.Update()
-        #
-        # append_filter.AddInputData(extract_edge(smoothed_polydata))
-        # clean_filter = clean_data(append_filter)
-        # delaunay2 = vtkDelaunay3D()
-        # delaunay2.SetInputConnection(clean_filter.GetOutputPort())
-        # surface_filter2 = vtkGeometryFilter()
-        # surface_filter2.SetInputConnection(delaunay2.GetOutputPort())
-        # surface_filter2.Update()
-        # vessel_polydata2 = surface_filter2.GetOutput()
-
-        # select_filter = select_polydata(vessel_polydata, smoothed_line)
-        # display_polydata([], [select_filter.GetOutputPort()])
+        lod, max_triangles = detail
+        steps = [(quality, lod)]
+        if get_request_option(request, 'progressive') == '1':
+            steps = progressive_steps(quality, lod)
+        # stream=1 时边序列化边发送，单个请求占用的内存不随输出网格的大小增长
+        stream = get_request_option(request, 'stream') == '1'
+
+        def compute_step(step):
+            step_quality, step_lod = step
+            if stream:
+                return compute_root_chunks(polydata_file, json_part, step_quality, binary, timer, mesh_handle,
+                                           step_lod, max_triangles)
+            return (compute_root_body(polydata_file, json_part, step_quality, binary, timer, mesh_handle,
+                                      step_lod, max_triangles),)
+
+        try:
+            # progressive 模式下先同步生成预览，输入错误仍然可以返回 400
+            chunks = compute_step(steps[0])
+        except ValueError as e:
+            # 压缩数据损坏、牙冠网格没有开放边界等输入错误
+            METRICS.observe('generate_root', 400, timer)
+            return JsonResponse({'message': str(e)}, status=400)
+        except Exception:
+            METRICS.observe('generate_root', 500, timer)
+            raise
+        if len(steps) > 1:
+            return progressive_root_response(chunks, lambda: compute_step(steps[1]), binary, timer)
+        if stream:
+            content_type = MESH_CONTENT_TYPE if binary else 'application/json'
+            return streaming_root_response(chunks, content_type, 'generate_root', timer)
         #发送给前端
-        polydata_string = polydata_to_string(append_result.GetOutput())
-        # polydata_string = polydata_to_string(select_filter.GetOutput())
-        return JsonResponse({'message': '成功接收数据', 'polydata': polydata_string})
+        response = root_response(chunks[0], binary, timer, get_request_option(request, 'validate') == '1')
+        METRICS.observe('generate_root', response.status_code, timer)
+        return response
 
     else:
         return JsonResponse({'message': '请求方法不正确'}, status=400)
+
+
+async def generate_root_async(request):
+    '''
+    generate_root 的异步版本，需要通过 ASGI 服务器（teethsite_backend.asgi）运行。
+
+    multipart 解析和 VTK 计算都放到有界的线程池中执行，事件循环不会被阻塞；
+    VTK 过滤器执行时会释放 GIL，因此同一个进程可以同时处理多个请求。
+    '''
+    if request.method != 'POST':
+        return JsonResponse({'message': '请求方法不正确'}, status=400)
+
+    timer = StageTimer()
+    loop = asyncio.get_running_loop()
+    executor = get_thread_pool()
+    use_memory_uploads(request)
+    # 首次访问 request.FILES 时才会解析 multipart 请求体
+    files = await loop.run_in_executor(executor, lambda: request.FILES)
+    binary = accepts_binary_mesh(request)
+    quality = get_quality(request)
+    if quality is None:
+        METRICS.observe('generate_root_async', 400, timer)
+        return JsonResponse({'message': '不支持的 quality 参数'}, status=400)
+    detail = get_level_of_detail(request)
+    if detail is None:
+        METRICS.observe('generate_root_async', 400, timer)
+        return JsonResponse({'message': f'lod 应为 0 到 {MAX_LOD} 的整数，maxTriangles 应为正整数'}, status=400)
+    polydata_file, mesh_handle, error_response = get_mesh_source(request, files)
+    if error_response is not None:
+        METRICS.observe('generate_root_async', error_response.status_code, timer)
+        return error_response
+    json_part = json.loads(files['jsonPart'].read().decode('utf-8'))
+    stream = get_request_option(request, 'stream') == '1'
+    compute = compute_root_chunks if stream else compute_root_body
+    try:
+        body = await loop.run_in_executor(executor, compute, polydata_file, json_part, quality,
+                                          binary, timer, mesh_handle, *detail)
+    except ValueError as e:
+        # 压缩数据损坏、牙冠网格没有开放边界等输入错误
+        METRICS.observe('generate_root_async', 400, timer)
+        return JsonResponse({'message': str(e)}, status=400)
+    except Exception:
+        METRICS.observe('generate_root_async', 500, timer)
+        raise
+    if stream:
+        content_type = MESH_CONTENT_TYPE if binary else 'application/json'
+        return streaming_root_response(iterate_in_executor(body, executor), content_type,
+                                       'generate_root_async', timer)
+    response = root_response(body, binary, timer, get_request_option(request, 'validate') == '1')
+    METRICS.observe('generate_root_async', response.status_code, timer)
+    return response
+
+
+# Django 4.2 的 csrf_exempt 不支持协程函数，直接设置标记
+generate_root_async.csrf_exempt = True
+
+
+@csrf_exempt
+def generate_root_batch(request):
+    '''
+    批量生成一整副牙列的牙根。
+
+    请求中按顺序成对上传多个 polyData 和 jsonPart 文件，每颗牙齿的计算在进程池中并行执行。
+    结果以 toothName 为键返回，单颗牙齿失败时只在该牙齿下返回 error，不影响其他牙齿。
+    '''
+    if request.method != 'POST':
+        return JsonResponse({'message': '请求方法不正确'}, status=400)
+
+    use_memory_uploads(request)
+    polydata_files = request.FILES.getlist('polyData')
+    json_files = request.FILES.getlist('jsonPart')
+    if not polydata_files or len(polydata_files) != len(json_files):
+        return JsonResponse({'message': 'polyData 与 jsonPart 的数量不一致'}, status=400)
+    quality = get_quality(request)
+    if quality is None:
+        return JsonResponse({'message': '不支持的 quality 参数'}, status=400)
+
+    timer = StageTimer()
+    pool = get_process_pool()
+    cache = get_result_cache()
+    results = {}
+    futures = {}
+    cache_keys = {}
+    for index, (polydata_file, json_file) in enumerate(zip(polydata_files, json_files)):
+        try:
+            json_part = json.loads(json_file.read().decode('utf-8'))
+            tooth_name = json_part['toothName']
+        except (ValueError, KeyError) as e:
+            results[str(index)] = {'error': f'jsonPart 解析失败: {e!r}'}
+            continue
+        try:
+            polydata_upload = read_upload(polydata_file)
+        except ValueError as e:
+            results[tooth_name] = {'error': f'polyData 解压失败: {e!r}'}
+            continue
+        with polydata_upload as polydata_buffer:
+            cache_key = result_cache_key(make_mesh_handle(polydata_buffer), json_part, False, quality)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                results[tooth_name] = {'polydata': cached.decode()}
+                continue
+            cache_keys[tooth_name] = cache_key
+            futures[tooth_name] = pool.submit(generate_root_task, bytes(polydata_buffer), json_part,
+                                              quality=quality, xml_options=get_xml_options())
+
+    for tooth_name, future in futures.items():
+        try:
+            polydata_string = future.result()
+            cache.set(cache_keys[tooth_name], polydata_string.encode())
+            results[tooth_name] = {'polydata': polydata_string}
+        except BrokenProcessPool as e:
+            # 子进程异常退出后进程池不可再用，下次请求重新创建
+            reset_process_pool()
+            results[tooth_name] = {'error': f'{e!r}'}
+        except Exception as e:
+            results[tooth_name] = {'error': f'{e!r}'}
+
+    response = JsonResponse({'message': '成功接收数据', 'results': results})
+    METRICS.observe('generate_root_batch', response.status_code, timer)
+    return response
+
+
+def parse_arch_teeth(json_part):
+    '''
+    检查全牙列请求中的牙根参数列表，每项除 RootCone 的参数外还需要 label。
+
+    :param json_part: 解析后的 jsonPart
+    :return: dict，toothName → 牙根参数
+    :raises ValueError: 格式不正确
+    '''
+    if not isinstance(json_part, list) or not json_part:
+        raise ValueError('jsonPart 应为牙根参数的列表')
+    teeth = {}
+    for params in json_part:
+        if not isinstance(params, dict) or 'toothName' not in params or not isinstance(params.get('label'), int):
+            raise ValueError('每组牙根参数都需要 toothName 和整数 label')
+        teeth[params['toothName']] = params
+    return teeth
+
+
+def generate_arch_roots(crowns, teeth, quality, arch_key, timer):
+    '''
+    在线程池中为切分出的每颗牙冠生成牙根并序列化，VTK 过滤器执行时释放 GIL，各牙齿并行计算。
+
+    :param crowns: dict，标签 → 牙冠的 vtkPolyData
+    :param teeth: dict，toothName → 牙根参数
+    :param quality: 平滑质量预设的名称
+    :param arch_key: str，全牙列网格和标签的摘要，加上标签后用作各牙冠的阶段缓存键
+    :param timer: StageTimer对象，各牙齿的阶段耗时累加记录
+    :return: dict，toothName → Base64 编码的 XML 字符串或异常
+    '''
+    def generate(params, tooth_timer):
+        result = generate_root_polydata(crowns[params['label']], params, quality=quality, timer=tooth_timer,
+                                        mesh_key=f"{arch_key}:{params['label']}")
+        with tooth_timer.stage('serialize'):
+            return polydata_to_string(result, **get_xml_options())
+
+    executor = get_thread_pool()
+    futures = {}
+    tooth_timers = []
+    results = {}
+    for tooth_name, params in teeth.items():
+        if params['label'] not in crowns:
+            results[tooth_name] = ValueError(f"网格中没有标签为 {params['label']} 的面片")
+            continue
+        # StageTimer 不是线程安全的，每颗牙齿单独计时，完成后再累加
+        tooth_timer = StageTimer()
+        tooth_timers.append(tooth_timer)
+        futures[tooth_name] = executor.submit(generate, params, tooth_timer)
+
+    for tooth_name, future in futures.items():
+        try:
+            results[tooth_name] = future.result()
+        except Exception as e:
+            results[tooth_name] = e
+    for tooth_timer in tooth_timers:
+        for name, seconds in tooth_timer.stages.items():
+            timer.add(name, seconds)
+    return results
+
+
+@csrf_exempt
+def generate_root_arch(request):
+    '''
+    一次生成整副牙列的牙根：上传一个带牙位标签的全牙列网格，不必在前端逐颗切出牙冠。
+
+    - polyData（或 meshHandle）：全牙列网格
+    - labels：可选，逐点或逐面片的小端 int32 标签；未上传时读取网格自带的 labelArray 数组（默认 Label），
+      使用 meshHandle 时读取上传网格时一起保存的标签数组
+    - labelType：可选，point 或 cell，未指定时按标签数与点数、面片数是否一致判断；
+      读取网格自带的标签数组时只在对应的点数据或单元数据中查找，与数组不一致时返回 400
+    - jsonPart：牙根参数的列表，每项包含 toothName、label 和 RootCone 的球心坐标
+
+    结果与 generate_root_batch 相同，以 toothName 为键返回，单颗牙齿失败时只在该牙齿下返回 error。
+    '''
+    if request.method != 'POST':
+        return JsonResponse({'message': '请求方法不正确'}, status=400)
+
+    use_memory_uploads(request)
+    timer = StageTimer()
+    quality = get_quality(request)
+    label_type = get_request_option(request, 'labelType')
+    label_array = get_request_option(request, 'labelArray', LABEL_ARRAY)
+    if quality is None or label_type not in (None,) + LABEL_TYPES:
+        METRICS.observe('generate_root_arch', 400, timer)
+        return JsonResponse({'message': '不支持的 quality 或 labelType 参数'}, status=400)
+    polydata_file, mesh_handle, error_response = get_mesh_source(request, request.FILES)
+    if error_response is not None:
+        METRICS.observe('generate_root_arch', error_response.status_code, timer)
+        return error_response
+
+    cache = get_result_cache()
+    try:
+        teeth = parse_arch_teeth(json.loads(request.FILES['jsonPart'].read().decode('utf-8')))
+        uploaded = read_upload(polydata_file) if mesh_handle is None else contextlib.nullcontext()
+        labels_file = request.FILES.get('labels')
+        labels_upload = read_upload(labels_file) if labels_file is not None else contextlib.nullcontext()
+        with uploaded as polydata_buffer, labels_upload as labels_buffer:
+            with timer.stage('cache'):
+                mesh_key = mesh_handle if mesh_handle is not None else make_mesh_handle(polydata_buffer)
+                # 标签来自网格时，不同的标签数组切分出不同的牙冠，数组名称也是键的一部分
+                labels_key = make_mesh_handle(labels_buffer) if labels_buffer is not None else f'array={label_array}'
+                arch_key = make_mesh_handle(f'{mesh_key}:{labels_key}:{label_type}'.encode())
+                cache_keys = {tooth_name: result_cache_key(arch_key, params, False, quality)
+                              for tooth_name, params in teeth.items()}
+                results = {}
+                for tooth_name, cache_key in cache_keys.items():
+                    cached = cache.get(cache_key)
+                    if cached is not None:
+                        results[tooth_name] = {'polydata': cached.decode()}
+            missing = {tooth_name: params for tooth_name, params in teeth.items() if tooth_name not in results}
+
+            if missing:
+                with timer.stage('parse'):
+                    if mesh_handle is not None:
+                        arch = load_stored_mesh(mesh_handle)
+                    else:
+                        arch = parse_polydata(polydata_buffer)
+                    if labels_buffer is not None:
+                        labels = read_labels(labels_buffer)
+                    else:
+                        found = mesh_labels(arch, label_array, label_type)
+                        if found is None:
+                            raise ValueError('没有上传 labels，网格中也没有牙位标签数组')
+                        labels, label_type = found
+                    label_type = resolve_label_type(arch, labels, label_type)
+                timer.count_mesh('input', arch)
+                with timer.stage('split'):
+                    crowns = split_arch(arch, labels, label_type, [params['label'] for params in missing.values()])
+    except ValueError as e:
+        METRICS.observe('generate_root_arch', 400, timer)
+        return JsonResponse({'message': str(e)}, status=400)
+
+    if missing:
+        generated = generate_arch_roots(crowns, missing, quality, arch_key, timer)
+        for tooth_name, result in generated.items():
+            if isinstance(result, Exception):
+                results[tooth_name] = {'error': f'{result!r}'}
+            else:
+                cache.set(cache_keys[tooth_name], result.encode())
+                results[tooth_name] = {'polydata': result}
+
+    response = JsonResponse({'message': '成功接收数据', 'results': results})
+    response['Server-Timing'] = timer.server_timing()
+    METRICS.observe('generate_root_arch', response.status_code, timer)
+    return response
+
+
+@csrf_exempt
+def upload_mesh(request):
+    '''
+    上传牙冠网格并返回句柄，之后调用 generate_root 时可以用 meshHandle 代替 polyData，
+    调整牙根参数时不必重复上传和解析整个网格。
+
+    句柄是上传数据的 sha256 摘要，相同的网格重复上传时直接返回已有的句柄。
+    支持的格式与 generate_root 的 polyData 相同。
+    '''
+    if request.method != 'POST':
+        return JsonResponse({'message': '请求方法不正确'}, status=400)
+    use_memory_uploads(request)
+    store = get_mesh_store()
+    try:
+        with read_upload(request.FILES['polyData']) as polydata_buffer:
+            handle, created = store.put(polydata_buffer)
+    except ValueError as e:
+        return JsonResponse({'message': str(e)}, status=400)
+    info = store.info(handle)
+    if info is None:
+        # 刚保存的网格被其他 worker 淘汰，存储容量相对于上传的网格过小
+        return JsonResponse({'message': '网格存储空间不足'}, status=507)
+    return JsonResponse(dict(info, message='成功接收数据'), status=201 if created else 200)
+
+
+def mesh_info(request, handle):
+    '''
+    查询网格句柄是否存在，存在时返回网格的点数和三角形数。
+    '''
+    info = get_mesh_store().info(handle)
+    if info is None:
+        return JsonResponse({'message': '网格不存在'}, status=404)
+    return JsonResponse(info)
+
+
+@csrf_exempt
+def submit_root_job(request):
+    '''
+    提交异步牙根生成任务，参数与 generate_root 相同，立即返回任务 id。
+    '''
+    if request.method != 'POST':
+        return JsonResponse({'message': '请求方法不正确'}, status=400)
+    use_memory_uploads(request)
+    quality = get_quality(request)
+    if quality is None:
+        return JsonResponse({'message': '不支持的 quality 参数'}, status=400)
+    json_part = json.loads(request.FILES['jsonPart'].read().decode('utf-8'))
+    try:
+        with read_upload(request.FILES['polyData']) as polydata_buffer:
+            job = submit_job(polydata_buffer, json_part, quality, accepts_binary_mesh(request))
+    except ValueError as e:
+        return JsonResponse({'message': str(e)}, status=400)
+    return JsonResponse({'message': '任务已提交', 'job_id': str(job.pk), 'status': job.status}, status=202)
+
+
+def root_job_status(request, job_id):
+    '''
+    查询异步任务的状态和各阶段进度，任务成功后返回生成的牙根网格。
+
+    提交时请求了二进制格式的任务，成功后直接返回二进制网格。
+    '''
+    # worker 重启后第一次访问任务接口时恢复未完成的任务
+    get_job_executor()
+    try:
+        job = RootJob.objects.get(pk=job_id)
+    except RootJob.DoesNotExist:
+        return JsonResponse({'message': '任务不存在'}, status=404)
+
+    if job.status == RootJob.STATUS_SUCCEEDED and job.binary:
+        return HttpResponse(bytes(job.result), content_type=MESH_CONTENT_TYPE)
+    data = {
+        'job_id': str(job.pk),
+        'toothName': job.tooth_name,
+        'status': job.status,
+        'stage': job.stage,
+        'progress': job.progress,
+    }
+    if job.status == RootJob.STATUS_SUCCEEDED:
+        data['polydata'] = bytes(job.result).decode()
+    elif job.status == RootJob.STATUS_FAILED:
+        data['error'] = job.error
+    return JsonResponse(data)
+
+
+def cache_stats(request):
+    '''
+    返回当前进程中结果缓存和阶段缓存的命中、未命中和淘汰计数。
+    '''
+    return JsonResponse(dict(get_result_cache().stats(), stage_cache=get_stage_cache().stats()))
+
+
+def metrics(request):
+    '''
+    以 Prometheus 文本格式返回当前进程的请求耗时、各阶段耗时、网格规模以及结果缓存和阶段缓存的统计。
+    '''
+    stats = get_result_cache().stats()
+    extra_metrics = [
+        ('teethsite_cache_hits_total', 'counter', '结果缓存内存层命中次数', stats['hits']),
+        ('teethsite_cache_disk_hits_total', 'counter', '结果缓存磁盘层命中次数', stats['disk_hits']),
+        ('teethsite_cache_misses_total', 'counter', '结果缓存未命中次数', stats['misses']),
+        ('teethsite_cache_evictions_total', 'counter', '结果缓存淘汰次数', stats['evictions']),
+        ('teethsite_cache_entries', 'gauge', '结果缓存内存层的条目数', stats['entries']),
+        ('teethsite_cache_bytes', 'gauge', '结果缓存内存层占用的字节数', stats['bytes']),
+        ('teethsite_cache_disk_evictions_total', 'counter', '结果缓存磁盘层淘汰的文件数', stats['disk_evictions']),
+        ('teethsite_cache_disk_bytes', 'gauge', '结果缓存磁盘层占用的字节数', stats['disk_bytes']),
+    ]
+    stage_stats = get_stage_cache().stats()
+    extra_metrics += [
+        ('teethsite_stage_cache_hits_total', 'counter', '阶段缓存命中次数', stage_stats['hits']),
+        ('teethsite_stage_cache_misses_total', 'counter', '阶段缓存未命中次数', stage_stats['misses']),
+        ('teethsite_stage_cache_evictions_total', 'counter', '阶段缓存淘汰次数', stage_stats['evictions']),
+        ('teethsite_stage_cache_bytes', 'gauge', '阶段缓存占用的字节数', stage_stats['bytes']),
+    ]
+    return HttpResponse(METRICS.render(extra_metrics), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+'''
+测量全牙列切分和整副牙列牙根生成的耗时：
+
+- split_arch：所有牙齿一次向量化切分
+- per-tooth：逐颗牙齿用 vtkThreshold 提取标签范围内的面片，再转换为 PolyData，作为对照
+- generate_root_arch：通过 Django 测试客户端调用完整的接口，每次都清空结果缓存和阶段缓存
+
+在项目根目录运行：python -m benchmarks.arch
+'''
+import argparse
+import json
+import timeit
+
+from vtkmodules.vtkCommonDataModel import vtkDataObject
+from vtkmodules.vtkFiltersCore import vtkThreshold
+from vtkmodules.vtkFiltersGeometry import vtkGeometryFilter
+
+from backend.arch import mesh_labels, split_arch
+from benchmarks.crowns import crown_to_xml, make_arch
+from benchmarks.suite import setup_django
+
+
+def split_per_tooth(arch, wanted_labels):
+    '''
+    逐颗牙齿提取牙冠：每颗牙齿对整个网格执行一次阈值过滤和几何提取。
+
+    :return: dict，标签 → vtkPolyData
+    '''
+    crowns = {}
+    for label in wanted_labels:
+        threshold = vtkThreshold()
+        threshold.SetInputData(arch)
+        threshold.SetInputArrayToProcess(0, 0, 0, vtkDataObject.FIELD_ASSOCIATION_POINTS, 'Label')
+        threshold.SetLowerThreshold(label)
+        threshold.SetUpperThreshold(label)
+        threshold.AllScalarsOn()
+        geometry = vtkGeometryFilter()
+        geometry.SetInputConnection(threshold.GetOutputPort())
+        geometry.Update()
+        crowns[label] = geometry.GetOutput()
+    return crowns
+
+
+def measure(num_teeth, triangles_per_tooth, repeat, quality):
+    arch, teeth = make_arch(num_teeth, triangles_per_tooth)
+    labels, label_type = mesh_labels(arch)
+    wanted = [params['label'] for params in teeth]
+    print(f'\narch with {num_teeth} teeth, {arch.GetNumberOfPoints()} points, {arch.GetNumberOfPolys()} triangles')
+
+    vectorized = split_arch(arch, labels, label_type, wanted)
+    per_tooth = split_per_tooth(arch, wanted)
+    assert all(vectorized[label].GetNumberOfPolys() == per_tooth[label].GetNumberOfPolys() for label in wanted)
+    split_ms = min(timeit.repeat(lambda: split_arch(arch, labels, label_type, wanted), number=1, repeat=repeat))
+    per_tooth_ms = min(timeit.repeat(lambda: split_per_tooth(arch, wanted), number=1, repeat=repeat))
+    print(f'{"split_arch":>20} {split_ms * 1000:>10.2f} ms')
+    print(f'{"per-tooth":>20} {per_tooth_ms * 1000:>10.2f} ms')
+
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import Client
+
+    from backend.cache import get_result_cache
+    from backend.pipeline import get_stage_cache
+
+    client = Client(HTTP_HOST='localhost')
+    arch_xml = crown_to_xml(arch, 'appended')
+    json_part = json.dumps(teeth).encode()
+
+    def request():
+        get_result_cache().clear()
+        get_stage_cache().clear()
+        response = client.post(f'/backend/generate_root_arch/?quality={quality}', {
+            'polyData': SimpleUploadedFile('polyData', arch_xml),
+            'jsonPart': SimpleUploadedFile('jsonPart', json_part),
+        })
+        results = response.json()['results']
+        if response.status_code != 200 or any('error' in result for result in results.values()):
+            raise RuntimeError(f'generate_root_arch 返回 {response.status_code}: {response.content[:200]!r}')
+
+    request()
+    request_s = min(timeit.repeat(request, number=1, repeat=repeat))
+    print(f'{"generate_root_arch":>20} {request_s * 1000:>10.2f} ms ({quality})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--teeth', type=int, default=14)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 20000], help='每颗牙冠的目标三角形数')
+    parser.add_argument('--quality', default='final')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    for triangles in args.sizes:
+        measure(args.teeth, triangles, args.repeat, args.quality)
+
+
+if __name__ == '__main__':
+    main()
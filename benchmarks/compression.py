@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+'''
+测量传输压缩在 CPU 耗时和传输体积之间的取舍：
+
+- upload：前端上传的牙冠（ascii 或 appended + zlib 的 VTK XML）再经 gzip/zstd 压缩后的体积、
+  前端压缩耗时、服务端解压（decompress_buffer）和解析（parse_polydata）耗时
+- response：牙根 XML 使用不同的 VTK 内置压缩器和级别时的 JSON 响应体积和编码耗时，
+  以及再经 HTTP gzip/zstd 压缩后的体积和耗时
+
+在项目根目录运行：python -m benchmarks.compression
+'''
+import argparse
+import gzip
+import json
+import timeit
+
+from backend.pipeline import generate_root_polydata
+from backend.utils import decompress_buffer, parse_polydata, polydata_to_string, zstandard
+from benchmarks.crowns import crown_to_xml, make_crown, make_root_params
+
+GZIP_LEVELS = (1, 6, 9)
+ZSTD_LEVELS = (1, 3, 9, 19)
+XML_SETTINGS = (('none', None), ('lz4', 1), ('lz4', 9), ('zlib', 1), ('zlib', 5), ('zlib', 9), ('lzma', 5))
+
+
+def best_time(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def codecs():
+    '''
+    列出参与比较的 HTTP 层压缩方式。
+
+    :return: list，(名称, 压缩函数)
+    '''
+    result = [('identity', None)]
+    result += [(f'gzip-{level}', lambda data, level=level: gzip.compress(data, compresslevel=level, mtime=0))
+               for level in GZIP_LEVELS]
+    if zstandard is not None:
+        result += [(f'zstd-{level}', lambda data, level=level: zstandard.ZstdCompressor(level=level).compress(data))
+                   for level in ZSTD_LEVELS]
+    return result
+
+
+def measure_upload(triangles, repeat):
+    crown = make_crown(triangles)
+    print(f'\nupload: crown with {crown.GetNumberOfPolys()} triangles')
+    print(f"{'xml':>9} {'codec':>9} {'wire bytes':>11} {'ratio':>6} {'compress ms':>12} "
+          f"{'decompress ms':>14} {'parse ms':>9}")
+    for data_mode in ('ascii', 'appended'):
+        xml = crown_to_xml(crown, data_mode)
+        parse_ms = best_time(lambda: parse_polydata(xml), repeat) * 1000
+        for name, compress in codecs():
+            if compress is None:
+                payload, compress_ms, decompress_ms = xml, 0.0, 0.0
+            else:
+                payload = compress(xml)
+                compress_ms = best_time(lambda: compress(xml), repeat) * 1000
+                decompress_ms = best_time(lambda: decompress_buffer(memoryview(payload)), repeat) * 1000
+            print(f'{data_mode:>9} {name:>9} {len(payload):>11} {len(xml) / len(payload):>6.1f} '
+                  f'{compress_ms:>12.2f} {decompress_ms:>14.2f} {parse_ms:>9.2f}')
+
+
+def measure_response(triangles, repeat):
+    crown = make_crown(triangles)
+    result = generate_root_polydata(crown, make_root_params())
+    print(f'\nresponse: root with {result.GetNumberOfPoints()} points, {result.GetNumberOfPolys()} triangles')
+    print(f"{'xml compressor':>15} {'json bytes':>11} {'encode ms':>10} {'codec':>9} {'wire bytes':>11} "
+          f"{'compress ms':>12}")
+    for compressor, level in XML_SETTINGS:
+        options = {'compressor': compressor}
+        if level is not None:
+            options['compression_level'] = level
+
+        def encode():
+            return json.dumps({'message': '成功接收数据', 'polydata': polydata_to_string(result, **options)}).encode()
+
+        body = encode()
+        encode_ms = best_time(encode, repeat) * 1000
+        label = compressor if level is None else f'{compressor}-{level}'
+        for name, compress in codecs():
+            if compress is None:
+                payload, compress_ms = body, 0.0
+            else:
+                payload = compress(body)
+                compress_ms = best_time(lambda: compress(body), repeat) * 1000
+            print(f'{label:>15} {len(body):>11} {encode_ms:>10.2f} {name:>9} {len(payload):>11} {compress_ms:>12.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 50000, 200000], help='牙冠的目标三角形数')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for triangles in args.sizes:
+        measure_upload(triangles, args.repeat)
+    measure_response(args.sizes[0], args.repeat)
+
+
+if __name__ == '__main__':
+    main()
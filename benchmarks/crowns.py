@@ -0,0 +1,250 @@
+'''
+生成用于基准测试的合成牙冠网格以及与之匹配的牙根参数。
+
+牙冠是一个开口朝下的椭球形冠面：顶部带有四个牙尖的起伏，颈缘（开放边界）呈波浪形，
+并叠加少量随机噪声模拟扫描误差。网格规模可以从几千到几十万个三角形，
+生成结果只由目标三角形数和随机种子决定，便于在不同提交之间重复比较。
+'''
+import gzip
+import math
+import os
+import tempfile
+
+import numpy as np
+from vtkmodules.vtkCommonDataModel import vtkPolyData
+from vtkmodules.vtkIOGeometry import vtkSTLWriter
+from vtkmodules.vtkIOPLY import vtkPLYWriter
+from vtkmodules.vtkIOXML import vtkXMLPolyDataWriter
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+
+from backend.utils import GZIP_MAGIC, STL_HEADER_SIZE, ZSTD_MAGIC, decompress_buffer, detect_mesh_format, \
+    numpy_to_cell_array, numpy_to_points, zstandard
+
+# 牙冠的近远中、颊舌向半径和冠面的高度
+CROWN_RADII = (5.0, 4.5)
+CROWN_HEIGHT = 5.0
+# 颈缘所在的极角（度）以及颈缘波浪的幅度
+MARGIN_ANGLE = 100.0
+MARGIN_WAVE = 8.0
+
+
+def crown_grid_shape(target_triangles):
+    '''
+    计算达到目标三角形数所需的环数和每环的点数。
+
+    网格由顶点处的一圈扇形三角形和 rings - 1 圈四边形带组成，三角形数为 (2 * rings - 1) * segments。
+
+    :param target_triangles: int，目标三角形数
+    :return: (rings, segments)
+    '''
+    segments = max(16, int(round(math.sqrt(target_triangles))))
+    rings = max(2, int(round((target_triangles / segments + 1) / 2)))
+    return rings, segments
+
+
+def make_crown(target_triangles, seed=0, noise=0.01):
+    '''
+    生成一个开口的合成牙冠网格。
+
+    :param target_triangles: int，目标三角形数，实际数量与其相差不超过一圈三角形
+    :param seed: int，随机噪声的种子
+    :param noise: float，顶点随机扰动的幅度（毫米）
+    :return: vtkPolyData对象，三角网格，点坐标为 float32
+    '''
+    rings, segments = crown_grid_shape(target_triangles)
+    rng = np.random.default_rng(seed)
+
+    theta = 2 * np.pi * np.arange(segments) / segments
+    # 颈缘的极角随 theta 起伏，形成波浪形的开放边界
+    margin = np.radians(MARGIN_ANGLE + MARGIN_WAVE * np.cos(2 * theta))
+    t = np.arange(1, rings + 1)[:, None] / rings
+    phi = t * margin[None, :]
+
+    # 四个牙尖：冠面顶部沿 theta 方向的起伏，向颈缘逐渐消失
+    cusps = 0.4 * np.cos(4 * theta)[None, :] * np.sin(np.pi * np.minimum(t, 0.5)) ** 2
+    radial = np.sin(phi) * (1 + 0.05 * cusps)
+    x = CROWN_RADII[0] * radial * np.cos(theta)[None, :]
+    y = CROWN_RADII[1] * radial * np.sin(theta)[None, :]
+    z = CROWN_HEIGHT * np.cos(phi) + cusps
+    ring_points = np.stack((x, y, z), axis=-1).reshape(-1, 3)
+    ring_points += rng.normal(scale=noise, size=ring_points.shape)
+    points = np.vstack(([[0.0, 0.0, CROWN_HEIGHT]], ring_points)).astype(np.float32)
+
+    # 顶点处的扇形三角形，以及相邻两环之间每个四边形拆成的两个三角形
+    segment_ids = np.arange(segments)
+    next_ids = np.roll(segment_ids, -1)
+    fan = np.column_stack((np.zeros(segments, dtype=np.int64), segment_ids + 1, next_ids + 1))
+    ring_start = 1 + segments * np.arange(rings - 1)[:, None]
+    a = ring_start + segment_ids
+    b = ring_start + next_ids
+    c = b + segments
+    d = a + segments
+    quads = np.concatenate((np.stack((a, d, c), axis=-1), np.stack((a, c, b), axis=-1)), axis=1)
+    triangles = np.vstack((fan, quads.reshape(-1, 3)))
+
+    crown = vtkPolyData()
+    crown.SetPoints(numpy_to_points(points))
+    crown.SetPolys(numpy_to_cell_array(triangles))
+    return crown
+
+
+def make_root_params(tooth_name='UL1'):
+    '''
+    生成与 make_crown 匹配的牙根参数：牙根沿 -z 方向，从颈缘下方延伸。
+
+    :param tooth_name: str，牙位名称
+    :return: dict，与前端上传的 jsonPart 格式相同
+    '''
+    return {
+        'toothName': tooth_name,
+        'bottomSphereCenter': [0.0, 0.0, CROWN_HEIGHT + 1.0],
+        'topSphereCenter': [0.0, 0.0, -(CROWN_HEIGHT - 1.0)],
+        'radiusSphereCenter': [0.4 * CROWN_RADII[0], 0.0, -(CROWN_HEIGHT - 1.0)],
+    }
+
+
+def make_arch(num_teeth=14, triangles_per_tooth=5000, seed=0):
+    '''
+    生成带有逐点牙位标签的合成全牙列网格。
+
+    每颗牙冠由 make_crown 生成，颈缘外侧接一圈标签为 0 的牙龈，再沿抛物线形的牙弓排列。
+    跨越颈缘和牙龈的面片的顶点标签不同，按标签切分出的牙冠与 make_crown 的结果相同。
+
+    :param num_teeth: int，牙齿数，最多 16
+    :param triangles_per_tooth: int，每颗牙冠的目标三角形数
+    :param seed: int，随机噪声的种子，每颗牙齿使用 seed + 序号
+    :return: (vtkPolyData对象，点数据中的 Label 数组为 int32 标签, list，每颗牙齿的牙根参数，含 label)
+    '''
+    rings, segments = crown_grid_shape(triangles_per_tooth)
+    margin_start = 1 + (rings - 1) * segments
+    segment_ids = np.arange(segments)
+    next_ids = np.roll(segment_ids, -1)
+
+    # FDI 牙位：右侧从后往前，再到左侧从前往后
+    half = (num_teeth + 1) // 2
+    fdi = [10 + tooth for tooth in range(half, 0, -1)] + [20 + tooth for tooth in range(1, num_teeth - half + 1)]
+    all_points, all_triangles, all_labels, teeth = [], [], [], []
+    offset = 0
+    for index, label in enumerate(fdi):
+        crown = make_crown(triangles_per_tooth, seed=seed + index)
+        points = vtk_to_numpy(crown.GetPoints().GetData())
+        triangles = vtk_to_numpy(crown.GetPolys().GetConnectivityArray()).reshape(-1, 3)
+
+        # 颈缘向外、向下扩出一圈牙龈
+        margin = points[margin_start:]
+        gum = margin * np.array([1.3, 1.3, 1.0], dtype=np.float32) - np.array([0, 0, 1.5], dtype=np.float32)
+        a = margin_start + segment_ids
+        b = margin_start + next_ids
+        c = len(points) + next_ids
+        d = len(points) + segment_ids
+        gum_triangles = np.vstack((np.column_stack((a, d, c)), np.column_stack((a, c, b))))
+
+        # 沿牙弓排列：x 方向间隔 11mm，y 方向按抛物线后退
+        x = 11.0 * (index - (len(fdi) - 1) / 2)
+        shift = np.array([x, 0.01 * x * x, 0.0], dtype=np.float32)
+        all_points.append(np.vstack((points, gum)) + shift)
+        all_triangles.append(np.vstack((triangles, gum_triangles)) + offset)
+        all_labels.append(np.concatenate((np.full(len(points), label), np.zeros(segments))).astype(np.int32))
+        offset += len(points) + segments
+
+        params = make_root_params(f"{'UR' if label < 20 else 'UL'}{label % 10}")
+        for key in ('bottomSphereCenter', 'topSphereCenter', 'radiusSphereCenter'):
+            params[key] = [float(value + delta) for value, delta in zip(params[key], shift)]
+        teeth.append(dict(params, label=label))
+
+    arch = vtkPolyData()
+    arch.SetPoints(numpy_to_points(np.vstack(all_points)))
+    arch.SetPolys(numpy_to_cell_array(np.vstack(all_triangles)))
+    labels = numpy_to_vtk(np.concatenate(all_labels), deep=1)
+    labels.SetName('Label')
+    arch.GetPointData().AddArray(labels)
+    return arch, teeth
+
+
+def crown_to_xml(polydata, data_mode='ascii'):
+    '''
+    将牙冠网格写成前端上传的 VTK XML 数据。
+
+    :param polydata: vtkPolyData对象
+    :param data_mode: 'ascii'、'binary' 或 'appended'
+    :return: bytes
+    '''
+    writer = vtkXMLPolyDataWriter()
+    writer.SetInputData(polydata)
+    writer.WriteToOutputStringOn()
+    {'ascii': writer.SetDataModeToAscii, 'binary': writer.SetDataModeToBinary,
+     'appended': writer.SetDataModeToAppended}[data_mode]()
+    writer.Write()
+    return writer.GetOutputString().encode()
+
+
+def perturb_upload(upload, sequence):
+    '''
+    修改上传数据的字节而不改变其中的网格，用于基准测试中让每个请求都不命中服务器的缓存。
+
+    结果缓存和阶段缓存都以（解压后的）上传数据的 sha256 为键，只修改 jsonPart 时牙冠阶段仍会命中阶段缓存。
+    二进制 STL 改写 80 字节的文件头，PLY 在第一行之后插入一行 comment，VTK XML 在文件末尾追加一行注释；
+    gzip 或 zstd 压缩的数据先解压，修改后再以同样的方式压缩。
+
+    :param upload: bytes，VTK XML、二进制 STL 或二进制 PLY 数据，可以是压缩的
+    :param sequence: int，请求序号，不同的序号得到不同的数据
+    :return: bytes
+    '''
+    upload = bytes(upload)
+    if upload[:2] == GZIP_MAGIC:
+        return gzip.compress(perturb_upload(decompress_buffer(memoryview(upload)), sequence))
+    if upload[:4] == ZSTD_MAGIC:
+        data = perturb_upload(decompress_buffer(memoryview(upload)), sequence)
+        return zstandard.ZstdCompressor().compress(data)
+
+    tag = f'request {sequence}'
+    mesh_format = detect_mesh_format(upload)
+    if mesh_format == 'stl':
+        return tag.encode().ljust(STL_HEADER_SIZE - 4, b' ') + upload[STL_HEADER_SIZE - 4:]
+    if mesh_format == 'ply':
+        first_line = upload.index(b'\n') + 1
+        return upload[:first_line] + f'comment {tag}\n'.encode() + upload[first_line:]
+    return upload + f'\n<!-- {tag} -->\n'.encode()
+
+
+def write_to_bytes(writer, suffix):
+    '''
+    vtkSTLWriter 不能输出到字符串，二进制的 vtkPLYWriter 输出到字符串时内容为空，都先写到临时文件再读出。
+
+    :param writer: 已设置输入的 VTK 写入器
+    :param suffix: 临时文件的扩展名
+    :return: bytes
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'crown' + suffix)
+        writer.SetFileName(path)
+        writer.Write()
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def crown_to_stl(polydata):
+    '''
+    将牙冠网格写成扫描仪导出的二进制 STL 数据，每个三角形单独保存三个顶点。
+
+    :param polydata: vtkPolyData对象
+    :return: bytes
+    '''
+    writer = vtkSTLWriter()
+    writer.SetInputData(polydata)
+    writer.SetFileTypeToBinary()
+    return write_to_bytes(writer, '.stl')
+
+
+def crown_to_ply(polydata):
+    '''
+    将牙冠网格写成二进制（小端）PLY 数据。
+
+    :param polydata: vtkPolyData对象
+    :return: bytes
+    '''
+    writer = vtkPLYWriter()
+    writer.SetInputData(polydata)
+    writer.SetFileTypeToBinary()
+    writer.SetDataByteOrderToLittleEndian()
+    return write_to_bytes(writer, '.ply')
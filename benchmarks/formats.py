@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+'''
+比较不同上传格式的牙冠在服务端的解析耗时：
+
+- xml-ascii：前端目前上传的 ascii VTK XML
+- xml-appended：appended + zlib 的 VTK XML
+- stl：扫描仪导出的二进制 STL，解析时合并重复顶点
+- ply：CAD 软件导出的二进制 PLY
+
+所有格式都通过 parse_polydata 自动识别，并核对解析结果与原始网格的三角形完全一致。
+
+在项目根目录运行：python -m benchmarks.formats
+'''
+import argparse
+import timeit
+
+import numpy as np
+
+from backend.utils import parse_polydata, polydata_points_to_numpy, vtk_to_numpy
+from benchmarks.crowns import crown_to_ply, crown_to_stl, crown_to_xml, make_crown
+
+
+def triangle_coordinates(polydata):
+    '''
+    按坐标排序的三角形顶点坐标，与点的编号无关，用于比较不同格式的解析结果。
+
+    :param polydata: vtkPolyData对象
+    :return: numpy 数组，(M, 9)
+    '''
+    points = polydata_points_to_numpy(polydata)
+    triangles = vtk_to_numpy(polydata.GetPolys().GetConnectivityArray()).reshape(-1, 3)
+    coordinates = points[triangles].reshape(-1, 9)
+    return coordinates[np.lexsort(coordinates.T[::-1])]
+
+
+def measure(triangles, repeat):
+    crown = make_crown(triangles)
+    expected = triangle_coordinates(crown)
+    uploads = {
+        'xml-ascii': crown_to_xml(crown, 'ascii'),
+        'xml-appended': crown_to_xml(crown, 'appended'),
+        'stl': crown_to_stl(crown),
+        'ply': crown_to_ply(crown),
+    }
+    print(f'\ncrown with {crown.GetNumberOfPoints()} points, {crown.GetNumberOfPolys()} triangles')
+    print(f"{'format':>13} {'bytes':>11} {'parse ms':>9} {'points':>8} {'same mesh':>10}")
+    for name, upload in uploads.items():
+        polydata = parse_polydata(upload)
+        parse_ms = min(timeit.repeat(lambda: parse_polydata(upload), number=1, repeat=repeat)) * 1000
+        same = np.array_equal(triangle_coordinates(polydata), expected)
+        print(f'{name:>13} {len(upload):>11} {parse_ms:>9.2f} {polydata.GetNumberOfPoints():>8} {str(same):>10}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 50000, 200000], help='牙冠的目标三角形数')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for triangles in args.sizes:
+        measure(triangles, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
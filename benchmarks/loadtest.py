@@ -0,0 +1,481 @@
+#!/usr/bin/env python
+'''
+回放录制的 multipart 请求，对本地启动的服务器做并发压测，用于在部署前比较不同的部署配置。
+
+请求清单为 JSON Lines 文件，每行一个请求：
+
+{"name": "crown-50k", "path": "/backend/generate_root/", "fields": {"quality": "final"},
+ "files": {"polyData": "crown-50000.vtp", "jsonPart": "UL1.json"},
+ "headers": {"Accept": "application/octet-stream"}, "weight": 1}
+
+files 中的字符串是相对于清单文件的路径，dict 按 JSON 编码后作为文件内容；fields 为普通表单字段；
+weight 为该请求在回放中出现的相对次数。
+
+run 子命令以 --concurrency 个并发连接按权重循环发送清单中的请求，直到发送了 --requests 个或超过 --duration 秒，
+输出整体和每个请求的延迟分位数（p50/p90/p99）、吞吐量、错误率，并按 --sample-interval 采样
+服务器进程树中每个进程的 RSS 和每个时间段完成的请求数。结果以 JSON 保存，可以用 --compare 与另一次的结果比较。
+
+generate 子命令用合成牙冠生成一份清单和对应的文件。
+
+在项目根目录运行，例如：
+python -m benchmarks.loadtest generate
+python -m benchmarks.loadtest run benchmarks/results/loadtest-corpus/requests.jsonl --server gunicorn --workers 4 --concurrency 8
+python -m benchmarks.loadtest run benchmarks/results/loadtest-corpus/requests.jsonl --url 127.0.0.1:8001 --pid 12345 --duration 60
+'''
+import argparse
+import datetime
+import http.client
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.crowns import perturb_upload
+from benchmarks.suite import RESULTS_DIR, git_commit
+from benchmarks.throughput import SERVERS, encode_multipart, wait_for_port
+
+# runserver 只用于在没有安装 gunicorn/uvicorn 的开发环境中验证压测脚本本身
+LOCAL_SERVERS = dict(SERVERS, runserver=(
+    [sys.executable, 'manage.py', 'runserver', '127.0.0.1:{port}', '--noreload'], '/backend/generate_root/'))
+PERCENTILES = (50, 90, 99)
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def load_manifest(path):
+    '''
+    读取请求清单，并把每个请求编码为 multipart 请求体。
+
+    :param path: 清单文件路径
+    :return: list，dict(name, path, body, content_type, headers, weight, json_files)
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            files = {}
+            json_files = {}
+            for name, value in item.get('files', {}).items():
+                if isinstance(value, str):
+                    with open(os.path.join(directory, value), 'rb') as data:
+                        files[name] = data.read()
+                else:
+                    json_files[name] = value
+                    files[name] = json.dumps(value).encode()
+            body, content_type = encode_multipart(files, item.get('fields'))
+            entries.append({
+                'name': item.get('name', f'line-{number}'),
+                'path': item.get('path', '/backend/generate_root/'),
+                'files': files,
+                'fields': item.get('fields'),
+                'json_files': json_files,
+                'body': body,
+                'content_type': content_type,
+                'headers': item.get('headers', {}),
+                'weight': int(item.get('weight', 1)),
+            })
+    if not entries:
+        raise ValueError(f'请求清单为空: {path}')
+    return entries
+
+
+def encode_unique(entry, sequence):
+    '''
+    在 polyData 的网格数据中加入序号后重新编码请求体，每个请求都不会命中服务器的结果缓存和阶段缓存。
+
+    两级缓存都以网格数据的摘要为键，只修改 jsonPart 时牙冠的阶段仍会命中阶段缓存。
+    使用 meshHandle 的请求没有网格数据，请求体不变。
+
+    :param entry: load_manifest 返回的请求
+    :param sequence: int，请求序号
+    :return: (bytes 请求体, str Content-Type)
+    '''
+    if 'polyData' not in entry['files']:
+        return entry['body'], entry['content_type']
+    files = dict(entry['files'], polyData=perturb_upload(entry['files']['polyData'], sequence))
+    return encode_multipart(files, entry['fields'])
+
+
+def send(host, port, entry, body, content_type):
+    '''
+    发送一个请求并读完响应体。
+
+    :return: (int 状态码，连接失败时为 0, float 耗时秒数, int 响应字节数)
+    '''
+    start = time.perf_counter()
+    connection = http.client.HTTPConnection(host, port, timeout=300)
+    try:
+        connection.request('POST', entry['path'], body=body,
+                           headers=dict(entry['headers'], **{'Content-Type': content_type}))
+        response = connection.getresponse()
+        size = len(response.read())
+        return response.status, time.perf_counter() - start, size
+    except (OSError, http.client.HTTPException):
+        return 0, time.perf_counter() - start, 0
+    finally:
+        connection.close()
+
+
+def process_tree(root_pid):
+    '''
+    列出进程及其所有子孙进程（读取 /proc，只支持 Linux）。
+
+    :param root_pid: int，根进程号
+    :return: list，进程号
+    '''
+    children = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                # comm 字段可能包含空格，从最后一个右括号之后开始解析
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(name))
+    pids = [root_pid]
+    for pid in pids:
+        pids.extend(children.get(pid, []))
+    return pids
+
+
+def process_rss(pid):
+    '''
+    读取进程的常驻内存（RSS）字节数，进程已退出时返回 None。
+    '''
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class Sampler(threading.Thread):
+    '''
+    按固定间隔采样服务器进程树中每个进程的 RSS，以及每个时间段内完成的请求数。
+    '''
+
+    def __init__(self, root_pid, interval, completed):
+        super().__init__(daemon=True)
+        self.root_pid = root_pid
+        self.interval = interval
+        self.completed = completed
+        self.samples = []
+        self.stopped = threading.Event()
+        self.start_time = time.perf_counter()
+
+    def sample(self):
+        rss = {}
+        if self.root_pid is not None:
+            for pid in process_tree(self.root_pid):
+                value = process_rss(pid)
+                if value is not None:
+                    rss[str(pid)] = value
+        self.samples.append({
+            'time': round(time.perf_counter() - self.start_time, 3),
+            'completed': self.completed(),
+            'rss': rss,
+            'total_rss': sum(rss.values()),
+        })
+
+    def run(self):
+        self.sample()
+        while not self.stopped.wait(self.interval):
+            self.sample()
+        self.sample()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def percentile(sorted_values, p):
+    '''
+    最近秩法计算分位数。
+
+    :param sorted_values: 升序排列的数值
+    :param p: 百分位，0 到 100
+    :return: float，没有数据时返回 None
+    '''
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(records, elapsed):
+    '''
+    汇总一组请求的延迟、吞吐量和错误率。
+
+    :param records: list，(状态码, 耗时秒数, 响应字节数)
+    :param elapsed: float，压测的总时长（秒）
+    :return: dict，延迟单位为毫秒
+    '''
+    latencies = sorted(latency * 1000 for _, latency, _ in records)
+    errors = sum(not 200 <= status < 300 for status, _, _ in records)
+    statuses = {}
+    for status, _, _ in records:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    summary = {
+        'requests': len(records),
+        'errors': errors,
+        'error_rate': errors / len(records) if records else 0.0,
+        'throughput': len(records) / elapsed if elapsed > 0 else 0.0,
+        'mean_ms': sum(latencies) / len(latencies) if latencies else None,
+        'max_ms': latencies[-1] if latencies else None,
+        'response_bytes': sum(size for _, _, size in records),
+        'statuses': statuses,
+    }
+    for p in PERCENTILES:
+        summary[f'p{p}_ms'] = percentile(latencies, p)
+    return summary
+
+
+def summarize_rss(samples):
+    '''
+    每个进程 RSS 的首次、峰值和最后一次采样值（字节）。
+    '''
+    processes = {}
+    for sample in samples:
+        for pid, rss in sample['rss'].items():
+            stats = processes.setdefault(pid, {'first': rss, 'peak': rss, 'last': rss})
+            stats['peak'] = max(stats['peak'], rss)
+            stats['last'] = rss
+    return {
+        'processes': processes,
+        'peak_total': max((sample['total_rss'] for sample in samples), default=0),
+    }
+
+
+def run_load(entries, host, port, concurrency, max_requests, duration, unique, seed, root_pid, sample_interval):
+    '''
+    按权重循环发送请求，直到发送了 max_requests 个或超过 duration 秒。
+
+    :return: (dict，请求名称 → 记录列表, float 总时长, list RSS 采样)
+    '''
+    schedule = [index for index, entry in enumerate(entries) for _ in range(entry['weight'])]
+    random.Random(seed).shuffle(schedule)
+    sequence = itertools.count()
+    lock = threading.Lock()
+    records = {entry['name']: [] for entry in entries}
+    completed = [0]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_request():
+        with lock:
+            number = next(sequence)
+        if max_requests is not None and number >= max_requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        return number, entries[schedule[number % len(schedule)]]
+
+    def worker():
+        while True:
+            item = next_request()
+            if item is None:
+                return
+            number, entry = item
+            body, content_type = encode_unique(entry, number) if unique else (entry['body'], entry['content_type'])
+            record = send(host, port, entry, body, content_type)
+            with lock:
+                records[entry['name']].append(record)
+                completed[0] += 1
+
+    sampler = Sampler(root_pid, sample_interval, lambda: completed[0])
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+    return records, elapsed, sampler.samples
+
+
+def print_report(report):
+    header = f"{'request':<28} {'count':>7} {'err%':>6} {'req/s':>8}" + \
+        ''.join(f" {f'p{p} ms':>9}" for p in PERCENTILES) + f" {'max ms':>9}"
+    print(header)
+    rows = list(report['requests'].items()) + [('TOTAL', report['total'])]
+    for name, summary in rows:
+        line = f"{name:<28} {summary['requests']:>7} {summary['error_rate'] * 100:>6.2f} {summary['throughput']:>8.2f}"
+        for p in PERCENTILES + ('max',):
+            value = summary[f'p{p}_ms' if p != 'max' else 'max_ms']
+            line += f" {value:>9.1f}" if value is not None else f" {'-':>9}"
+        print(line)
+
+    rss = report['rss']
+    if rss['processes']:
+        print(f"\n{'pid':>8} {'first MiB':>10} {'peak MiB':>10} {'last MiB':>10}")
+        for pid, stats in rss['processes'].items():
+            print(f"{pid:>8} {stats['first'] / 2 ** 20:>10.1f} {stats['peak'] / 2 ** 20:>10.1f} "
+                  f"{stats['last'] / 2 ** 20:>10.1f}")
+        print(f"peak total RSS {rss['peak_total'] / 2 ** 20:.1f} MiB")
+
+
+def compare(current, baseline):
+    '''
+    打印两次压测整体结果的对比。
+    '''
+    print(f"\n{'metric':<16} {baseline['meta']['label']:>20} {current['meta']['label']:>20} {'ratio':>7}")
+    metrics = [('throughput', 'throughput'), ('error_rate', 'error_rate')] + \
+        [(f'p{p}_ms', f'p{p}_ms') for p in PERCENTILES]
+    for label, key in metrics:
+        before, after = baseline['total'][key], current['total'][key]
+        ratio = after / before if before else float('nan')
+        print(f'{label:<16} {before:>20.3f} {after:>20.3f} {ratio:>7.2f}')
+    before, after = baseline['rss']['peak_total'] / 2 ** 20, current['rss']['peak_total'] / 2 ** 20
+    print(f"{'peak_rss_mib':<16} {before:>20.1f} {after:>20.1f} {after / before if before else float('nan'):>7.2f}")
+
+
+def command_run(args):
+    entries = load_manifest(args.manifest)
+    server = None
+    root_pid = args.pid
+    if args.url:
+        host, _, port = args.url.partition(':')
+        port = int(port or 80)
+    else:
+        host, port = '127.0.0.1', args.port
+        if args.command:
+            command = args.command.format(port=port, workers=args.workers).split()
+        else:
+            command = [part.format(port=port, workers=args.workers) for part in LOCAL_SERVERS[args.server][0]]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='teethsite_backend.settings')
+        server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL,
+                                  stderr=None if args.server_log else subprocess.DEVNULL)
+        root_pid = server.pid
+    try:
+        if server is not None:
+            wait_for_port(port, args.startup_timeout)
+        if not args.no_warmup:
+            # 每个请求先发送一次，worker 完成预热、结果进入缓存（--unique 时网格数据不同，不会命中）
+            for entry in entries:
+                status, _, _ = send(host, port, entry, entry['body'], entry['content_type'])
+                if not 200 <= status < 300:
+                    print(f"warning: 预热请求 {entry['name']} 返回 {status}", file=sys.stderr)
+        max_requests = args.requests if args.requests or not args.duration else None
+        records, elapsed, samples = run_load(entries, host, port, args.concurrency, max_requests, args.duration,
+                                             args.unique, args.seed, root_pid, args.sample_interval)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    label = args.label or (args.url or f'{args.command or args.server}-w{args.workers}') + f'-c{args.concurrency}'
+    report = {
+        'meta': {
+            'label': label,
+            'commit': git_commit(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'manifest': os.path.abspath(args.manifest),
+            'server': args.url or args.command or args.server,
+            'workers': args.workers,
+            'concurrency': args.concurrency,
+            'unique': args.unique,
+            'cpu_count': os.cpu_count(),
+            'elapsed': elapsed,
+        },
+        'total': summarize([record for entry_records in records.values() for record in entry_records], elapsed),
+        'requests': {name: summarize(entry_records, elapsed) for name, entry_records in records.items()},
+        'rss': summarize_rss(samples),
+        'samples': samples,
+    }
+    print_report(report)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"loadtest-{report['meta']['commit']}-{label}.json"
+                                         .replace('/', '_').replace(' ', '_'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f'\n结果已保存到 {output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+    return 1 if report['total']['errors'] else 0
+
+
+def command_generate(args):
+    '''
+    用合成牙冠生成请求清单：每个规模的 VTK XML 上传各一条，另外包括二进制响应和 STL 上传的请求。
+    '''
+    from benchmarks.crowns import crown_to_stl, crown_to_xml, make_crown, make_root_params
+    from backend.utils import MESH_CONTENT_TYPE
+
+    os.makedirs(args.output, exist_ok=True)
+    lines = []
+    for size in args.sizes:
+        crown = make_crown(size)
+        xml_name = f'crown-{size}.vtp'
+        stl_name = f'crown-{size}.stl'
+        with open(os.path.join(args.output, xml_name), 'wb') as f:
+            f.write(crown_to_xml(crown))
+        with open(os.path.join(args.output, stl_name), 'wb') as f:
+            f.write(crown_to_stl(crown))
+        root_params = make_root_params()
+        for quality in args.quality:
+            lines.append({'name': f'xml-{size}-{quality}', 'path': '/backend/generate_root/',
+                          'fields': {'quality': quality},
+                          'files': {'polyData': xml_name, 'jsonPart': root_params}, 'weight': 2})
+        lines.append({'name': f'stl-{size}-binary', 'path': '/backend/generate_root/',
+                      'fields': {'quality': args.quality[0]}, 'headers': {'Accept': MESH_CONTENT_TYPE},
+                      'files': {'polyData': stl_name, 'jsonPart': root_params}, 'weight': 1})
+
+    manifest = os.path.join(args.output, 'requests.jsonl')
+    with open(manifest, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + '\n')
+    print(f'{len(lines)} 个请求已写入 {manifest}')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='action', required=True)
+
+    run = subparsers.add_parser('run', help='回放请求清单')
+    run.add_argument('manifest', help='JSON Lines 格式的请求清单')
+    run.add_argument('--server', choices=sorted(LOCAL_SERVERS), default='gunicorn', help='在本地启动的服务器')
+    run.add_argument('--command', help='自定义的服务器启动命令，可以使用 {port} 和 {workers} 占位符')
+    run.add_argument('--workers', type=int, default=1)
+    run.add_argument('--port', type=int, default=8765)
+    run.add_argument('--url', help='已经在运行的服务器，host:port；指定时不启动服务器')
+    run.add_argument('--pid', type=int, help='使用 --url 时采样 RSS 的服务器主进程号')
+    run.add_argument('--concurrency', type=int, default=4)
+    run.add_argument('--requests', type=int, help='发送的请求总数，默认 100（未指定 --duration 时）')
+    run.add_argument('--duration', type=float, help='压测时长（秒）')
+    run.add_argument('--unique', action='store_true', help='每个请求的网格数据加入不同的序号，不命中结果缓存和阶段缓存（meshHandle 请求除外）')
+    run.add_argument('--seed', type=int, default=0, help='请求顺序的随机种子')
+    run.add_argument('--sample-interval', type=float, default=1.0, help='RSS 采样间隔（秒）')
+    run.add_argument('--startup-timeout', type=float, default=120)
+    run.add_argument('--no-warmup', action='store_true', help='不预先发送每个请求')
+    run.add_argument('--server-log', action='store_true', help='显示服务器的日志输出')
+    run.add_argument('--label', help='结果中的配置名称，默认由服务器、worker 数和并发数组成')
+    run.add_argument('--output', help='结果文件路径，默认 benchmarks/results/loadtest-<提交>-<配置>.json')
+    run.add_argument('--compare', help='作为基线的另一次压测结果')
+    run.set_defaults(handler=command_run)
+
+    generate = subparsers.add_parser('generate', help='用合成牙冠生成请求清单')
+    generate.add_argument('--output', default=os.path.join(RESULTS_DIR, 'loadtest-corpus'), help='清单和牙冠文件的输出目录')
+    generate.add_argument('--sizes', type=int, nargs='+', default=[5000, 50000], help='牙冠的目标三角形数')
+    generate.add_argument('--quality', nargs='+', default=['final', 'preview'])
+    generate.set_defaults(handler=command_generate)
+
+    args = parser.parse_args()
+    if args.action == 'run' and args.requests is None and args.duration is None:
+        args.requests = 100
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
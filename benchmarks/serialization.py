@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+'''
+对比两种牙根网格响应格式的体积和编码耗时：
+
+- json：vtkXMLPolyDataWriter 输出 ascii XML，Base64 编码后放入 JSON（旧版前端使用）
+- binary：polydata_to_bytes 输出的紧凑二进制格式（application/octet-stream）
+
+在项目根目录运行：python -m benchmarks.serialization
+'''
+import json
+import timeit
+
+import vtkmodules.all as vtk
+
+from backend.utils import polydata_to_string, polydata_to_bytes
+
+
+def make_mesh(resolution):
+    sphere = vtk.vtkSphereSource()
+    sphere.SetThetaResolution(resolution)
+    sphere.SetPhiResolution(resolution)
+    sphere.Update()
+    return sphere.GetOutput()
+
+
+def encode_json(polydata):
+    return json.dumps({'message': '成功接收数据', 'polydata': polydata_to_string(polydata)}).encode()
+
+
+def encode_binary(polydata):
+    return polydata_to_bytes(polydata)
+
+
+def measure(encoder, polydata, repeat=5):
+    size = len(encoder(polydata))
+    seconds = min(timeit.repeat(lambda: encoder(polydata), number=1, repeat=repeat))
+    return size, seconds
+
+
+def main():
+    print(f"{'triangles':>10} {'json bytes':>12} {'json ms':>9} {'binary bytes':>13} {'binary ms':>10} {'ratio':>6}")
+    for resolution in (32, 64, 128, 256):
+        polydata = make_mesh(resolution)
+        json_size, json_seconds = measure(encode_json, polydata)
+        binary_size, binary_seconds = measure(encode_binary, polydata)
+        print(f'{polydata.GetNumberOfPolys():>10} {json_size:>12} {json_seconds * 1000:>9.2f} '
+              f'{binary_size:>13} {binary_seconds * 1000:>10.2f} {json_size / binary_size:>6.1f}')
+
+
+if __name__ == '__main__':
+    main()
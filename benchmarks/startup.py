@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+'''
+测量 worker 的启动开销：
+
+- import：新进程中 django.setup() 之后导入 backend.views 的耗时（多次取中位数）
+- first response：启动 gunicorn 到第一个 generate_root 请求成功返回的总耗时，以及该请求本身的耗时
+
+在项目根目录运行：python -m benchmarks.startup
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.throughput import ROOT_PARAMS, encode_multipart, make_crown_xml, send_request, wait_for_port
+
+IMPORT_SNIPPET = '''
+import os, time
+os.environ['DJANGO_SETTINGS_MODULE'] = 'teethsite_backend.settings'
+import django
+django.setup()
+start = time.perf_counter()
+import backend.views
+print(time.perf_counter() - start)
+'''
+
+
+def measure_import(repeat):
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], capture_output=True, text=True, check=True)
+        timings.append(float(output.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def measure_first_response(port):
+    body = encode_multipart({'polyData': make_crown_xml(64), 'jsonPart': json.dumps(ROOT_PARAMS).encode()})
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='teethsite_backend.settings')
+    start = time.perf_counter()
+    server = subprocess.Popen(['gunicorn', 'teethsite_backend.wsgi:application', '--workers', '1',
+                               '--bind', f'127.0.0.1:{port}'], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        request_start = time.perf_counter()
+        status = send_request(port, '/backend/generate_root/', *body)
+        end = time.perf_counter()
+    finally:
+        server.terminate()
+        server.wait()
+    if status != 200:
+        raise RuntimeError(f'请求失败，状态码 {status}')
+    return end - start, end - request_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    print(f'import backend.views: {measure_import(args.repeat) * 1000:.0f} ms (median of {args.repeat})')
+    total, first_request = measure_first_response(args.port)
+    print(f'time to first response: {total * 1000:.0f} ms, first request latency: {first_request * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
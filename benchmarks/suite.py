@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+'''
+牙根生成的基准测试套件。
+
+对不同规模（默认 5k 到 200k 个三角形）的合成牙冠，分别测量 backend/utils.py 中的每个函数、
+RootCone.create_circle、create_cap 以及通过 Django 测试客户端调用完整 generate_root 接口
+（上传网格或使用 meshHandle）的耗时。
+每个函数的输入来自同一颗牙冠在流水线中对应阶段的真实中间结果。
+
+结果以 JSON 保存（默认写到 benchmarks/results/<提交>.json），可以作为基线与其他提交的结果比较：
+
+python -m benchmarks.suite
+python -m benchmarks.suite --sizes 5000 50000 --repeat 3 --compare benchmarks/results/<基线提交>.json
+
+比较时按每个函数的最短耗时计算比值，超过 --threshold 的条目标记为 REGRESSION，并以非零状态码退出。
+'''
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import vtkmodules
+from vtkmodules.vtkCommonDataModel import vtkPlane
+from vtkmodules.vtkCommonExecutionModel import vtkTrivialProducer
+
+from benchmarks.crowns import crown_to_ply, crown_to_stl, crown_to_xml, make_crown, make_root_params
+
+DEFAULT_SIZES = (5000, 20000, 50000, 100000, 200000)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+# 需要交互窗口，无法在基准测试中运行
+SKIPPED = {'display_polydata': '需要打开渲染窗口'}
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'teethsite_backend.settings')
+    import django
+    django.setup()
+
+
+def git_commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return output.stdout.strip()
+
+
+def measure(function, repeat):
+    '''
+    重复调用 function 并记录每次的耗时。
+
+    :param function: 无参数的可调用对象
+    :param repeat: int，重复次数
+    :return: dict，最短、中位数和平均耗时（秒）以及重复次数
+    '''
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'median': statistics.median(timings), 'mean': statistics.fmean(timings),
+            'runs': repeat}
+
+
+def producer_for(polydata):
+    producer = vtkTrivialProducer()
+    producer.SetOutput(polydata)
+    return producer
+
+
+def utils_cases(crown, crown_xml, root_params):
+    '''
+    按流水线的顺序准备 backend/utils.py 中每个函数以及 RootCone.create_circle、create_cap 的调用。
+
+    :return: dict，名称 → 无参数的可调用对象
+    '''
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    from backend import utils
+    from backend.root import RootCone
+
+    # 流水线各阶段的中间结果，作为后续函数的输入
+    smoothed = utils.smooth_polydata(crown)
+    cleaned = utils.clean_single_point_faces(smoothed)
+    boundary_line = utils.extract_edge(cleaned)
+    smoothed_line = utils.smooth_line(boundary_line)
+    line_points = utils.polydata_points_to_numpy(smoothed_line)
+    fractions = utils.closed_line_fractions(line_points)
+    root_cone = RootCone(root_params)
+    circle = root_cone.create_circle(resolution=smoothed_line.GetNumberOfPoints())
+    translate = [-component for component in root_cone.up_normal]
+    translate_edge = utils.translate_polydata(smoothed_line, translate)
+    closed_surface = utils.create_closed_surface(smoothed_line, translate_edge)
+    modified_circle = utils.create_new_line(translate_edge, circle)
+    closed_surface2 = utils.create_closed_surface(translate_edge, modified_circle)
+    cap = root_cone.create_cap(modified_circle)
+    result = utils.weld_polydata([closed_surface, closed_surface2, cap])
+    result_bytes = utils.polydata_to_bytes(result)
+
+    crown_points = utils.polydata_points_to_numpy(crown)
+    crown_stl = crown_to_stl(crown)
+    crown_ply = crown_to_ply(crown)
+    stl_vertices = crown_points[utils.vtk_to_numpy(crown.GetPolys().GetConnectivityArray())]
+    crown_triangles = utils.vtk_to_numpy(crown.GetPolys().GetConnectivityArray()).reshape(-1, 3)
+    plane = vtkPlane()
+    plane.SetOrigin(0.0, 0.0, 0.0)
+    plane.SetNormal(0.0, 0.0, 1.0)
+    crown_producer = producer_for(crown)
+
+    def read_uploaded_file():
+        with utils.read_uploaded_file(SimpleUploadedFile('polyData', crown_xml)):
+            pass
+
+    def print_point_coordinates():
+        with contextlib.redirect_stdout(io.StringIO()):
+            utils.print_point_coordinates(crown)
+
+    def create_windowed_sinc():
+        smoother = utils.create_windowed_sinc()
+        smoother.SetInputData(crown)
+        smoother.Update()
+
+    def create_edge_filter():
+        extract_edges = utils.create_edge_filter()
+        extract_edges.SetInputData(cleaned)
+        extract_edges.Update()
+
+    return {
+        'numpy_to_cell_array': lambda: utils.numpy_to_cell_array(crown_triangles),
+        'numpy_to_points': lambda: utils.numpy_to_points(crown_points),
+        'parse_polydata': lambda: utils.parse_polydata(crown_xml),
+        'parse_polydata[stl]': lambda: utils.parse_polydata(crown_stl),
+        'parse_polydata[ply]': lambda: utils.parse_polydata(crown_ply),
+        'detect_mesh_format': lambda: utils.detect_mesh_format(crown_stl),
+        'parse_xml_polydata': lambda: utils.parse_xml_polydata(crown_xml),
+        'parse_stl': lambda: utils.parse_stl(crown_stl),
+        'parse_ply': lambda: utils.parse_ply(crown_ply),
+        'weld_vertices': lambda: utils.weld_vertices(stl_vertices),
+        'mesh_from_numpy': lambda: utils.mesh_from_numpy(crown_points, crown_triangles),
+        'read_uploaded_file': read_uploaded_file,
+        'print_point_coordinates': print_point_coordinates,
+        'decimate_polydata': lambda: utils.decimate_polydata(crown, crown.GetNumberOfPolys() // 4),
+        'smooth_polydata': lambda: utils.smooth_polydata(crown),
+        'run_windowed_sinc': lambda: utils.run_windowed_sinc(crown, 200, 45),
+        'create_windowed_sinc': create_windowed_sinc,
+        'extract_edge': lambda: utils.extract_edge(cleaned),
+        'create_edge_filter': create_edge_filter,
+        'clip_data': lambda: utils.clip_data(crown_producer.GetOutputPort(), plane),
+        'append_data': lambda: utils.append_data([closed_surface, closed_surface2, cap]),
+        'weld_polydata': lambda: utils.weld_polydata([closed_surface, closed_surface2, cap]),
+        'validate_manifold': lambda: utils.validate_manifold(result),
+        'translate_polydata': lambda: utils.translate_polydata(crown, translate),
+        'clean_data': lambda: utils.clean_data(crown_producer),
+        'clean_single_point_faces': lambda: utils.clean_single_point_faces(smoothed),
+        'select_polydata': lambda: utils.select_polydata(crown, smoothed_line),
+        'extract_boundary_loops': lambda: utils.extract_boundary_loops(boundary_line),
+        'smooth_line': lambda: utils.smooth_line(boundary_line),
+        'polydata_points_to_numpy': lambda: utils.polydata_points_to_numpy(crown),
+        'closed_line_fractions': lambda: utils.closed_line_fractions(line_points),
+        'closed_line_length': lambda: utils.closed_line_length(line_points),
+        'resample_closed_line': lambda: utils.resample_closed_line(line_points, fractions),
+        'create_closed_surface': lambda: utils.create_closed_surface(smoothed_line, translate_edge),
+        'create_new_line': lambda: utils.create_new_line(translate_edge, circle),
+        'create_new_line[min_distance]': lambda: utils.create_new_line(translate_edge, circle, align='min_distance'),
+        'min_distance_offset': lambda: utils.min_distance_offset(
+            utils.polydata_points_to_numpy(translate_edge), utils.polydata_points_to_numpy(circle)),
+        'polydata_to_string': lambda: utils.polydata_to_string(result),
+        'polydata_to_bytes': lambda: utils.polydata_to_bytes(result),
+        'bytes_to_polydata': lambda: utils.bytes_to_polydata(result_bytes),
+        'RootCone.create_circle': lambda: RootCone(root_params).create_circle(
+            resolution=smoothed_line.GetNumberOfPoints()),
+        'RootCone.create_cap': lambda: root_cone.create_cap(modified_circle),
+    }
+
+
+def view_cases(crown_xml, root_params, quality_names):
+    '''
+    通过 Django 测试客户端调用完整的 generate_root 接口。
+
+    结果缓存和阶段缓存都以牙冠网格为键，只改 toothName 仍会命中阶段缓存，
+    因此每次请求前清空两个缓存，测量的是完整的计算耗时。结果缓存的磁盘层不会被清空，运行时不要设置 ROOT_CACHE_DIR。
+
+    :return: dict，名称 → 无参数的可调用对象
+    '''
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import Client
+
+    from backend.cache import get_result_cache
+    from backend.pipeline import get_stage_cache
+
+    # DEBUG 模式下 ALLOWED_HOSTS 为空时只允许 localhost
+    client = Client(HTTP_HOST='localhost')
+    json_part = json.dumps(root_params).encode()
+
+    # 先上传一次网格，之后的请求只传句柄
+    mesh_handle = client.post('/backend/meshes/', {
+        'polyData': SimpleUploadedFile('polyData', crown_xml),
+    }).json()['handle']
+
+    def make_request(quality, use_handle):
+        def request():
+            get_result_cache().clear()
+            get_stage_cache().clear()
+            data = {'jsonPart': SimpleUploadedFile('jsonPart', json_part)}
+            if use_handle:
+                data['meshHandle'] = mesh_handle
+            else:
+                data['polyData'] = SimpleUploadedFile('polyData', crown_xml)
+            response = client.post(f'/backend/generate_root/?quality={quality}', data)
+            if response.status_code != 200:
+                raise RuntimeError(f'generate_root 返回 {response.status_code}: {response.content[:200]!r}')
+        return request
+
+    cases = {}
+    for quality in quality_names:
+        cases[f'generate_root[{quality}]'] = make_request(quality, False)
+        cases[f'generate_root[{quality},meshHandle]'] = make_request(quality, True)
+    return cases
+
+
+def run_size(target_triangles, repeat, quality_names, seed, only):
+    crown = make_crown(target_triangles, seed=seed)
+    crown_xml = crown_to_xml(crown)
+    root_params = make_root_params()
+    cases = utils_cases(crown, crown_xml, root_params)
+    cases.update(view_cases(crown_xml, root_params, quality_names))
+
+    functions = {}
+    for name, function in cases.items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        function()
+        functions[name] = measure(function, repeat)
+        print(f"{crown.GetNumberOfPolys():>8} {name:<32} {functions[name]['min'] * 1000:>10.3f} ms", flush=True)
+    return {
+        'triangles': crown.GetNumberOfPolys(),
+        'vertices': crown.GetNumberOfPoints(),
+        'upload_bytes': len(crown_xml),
+        'functions': functions,
+    }
+
+
+def compare(current, baseline, threshold):
+    '''
+    逐项比较两次运行的最短耗时。
+
+    :return: int，超过阈值的条目数
+    '''
+    regressions = 0
+    print(f"\n{'size':>8} {'function':<32} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for size, result in current['results'].items():
+        baseline_functions = baseline['results'].get(size, {}).get('functions', {})
+        for name, timing in result['functions'].items():
+            if name not in baseline_functions:
+                continue
+            before = baseline_functions[name]['min']
+            ratio = timing['min'] / before if before > 0 else float('inf')
+            flag = ''
+            if ratio > threshold:
+                regressions += 1
+                flag = 'REGRESSION'
+            print(f"{size:>8} {name:<32} {before * 1000:>12.3f} {timing['min'] * 1000:>12.3f} {ratio:>7.2f} {flag}")
+    print(f"\nbaseline {baseline['meta']['commit']} → current {current['meta']['commit']}, "
+          f'{regressions} regression(s) above {threshold:.2f}x')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='牙冠的目标三角形数')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--quality', nargs='+', default=['final', 'preview'], help='generate_root 使用的质量预设')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', help='只运行名称中包含这些字符串的条目')
+    parser.add_argument('--output', help='结果文件路径，默认 benchmarks/results/<提交>.json')
+    parser.add_argument('--compare', help='作为基线的结果文件')
+    parser.add_argument('--threshold', type=float, default=1.25, help='判定为性能退化的耗时比值')
+    args = parser.parse_args()
+
+    setup_django()
+    commit = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'vtk': vtkmodules.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'skipped': SKIPPED,
+        },
+        'results': {},
+    }
+    for size in args.sizes:
+        report['results'][str(size)] = run_size(size, args.repeat, args.quality, args.seed, args.only)
+
+    output = args.output or os.path.join(RESULTS_DIR, f'{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f'\n结果已保存到 {output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        return 1 if compare(report, baseline, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+'''
+对比 gunicorn 同步部署（generate_root）与 ASGI 部署（generate_root_async）的吞吐量。
+
+脚本在本地启动服务器，用多个线程并发发送牙根生成请求，输出每秒请求数以及每个 worker 进程的每秒请求数。
+每个请求的牙冠网格相同，但上传的字节各不相同（见 benchmarks.crowns.perturb_upload），不命中结果缓存和阶段缓存。
+ASGI 模式下每个进程内的 VTK 计算在线程池中执行，worker 数相同时可以同时处理多个请求。
+
+在项目根目录运行，例如：
+python -m benchmarks.throughput --server gunicorn --workers 1 --concurrency 4
+python -m benchmarks.throughput --server uvicorn --workers 1 --concurrency 4
+'''
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import vtkmodules.all as vtk
+
+from benchmarks.crowns import perturb_upload
+
+SERVERS = {
+    'gunicorn': (['gunicorn', 'teethsite_backend.wsgi:application', '--workers', '{workers}',
+                  '--bind', '127.0.0.1:{port}', '--timeout', '120'], '/backend/generate_root/'),
+    'uvicorn': (['uvicorn', 'teethsite_backend.asgi:application', '--workers', '{workers}',
+                 '--host', '127.0.0.1', '--port', '{port}', '--log-level', 'warning'],
+                '/backend/generate_root_async/'),
+}
+
+ROOT_PARAMS = {
+    'toothName': 'UL1',
+    'bottomSphereCenter': [0.0, 0.0, 6.0],
+    'topSphereCenter': [0.0, 0.0, -4.0],
+    'radiusSphereCenter': [2.0, 0.0, -4.0],
+}
+
+
+def make_crown_xml(resolution):
+    '''
+    生成一个开口的球冠网格作为测试用的牙冠，返回 VTK XML 数据。
+    '''
+    sphere = vtk.vtkSphereSource()
+    sphere.SetRadius(5)
+    sphere.SetThetaResolution(resolution)
+    sphere.SetPhiResolution(resolution)
+    sphere.SetEndPhi(100)
+    triangles = vtk.vtkTriangleFilter()
+    triangles.SetInputConnection(sphere.GetOutputPort())
+    writer = vtk.vtkXMLPolyDataWriter()
+    writer.SetInputConnection(triangles.GetOutputPort())
+    writer.WriteToOutputStringOn()
+    writer.Write()
+    return writer.GetOutputString().encode()
+
+
+def encode_multipart(files, fields=None):
+    '''
+    构造 multipart/form-data 请求体。
+
+    :param files: dict，字段名 → bytes 文件内容
+    :param fields: dict，字段名 → str 普通表单字段
+    :return: (bytes 请求体, str Content-Type)
+    '''
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, content in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{name}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def wait_for_port(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'服务器在 {timeout} 秒内没有启动')
+
+
+def send_request(port, path, body, content_type):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    try:
+        connection.request('POST', path, body=body, headers={'Content-Type': content_type})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=sorted(SERVERS), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--resolution', type=int, default=200, help='球冠网格的分辨率')
+    parser.add_argument('--quality', default='final')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    command, path = SERVERS[args.server]
+    command = [part.format(workers=args.workers, port=args.port) for part in command]
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='teethsite_backend.settings')
+    server = subprocess.Popen(command, env=env)
+    try:
+        wait_for_port(args.port)
+        crown = make_crown_xml(args.resolution)
+        # 每个请求上传的牙冠字节都不同（网格相同），结果缓存和阶段缓存都不会命中
+        bodies = [encode_multipart({'polyData': perturb_upload(crown, i),
+                                    'jsonPart': json.dumps(ROOT_PARAMS).encode()},
+                                   {'quality': args.quality})
+                  for i in range(args.requests + 1)]
+        # 预热请求使用单独的一份数据，不让正式请求中的第一个命中缓存
+        send_request(args.port, path, *bodies.pop())
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            statuses = list(pool.map(lambda body: send_request(args.port, path, *body), bodies))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    errors = sum(status != 200 for status in statuses)
+    rps = len(bodies) / elapsed
+    print(f'server={args.server} workers={args.workers} concurrency={args.concurrency} '
+          f'requests={len(bodies)} errors={errors}')
+    print(f'{rps:.2f} req/s, {rps / args.workers:.2f} req/s per worker process, cpu_count={os.cpu_count()}')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
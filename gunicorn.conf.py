@@ -0,0 +1,19 @@
+"""
+gunicorn 配置，在项目根目录启动 gunicorn（start_gunicorn.bat）时自动读取。
+"""
+
+# 在主进程中导入应用，worker 启动和 max_requests 回收后重启时只需 fork，不用重新导入 Django 和 VTK
+preload_app = True
+
+
+def post_worker_init(worker):
+    # 线程池不能在 fork 之前创建，每个 worker 启动后恢复未完成的后台任务，见 backend.jobs.start_job_executor
+    from backend.jobs import start_job_executor
+    start_job_executor()
+
+    # 在 worker 开始接受请求之前执行一次合成的牙根生成，见 backend.pipeline.warm_up
+    from django.conf import settings
+
+    if getattr(settings, 'ROOT_WARM_UP', True):
+        from backend.pipeline import warm_up
+        warm_up()
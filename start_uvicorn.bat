@@ -0,0 +1,4 @@
+@echo off
+set DJANGO_SETTINGS_MODULE=teethsite_backend.settings
+uvicorn teethsite_backend.asgi:application --host 127.0.0.1 --port 8001
+pause
\ No newline at end of file
@@ -14,3 +14,15 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'teethsite_backend.settings')
 
 application = get_asgi_application()
+
+# 恢复上次退出时未完成的后台任务，见 backend.jobs.start_job_executor
+from backend.jobs import start_job_executor  # noqa: E402
+
+start_job_executor()
+
+# 在开始接受请求之前执行一次合成的牙根生成，见 backend.pipeline.warm_up
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'ROOT_WARM_UP', True):
+    from backend.pipeline import warm_up  # noqa: E402
+    warm_up()